@@ -0,0 +1,8 @@
+-- Keyed plaintext fingerprint (HMAC-SHA256 under a key derived from the
+-- user's password). Lets the API detect duplicate content even though every
+-- upload is encrypted with a fresh nonce.
+alter table file_metadata add column if not exists content_fingerprint text;
+
+create index if not exists file_metadata_user_fingerprint_idx
+    on file_metadata (user_id, content_fingerprint)
+    where content_fingerprint is not null;
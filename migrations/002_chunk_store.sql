@@ -0,0 +1,33 @@
+-- Content-defined chunking: per-user store of encrypted chunks addressed by
+-- a keyed hash of their plaintext, and file manifests listing those chunks.
+alter table file_metadata add column if not exists manifest jsonb;
+alter table file_metadata alter column oci_object_name drop not null;
+
+create table if not exists chunk_store (
+    user_id     text        not null,
+    chunk_id    text        not null,
+    object_name text        not null,
+    size        bigint      not null,
+    ref_count   integer     not null default 0,
+    created_at  timestamptz not null default now(),
+    primary key (user_id, chunk_id)
+);
+
+-- Unreferenced chunks, in object order, for the garbage collector
+create index if not exists chunk_store_unreferenced_idx
+    on chunk_store (object_name)
+    where ref_count <= 0;
+
+-- Adjust reference counts once per occurrence of each chunk id
+create or replace function adjust_chunk_refs(p_user_id text, p_chunk_ids text[], p_delta integer)
+returns void
+language sql
+as $$
+    update chunk_store c
+       set ref_count = c.ref_count + p_delta * r.occurrences
+      from (select chunk_id, count(*) as occurrences
+              from unnest(p_chunk_ids) as chunk_id
+             group by chunk_id) r
+     where c.user_id = p_user_id
+       and c.chunk_id = r.chunk_id;
+$$;
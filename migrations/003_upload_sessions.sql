@@ -0,0 +1,27 @@
+-- Resumable uploads: one session per interrupted-able upload, backed by an
+-- OCI multipart upload. Each acknowledged part is recorded so a client can
+-- ask which byte ranges the server already holds and send only the rest.
+create table if not exists upload_sessions (
+    id                  uuid        primary key,
+    user_id             text        not null,
+    filename            text        not null,
+    size                bigint      not null,
+    part_size           integer     not null,
+    content_fingerprint text,
+    oci_object_name     text        not null,
+    oci_upload_id       text        not null,
+    created_at          timestamptz not null default now(),
+    expires_at          timestamptz not null
+);
+
+create index if not exists upload_sessions_user_idx on upload_sessions (user_id);
+create index if not exists upload_sessions_expires_idx on upload_sessions (expires_at);
+
+create table if not exists upload_parts (
+    session_id uuid    not null references upload_sessions (id) on delete cascade,
+    part_num   integer not null,
+    etag       text    not null,
+    size       bigint  not null,
+    sha256     text    not null,
+    primary key (session_id, part_num)
+);
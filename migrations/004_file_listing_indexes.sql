@@ -0,0 +1,11 @@
+-- Keyset pagination of GET /api/files. Each page is a range scan on one of
+-- these indexes, ordered by the sort column with id as the tie-breaker.
+create index if not exists file_metadata_user_uploaded_idx
+    on file_metadata (user_id, uploaded_at, id);
+
+create index if not exists file_metadata_user_filename_idx
+    on file_metadata (user_id, filename, id);
+
+-- Filename prefix filters (filename like 'prefix%') regardless of collation
+create index if not exists file_metadata_user_filename_pattern_idx
+    on file_metadata (user_id, filename text_pattern_ops);
@@ -0,0 +1,35 @@
+-- Per-user file listing version, bumped on every write to file_metadata.
+-- The API derives the ETag and Last-Modified of GET /api/files from it, so an
+-- unchanged listing is answered with 304 after a single primary key lookup.
+create table if not exists file_listing_versions (
+    user_id    text        primary key,
+    version    bigint      not null default 0,
+    updated_at timestamptz not null default now()
+);
+
+create or replace function bump_file_listing_version()
+returns trigger
+language plpgsql
+as $$
+declare
+    changed_user text;
+begin
+    if tg_op = 'DELETE' then
+        changed_user := old.user_id;
+    else
+        changed_user := new.user_id;
+    end if;
+
+    insert into file_listing_versions as v (user_id, version, updated_at)
+    values (changed_user, 1, now())
+    on conflict (user_id) do update
+        set version = v.version + 1,
+            updated_at = now();
+    return null;
+end;
+$$;
+
+drop trigger if exists file_metadata_listing_version on file_metadata;
+create trigger file_metadata_listing_version
+    after insert or update or delete on file_metadata
+    for each row execute function bump_file_listing_version();
@@ -0,0 +1,38 @@
+-- Change feed: one row per file created or deleted, in a sequence that only
+-- grows. Rows are written by a trigger in the same transaction as the
+-- file_metadata change, so the feed cannot miss a write (including deletes
+-- made directly through Supabase by the web app).
+create table if not exists file_changes (
+    seq                 bigserial   primary key,
+    user_id             text        not null,
+    file_id             text        not null,
+    op                  text        not null check (op in ('insert', 'delete')),
+    filename            text,
+    size                bigint,
+    hash_sha256         text,
+    content_fingerprint text,
+    changed_at          timestamptz not null default now()
+);
+
+create index if not exists file_changes_user_seq_idx on file_changes (user_id, seq);
+
+create or replace function record_file_change()
+returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op = 'DELETE' then
+        insert into file_changes (user_id, file_id, op, filename, size, hash_sha256, content_fingerprint)
+        values (old.user_id, old.id::text, 'delete', old.filename, old.size, old.hash_sha256, old.content_fingerprint);
+    else
+        insert into file_changes (user_id, file_id, op, filename, size, hash_sha256, content_fingerprint)
+        values (new.user_id, new.id::text, 'insert', new.filename, new.size, new.hash_sha256, new.content_fingerprint);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists file_metadata_changes on file_metadata;
+create trigger file_metadata_changes
+    after insert or delete on file_metadata
+    for each row execute function record_file_change();
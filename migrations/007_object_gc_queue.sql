@@ -0,0 +1,13 @@
+-- OCI objects whose deletion failed after their metadata was removed. The
+-- API's garbage collector retries them, backing off per object, and drops
+-- each row once the object is gone.
+create table if not exists object_gc_queue (
+    object_name     text        primary key,
+    user_id         text        not null,
+    attempts        integer     not null default 0,
+    last_error      text,
+    queued_at       timestamptz not null default now(),
+    next_attempt_at timestamptz not null default now()
+);
+
+create index if not exists object_gc_queue_due_idx on object_gc_queue (next_attempt_at);
@@ -0,0 +1,32 @@
+-- Orphan reconciliation: every OCI object name the database refers to, in
+-- byte order (collation "C", the order OCI lists objects in) so the two
+-- listings can be merge-joined. Keyset paginated on the name.
+create index if not exists file_metadata_object_name_idx
+    on file_metadata (oci_object_name collate "C");
+
+create index if not exists chunk_store_object_name_idx
+    on chunk_store (object_name collate "C");
+
+create or replace function referenced_objects(p_after text, p_prefix text, p_limit integer)
+returns table (object_name text)
+language sql
+stable
+as $$
+    select name from (
+        (select oci_object_name collate "C" as name
+           from file_metadata
+          where oci_object_name collate "C" > p_after
+            and starts_with(oci_object_name, p_prefix)
+          order by 1
+          limit p_limit)
+        union all
+        (select c.object_name collate "C"
+           from chunk_store c
+          where c.object_name collate "C" > p_after
+            and starts_with(c.object_name, p_prefix)
+          order by 1
+          limit p_limit)
+    ) refs
+    order by name
+    limit p_limit;
+$$;
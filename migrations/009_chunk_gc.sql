@@ -0,0 +1,73 @@
+-- Chunk garbage collection: chunks no manifest references are deleted once
+-- they have been unreferenced for a grace period, so a manifest committed
+-- concurrently can still claim them. unreferenced_at records when a chunk's
+-- reference count last dropped to zero (null while it is referenced; a
+-- chunk that was never referenced counts from created_at).
+alter table chunk_store add column if not exists unreferenced_at timestamptz;
+
+create or replace function adjust_chunk_refs(p_user_id text, p_chunk_ids text[], p_delta integer)
+returns void
+language sql
+as $$
+    update chunk_store c
+       set ref_count = c.ref_count + p_delta * r.occurrences,
+           unreferenced_at = case
+               when c.ref_count + p_delta * r.occurrences <= 0 then coalesce(c.unreferenced_at, now())
+           end
+      from (select chunk_id, count(*) as occurrences
+              from unnest(p_chunk_ids) as chunk_id
+             group by chunk_id) r
+     where c.user_id = p_user_id
+       and c.chunk_id = r.chunk_id;
+$$;
+
+-- Delete up to p_limit chunks unreferenced since before p_before, returning
+-- them so their objects can be deleted. Rows locked by a concurrent
+-- adjust_chunk_refs are skipped and the count is checked again on delete.
+create or replace function delete_unreferenced_chunks(p_before timestamptz, p_limit integer)
+returns table (user_id text, chunk_id text, object_name text)
+language sql
+as $$
+    delete from chunk_store c
+     using (select d.user_id, d.chunk_id
+              from chunk_store d
+             where d.ref_count <= 0
+               and coalesce(d.unreferenced_at, d.created_at) < p_before
+             order by d.object_name
+             limit p_limit
+               for update skip locked) dead
+     where c.user_id = dead.user_id
+       and c.chunk_id = dead.chunk_id
+       and c.ref_count <= 0
+    returning c.user_id, c.chunk_id, c.object_name;
+$$;
+
+-- Chunks the collector may delete are no longer referenced objects, so
+-- reconciliation can remove them if their deletion is missed
+drop function if exists referenced_objects(text, text, integer);
+
+create or replace function referenced_objects(p_after text, p_prefix text, p_limit integer,
+                                              p_collect_before timestamptz)
+returns table (object_name text)
+language sql
+stable
+as $$
+    select name from (
+        (select oci_object_name collate "C" as name
+           from file_metadata
+          where oci_object_name collate "C" > p_after
+            and starts_with(oci_object_name, p_prefix)
+          order by 1
+          limit p_limit)
+        union all
+        (select c.object_name collate "C"
+           from chunk_store c
+          where c.object_name collate "C" > p_after
+            and starts_with(c.object_name, p_prefix)
+            and not (c.ref_count <= 0 and coalesce(c.unreferenced_at, c.created_at) < p_collect_before)
+          order by 1
+          limit p_limit)
+    ) refs
+    order by name
+    limit p_limit;
+$$;
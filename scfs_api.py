@@ -1,19 +1,151 @@
 import os
+import re
 import sys
 import json
+import base64
 import argparse
 import uuid
+import hmac
+import time
 import hashlib
-from datetime import datetime
-from flask import Flask, request, jsonify, Response
+import tempfile
+import threading
+import shutil
+import struct
+import bisect
+import queue
+import sqlite3
+import logging
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from flask import Flask, Request, request, jsonify, Response
 from flask_cors import CORS
+from werkzeug.exceptions import RequestEntityTooLarge
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Development mode (Flask's debug flag): relaxes settings production requires
+DEBUG = os.getenv("FLASK_DEBUG", "").lower() in ("1", "true", "yes")
+
+# Maximum size of a single uploaded (encrypted) file
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(5 * 1024 * 1024)))
+# Uploads are kept in memory up to this size, then spooled to a temp file
+UPLOAD_SPOOL_MEMORY = 1024 * 1024
+# Uploads of at least MULTIPART_UPLOAD_THRESHOLD bytes go to OCI as parallel
+# multipart uploads. Parts shrink with MAX_FILE_SIZE (down to 1 MiB) so the
+# largest uploads the limit allows are still split
+MULTIPART_PART_SIZE = min(8 * 1024 * 1024, max(1024 * 1024, MAX_FILE_SIZE // 4))
+MULTIPART_UPLOAD_THRESHOLD = 2 * MULTIPART_PART_SIZE
+# Largest encrypted chunk accepted by the chunk store, and chunks per manifest
+MAX_CHUNK_SIZE = int(os.getenv("MAX_CHUNK_SIZE", str(4 * 1024 * 1024)))
+MAX_MANIFEST_CHUNKS = 10000
+# Chunk ids sent to the database per query
+CHUNK_QUERY_BATCH = 500
+# File listings are paginated; clients may ask for a subset of these columns
+LIST_PAGE_SIZE = 100
+MAX_LIST_PAGE_SIZE = 1000
+FILE_LIST_COLUMNS = ("id", "filename", "size", "hash_sha256", "content_fingerprint", "uploaded_at")
+FILE_SELECTABLE_COLUMNS = FILE_LIST_COLUMNS + ("manifest", "created_at")
+# What storing a copy of a file needs to know about it
+FILE_SOURCE_COLUMNS = ("id", "filename", "size", "hash_sha256", "content_fingerprint", "oci_object_name", "manifest")
+FILE_SORT_KEYS = ("uploaded_at", "filename")
+# Change feed page size, and how old a change must be before it is served:
+# sequence numbers are assigned before commit, so a newer one can become
+# visible first; waiting this long lets the slower transaction commit
+CHANGE_FEED_PAGE_SIZE = 500
+MAX_CHANGE_FEED_PAGE_SIZE = 1000
+CHANGE_FEED_SETTLE = 2
+# Resumable upload sessions: part size bounds and how long an unfinished
+# session (and its OCI multipart upload) can be resumed; expired sessions
+# are aborted by the garbage collector
+UPLOAD_PART_SIZE = 8 * 1024 * 1024
+MIN_UPLOAD_PART_SIZE = 1024 * 1024
+MAX_UPLOAD_PART_SIZE = 64 * 1024 * 1024
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", str(24 * 3600)))
+# Files each user may store
+MAX_FILES_PER_USER = int(os.getenv("MAX_FILES_PER_USER", "10"))
+# Batch uploads: files per request (the whole body is bounded by the usual
+# request size limit) and objects sent to OCI at once
+MAX_BATCH_FILES = 100
+BATCH_UPLOAD_WORKERS = 8
+# Bulk deletes: ids per request and OCI objects deleted at once. Objects that
+# cannot be deleted are queued and retried by a background pass every
+# GC_INTERVAL seconds, backing off per object up to GC_MAX_DELAY
+MAX_DELETE_BATCH = 1000
+OBJECT_DELETE_WORKERS = 16
+# (0 disables the background pass; run `scfs_api.py gc` from cron instead)
+GC_INTERVAL = int(os.getenv("GC_INTERVAL", "300"))
+GC_BATCH_SIZE = 500
+GC_MAX_DELAY = 24 * 3600
+# Chunks no manifest references are deleted after this many seconds, giving
+# uploads that found them already stored time to commit their manifest
+CHUNK_GC_GRACE = int(os.getenv("CHUNK_GC_GRACE", str(24 * 3600)))
+# Orphan reconciliation: names read per listing page, and how old an object
+# must be before it can be an orphan (younger ones may belong to an upload
+# whose metadata is not written yet)
+RECONCILE_PAGE_SIZE = 1000
+RECONCILE_GRACE = 3600
+
+class HashingSpool:
+    """Write target for an uploaded file part.
+
+    The multipart parser writes the request body into it as it is read, so
+    the SHA-256 hash and size are computed incrementally and MAX_FILE_SIZE is
+    enforced before the rest of the body is consumed. Memory use is capped at
+    UPLOAD_SPOOL_MEMORY; larger files roll over to a temp file on disk.
+    """
+
+    def __init__(self, max_size: int = MAX_FILE_SIZE):
+        self.spool = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_MEMORY)
+        self.hasher = hashlib.sha256()
+        self.max_size = max_size
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+        if self.size > self.max_size:
+            raise RequestEntityTooLarge()
+        self.hasher.update(data)
+        return self.spool.write(data)
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+    def __getattr__(self, name):
+        return getattr(self.spool, name)
+
+class SecureCloudRequest(Request):
+    """Request that streams uploaded files into a HashingSpool"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingSpool()
+
+def hash_upload(file):
+    """Return (size, sha256) of an uploaded file, hashing in chunks if it was not spooled"""
+    if isinstance(file.stream, HashingSpool):
+        return file.stream.size, file.stream.hexdigest()
+    
+    hasher = hashlib.sha256()
+    size = 0
+    for chunk in iter(lambda: file.stream.read(UPLOAD_SPOOL_MEMORY), b""):
+        hasher.update(chunk)
+        size += len(chunk)
+    file.stream.seek(0)
+    return size, hasher.hexdigest()
+
 # Initialize Flask app
 app = Flask(__name__)
+app.request_class = SecureCloudRequest
+# Reject oversized bodies up front; leaves headroom for multipart boundaries
+app.config["MAX_CONTENT_LENGTH"] = MAX_FILE_SIZE + 64 * 1024
 CORS(app)
 
 # Import OCI and Supabase with better error handling
@@ -63,8 +195,38 @@ OCI_CONFIG = {
 
 OCI_NAMESPACE = os.getenv("OCI_NAMESPACE", "")
 OCI_BUCKET_NAME = os.getenv("OCI_BUCKET_NAME", "")
+# Object storage: "oci" or "local"; unset means OCI when configured, else local disk
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "")
+LOCAL_STORAGE_PATH = os.getenv("LOCAL_STORAGE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "storage"))
+LOCAL_FSYNC_POLICIES = ("always", "file", "never")
+LOCAL_STORAGE_FSYNC = os.getenv("LOCAL_STORAGE_FSYNC", "always")
+# Later pages of a local storage listing are served from the sorted listing
+# its first page built, for up to this many seconds
+LOCAL_LISTING_TTL = 600
 SUPABASE_URL = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY = os.getenv("SUPABASE_API_KEY", "")
+# Metadata: "supabase" or "sqlite"; unset means Supabase when configured, else SQLite
+METADATA_BACKEND = os.getenv("METADATA_BACKEND", "")
+METADATA_SQLITE_PATH = os.getenv("METADATA_SQLITE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "scfs_metadata.db"))
+
+# Sessions: signed bearer tokens verified locally, without calling Supabase
+SESSION_SECRET = os.getenv("SESSION_SECRET", "")
+ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", "900"))
+REFRESH_TOKEN_TTL = int(os.getenv("REFRESH_TOKEN_TTL", str(7 * 24 * 3600)))
+# How long a verified email/password pair is trusted for legacy header auth
+CREDENTIAL_CACHE_TTL = int(os.getenv("CREDENTIAL_CACHE_TTL", "300"))
+AUTH_CACHE_SIZE = 10000
+
+if not SESSION_SECRET:
+    if not DEBUG:
+        # A per-process secret would sign users out on every restart and
+        # reject tokens issued by the other workers
+        raise RuntimeError("SESSION_SECRET must be set (or FLASK_DEBUG=1 for development)")
+    logger.warning("SESSION_SECRET not set, using a random per-process secret")
+    SESSION_SECRET = os.urandom(32).hex()
+
+# Downloads are relayed to the client in chunks of this size
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
 
 # Initialize clients only if available and configured
 if OCI_AVAILABLE and all([OCI_CONFIG["user"], OCI_CONFIG["fingerprint"], OCI_CONFIG["tenancy"]]):
@@ -77,19 +239,25 @@ if OCI_AVAILABLE and all([OCI_CONFIG["user"], OCI_CONFIG["fingerprint"], OCI_CON
 else:
     print("OCI client not initialized (missing config or library)")
 
+supabase_auth = None
+
 if SUPABASE_AVAILABLE and SUPABASE_URL and SUPABASE_KEY:
     try:
         supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        # Sign-ins get their own client so a login never changes the
+        # session that database queries run under
+        supabase_auth = create_client(SUPABASE_URL, SUPABASE_KEY)
         print("Supabase client initialized successfully")
     except Exception as e:
         print(f"Failed to initialize Supabase client: {e}")
         supabase = None
+        supabase_auth = None
 else:
     print("Supabase client not initialized (missing config or library)")
 
 def authenticate_user(email: str, password: str):
     """Authenticate user with Supabase"""
-    if not supabase:
+    if not supabase_auth:
         # Fallback: simulate successful auth for development
         print(f"Supabase not available, simulating auth for {email}")
         return True, type('MockAuth', (), {
@@ -100,7 +268,7 @@ def authenticate_user(email: str, password: str):
         })()
     
     try:
-        response = supabase.auth.sign_in_with_password({
+        response = supabase_auth.auth.sign_in_with_password({
             "email": email,
             "password": password
         })
@@ -114,179 +282,1984 @@ def authenticate_user(email: str, password: str):
         print(f"Authentication error: {e}")
         return False, str(e)
 
-def get_user_files(user_id: str):
-    """Get user files from Supabase database"""
-    if not supabase:
-        # Fallback: return empty list for development
-        print(f"Supabase not available, returning empty file list for {user_id}")
-        return []
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a time-to-live"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float = None):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def pop(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+access_tokens = URLSafeTimedSerializer(SESSION_SECRET, salt="scfs-access-token")
+refresh_tokens = URLSafeTimedSerializer(SESSION_SECRET, salt="scfs-refresh-token")
+token_cache = TTLCache(AUTH_CACHE_SIZE, 60)
+credential_cache = TTLCache(AUTH_CACHE_SIZE, CREDENTIAL_CACHE_TTL)
+
+def issue_session(user_id: str, email: str):
+    """Issue an access/refresh token pair for an authenticated user"""
+    identity = {"id": user_id, "email": email}
+    return {
+        "access_token": access_tokens.dumps(identity),
+        "refresh_token": refresh_tokens.dumps(identity),
+        "token_type": "Bearer",
+        "expires_in": ACCESS_TOKEN_TTL
+    }
+
+def verify_access_token(token: str):
+    """Return the identity in a valid access token, or None"""
+    identity = token_cache.get(token)
+    if identity:
+        return identity
     
     try:
-        response = supabase.table("file_metadata").select("*").eq("user_id", user_id).execute()
-        return response.data
-    except Exception as e:
-        print(f"Error getting user files: {e}")
-        return []
+        identity, issued_at = access_tokens.loads(token, max_age=ACCESS_TOKEN_TTL, return_timestamp=True)
+    except (BadSignature, SignatureExpired):
+        return None
+    
+    remaining = ACCESS_TOKEN_TTL - (time.time() - issued_at.timestamp())
+    token_cache.set(token, identity, min(remaining, token_cache.ttl))
+    return identity
 
-def store_file_metadata(user_id: str, filename: str, file_size: int, file_hash: str, oci_object_name: str):
-    """Store file metadata in Supabase"""
-    if not supabase:
-        # Fallback: simulate successful storage for development
-        print(f"Supabase not available, simulating metadata storage for {filename}")
-        return True, {
-            "id": str(uuid.uuid4()),
-            "user_id": user_id,
-            "filename": filename,
-            "size": file_size,
-            "hash_sha256": file_hash,
-            "oci_object_name": oci_object_name,
-            "uploaded_at": datetime.utcnow().isoformat()
-        }
+def verify_credentials(email: str, password: str):
+    """Verify an email/password pair, consulting Supabase only on a cache miss.
+
+    Returns (identity, None) or (None, error message).
+    """
+    cache_key = hmac.new(SESSION_SECRET.encode(), f"{email}\0{password}".encode(), hashlib.sha256).hexdigest()
+    identity = credential_cache.get(cache_key)
+    if identity:
+        return identity, None
     
-    try:
-        file_data = {
-            "user_id": user_id,
-            "filename": filename,
-            "original_path": filename,  # Using filename as original_path for now
-            "encrypted_path": oci_object_name,  # OCI path as encrypted path
-            "size": file_size,
-            "hash_sha256": file_hash,
-            "oci_object_name": oci_object_name,
-            "uploaded_at": datetime.utcnow().isoformat(),
-            "created_at": datetime.utcnow().isoformat()
-        }
-        
-        print(f"🔍 Storing metadata for {filename} (user: {user_id})")
-        response = supabase.table("file_metadata").insert(file_data).execute()
-        
-        if response.data:
-            print(f"Metadata stored successfully for {filename}")
-            return True, response.data[0]
-        else:
-            print(f"No data returned when storing metadata for {filename}")
-            return False, "No data returned from database"
-            
-    except Exception as e:
-        print(f"Database error storing metadata for {filename}: {e}")
-        print(f"   Error type: {type(e).__name__}")
-        print(f"   Error details: {str(e)}")
-        return False, str(e)
+    auth_success, auth_result = authenticate_user(email, password)
+    if not auth_success:
+        return None, auth_result
+    
+    identity = {
+        "id": auth_result.user.id if hasattr(auth_result, 'user') else email,
+        "email": email
+    }
+    credential_cache.set(cache_key, identity)
+    return identity, None
+
+def get_authenticated_user():
+    """Resolve the caller from a bearer token or the X-User-* headers.
 
-def upload_to_oci(file_data: bytes, object_name: str):
-    """Upload file to OCI Object Storage"""
-    if not object_storage_client:
-        # Fallback: simulate successful upload for development
-        print(f"OCI not available, simulating upload for {object_name}")
-        return True, "Simulated upload successful"
+    Returns (identity, None) on success or (None, error response).
+    """
+    authorization = request.headers.get('Authorization', '')
+    if authorization.startswith('Bearer '):
+        identity = verify_access_token(authorization[len('Bearer '):].strip())
+        if not identity:
+            return None, (jsonify({
+                "success": False,
+                "error": "Invalid or expired token"
+            }), 401)
+        return identity, None
+    
+    email = request.headers.get('X-User-Email')
+    password = request.headers.get('X-User-Password')
+    
+    if not email or not password:
+        return None, (jsonify({
+            "success": False,
+            "error": "Authentication required"
+        }), 401)
     
+    identity, error = verify_credentials(email, password)
+    if not identity:
+        return None, (jsonify({
+            "success": False,
+            "error": f"Authentication failed: {error}"
+        }), 401)
+    return identity, None
+
+def encode_list_cursor(sort: str, descending: bool, row: dict):
+    """Opaque cursor continuing a listing after row"""
+    payload = json.dumps([sort, descending, row[sort], row["id"]])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def decode_list_cursor(cursor: str, sort: str, descending: bool):
+    """Return the (sort value, id) a cursor points after; raises ValueError if it is invalid"""
     try:
-        response = object_storage_client.put_object(
-            namespace_name=OCI_NAMESPACE,
-            bucket_name=OCI_BUCKET_NAME,
-            object_name=object_name,
-            put_object_body=file_data
+        cursor_sort, cursor_descending, value, file_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort or cursor_descending != descending:
+        raise ValueError("Cursor does not match the requested sort order")
+    return value, file_id
+
+def postgrest_value(value):
+    """Quote a value for use inside a PostgREST or() filter"""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+class MetadataStore(ABC):
+    """Where file metadata and the bookkeeping around it are kept.
+
+    Covers the file_metadata rows, the listing version and change feed
+    derived from them, the chunk store, resumable upload sessions and the
+    object garbage collection queue. Unlike StorageBackend, operations
+    raise on failure; the functions wrapping them decide whether an error
+    fails the request.
+    """
+
+    name = None
+
+    @abstractmethod
+    def list_files(self, user_id: str, columns, sort: str, descending: bool, limit: int,
+                   after=None, prefix: str = None, name: str = None, ids=None):
+        """Up to limit of the user's files ordered by (sort, id), continuing after a (sort value, id) pair"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_file(self, user_id: str, file_id: str):
+        """The user's file with all its columns, or None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_files(self, user_id: str, column: str, values, columns=("id", "filename", "size")):
+        """The user's files whose content_fingerprint, hash_sha256 or oci_object_name column is one of values"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def count_files(self, user_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def insert_files(self, rows):
+        """Insert file_metadata rows in one transaction, returning them as stored (with ids)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_files(self, user_id: str, file_ids):
+        """Delete the user's files with these ids in one transaction, returning the deleted rows"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def listing_version(self, user_id: str):
+        """The user's {version, updated_at}; version 0 if they never wrote anything"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def latest_change(self, user_id: str, settled: str):
+        """Sequence number of the user's last change made before settled, or 0"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def changes(self, user_id: str, since: int, settled: str, limit: int):
+        """Up to limit of the user's changes after sequence number since and before settled, in order"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def referenced_objects(self, after: str, prefix: str, limit: int, collect_before: str):
+        """Up to limit object names referenced by files or chunks, after after and under prefix, in byte order.
+
+        Chunks unreferenced since before collect_before are left out: they
+        are the garbage collector's to delete.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def find_chunks(self, user_id: str, chunk_ids):
+        """The subset of chunk_ids in the user's chunk store"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def register_chunk(self, user_id: str, chunk_id: str, object_name: str, size: int):
+        """Add a chunk with no references; registering it again changes nothing"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def adjust_chunk_refs(self, user_id: str, chunk_ids, delta: int):
+        """Add delta to each chunk's reference count once per occurrence in chunk_ids.
+
+        Records when a count drops to zero, and forgets it when the chunk is
+        referenced again.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_unreferenced_chunks(self, before: str, limit: int):
+        """Delete up to limit chunks unreferenced since before, returning their user_id, chunk_id and object_name"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_upload_session(self, session: dict):
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_upload_session(self, user_id: str, session_id: str, now: str):
+        """The user's session if it expires after now, else None"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def record_upload_part(self, part: dict):
+        """Record a part, replacing an earlier record of the same part number"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_upload_parts(self, session_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_upload_session(self, session_id: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def expired_upload_sessions(self, now: str, limit: int):
+        """Up to limit {id, oci_object_name, oci_upload_id} of sessions that expired by now, oldest first"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def queue_object_deletions(self, user_id: str, failures: dict):
+        """Queue {object_name: error} for the garbage collector, due now"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def due_object_deletions(self, now: str, limit: int):
+        """Up to limit queued {object_name, attempts} due by now, oldest first"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def dequeue_object_deletions(self, object_names):
+        raise NotImplementedError
+
+    @abstractmethod
+    def retry_object_deletion(self, object_name: str, attempts: int, error: str, next_attempt_at: str):
+        raise NotImplementedError
+
+class SupabaseMetadataStore(MetadataStore):
+    """Tables in Supabase (Postgres), created by the scripts in migrations/"""
+
+    name = "supabase"
+
+    def __init__(self, client):
+        self.client = client
+
+    def table(self, name: str):
+        return self.client.table(name)
+
+    def list_files(self, user_id: str, columns, sort: str, descending: bool, limit: int,
+                   after=None, prefix: str = None, name: str = None, ids=None):
+        query = self.table("file_metadata").select(", ".join(columns)).eq("user_id", user_id)
+        if name:
+            query = query.eq("filename", name)
+        if ids:
+            query = query.in_("id", ids)
+        if prefix:
+            escaped = re.sub(r"([\\%_])", r"\\\1", prefix)
+            query = query.like("filename", f"{escaped}%")
+        if after:
+            op = "lt" if descending else "gt"
+            value, file_id = postgrest_value(after[0]), postgrest_value(after[1])
+            query = query.or_(f"{sort}.{op}.{value},and({sort}.eq.{value},id.{op}.{file_id})")
+        return query.order(sort, desc=descending).order("id", desc=descending).limit(limit).execute().data
+
+    def get_file(self, user_id: str, file_id: str):
+        response = self.table("file_metadata").select("*").eq("id", file_id).eq("user_id", user_id).execute()
+        return response.data[0] if response.data else None
+
+    def find_files(self, user_id: str, column: str, values, columns=("id", "filename", "size")):
+        select_columns = ", ".join(dict.fromkeys(tuple(columns) + (column,)))
+        return self.table("file_metadata").select(select_columns).eq("user_id", user_id).in_(column, list(values)).execute().data
+
+    def count_files(self, user_id: str):
+        response = self.table("file_metadata").select("id", count="exact").eq("user_id", user_id).execute()
+        return response.count if hasattr(response, 'count') else len(response.data)
+
+    def insert_files(self, rows):
+        response = self.table("file_metadata").insert(rows).execute()
+        if not response.data or len(response.data) != len(rows):
+            raise RuntimeError("No data returned from database")
+        return response.data
+
+    def delete_files(self, user_id: str, file_ids):
+        return self.table("file_metadata").delete().eq("user_id", user_id).in_("id", list(file_ids)).execute().data
+
+    def listing_version(self, user_id: str):
+        response = self.table("file_listing_versions").select("version, updated_at").eq("user_id", user_id).execute()
+        return response.data[0] if response.data else {"version": 0, "updated_at": None}
+
+    def latest_change(self, user_id: str, settled: str):
+        response = self.table("file_changes").select("seq").eq("user_id", user_id).lt("changed_at", settled).order("seq", desc=True).limit(1).execute()
+        return response.data[0]["seq"] if response.data else 0
+
+    def changes(self, user_id: str, since: int, settled: str, limit: int):
+        return self.table("file_changes").select(
+            "seq, op, file_id, filename, size, hash_sha256, content_fingerprint, changed_at"
+        ).eq("user_id", user_id).gt("seq", since).lt("changed_at", settled).order("seq").limit(limit).execute().data
+
+    def referenced_objects(self, after: str, prefix: str, limit: int, collect_before: str):
+        response = self.client.rpc("referenced_objects", {
+            "p_after": after,
+            "p_prefix": prefix,
+            "p_limit": limit,
+            "p_collect_before": collect_before
+        }).execute()
+        return [row["object_name"] for row in response.data]
+
+    def find_chunks(self, user_id: str, chunk_ids):
+        chunk_ids = list(dict.fromkeys(chunk_ids))
+        found = set()
+        for start in range(0, len(chunk_ids), CHUNK_QUERY_BATCH):
+            batch = chunk_ids[start:start + CHUNK_QUERY_BATCH]
+            response = self.table("chunk_store").select("chunk_id").eq("user_id", user_id).in_("chunk_id", batch).execute()
+            found.update(row["chunk_id"] for row in response.data)
+        return found
+
+    def register_chunk(self, user_id: str, chunk_id: str, object_name: str, size: int):
+        self.table("chunk_store").upsert({
+            "user_id": user_id,
+            "chunk_id": chunk_id,
+            "object_name": object_name,
+            "size": size,
+            "ref_count": 0,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }, on_conflict="user_id,chunk_id", ignore_duplicates=True).execute()
+
+    def adjust_chunk_refs(self, user_id: str, chunk_ids, delta: int):
+        self.client.rpc("adjust_chunk_refs", {
+            "p_user_id": user_id,
+            "p_chunk_ids": list(chunk_ids),
+            "p_delta": delta
+        }).execute()
+
+    def delete_unreferenced_chunks(self, before: str, limit: int):
+        return self.client.rpc("delete_unreferenced_chunks", {
+            "p_before": before,
+            "p_limit": limit
+        }).execute().data
+
+    def create_upload_session(self, session: dict):
+        self.table("upload_sessions").insert(session).execute()
+
+    def get_upload_session(self, user_id: str, session_id: str, now: str):
+        response = self.table("upload_sessions").select("*").eq("id", session_id).eq("user_id", user_id).gt("expires_at", now).execute()
+        return response.data[0] if response.data else None
+
+    def record_upload_part(self, part: dict):
+        self.table("upload_parts").upsert(part, on_conflict="session_id,part_num").execute()
+
+    def get_upload_parts(self, session_id: str):
+        return self.table("upload_parts").select("part_num, etag, size, sha256").eq("session_id", session_id).order("part_num").execute().data
+
+    def delete_upload_session(self, session_id: str):
+        self.table("upload_sessions").delete().eq("id", session_id).execute()
+
+    def expired_upload_sessions(self, now: str, limit: int):
+        return self.table("upload_sessions").select("id, oci_object_name, oci_upload_id").lte(
+            "expires_at", now
+        ).order("expires_at").limit(limit).execute().data
+
+    def queue_object_deletions(self, user_id: str, failures: dict):
+        self.table("object_gc_queue").upsert([
+            {"object_name": object_name, "user_id": user_id, "last_error": error}
+            for object_name, error in failures.items()
+        ], on_conflict="object_name").execute()
+
+    def due_object_deletions(self, now: str, limit: int):
+        return self.table("object_gc_queue").select("object_name, attempts").lte(
+            "next_attempt_at", now
+        ).order("next_attempt_at").limit(limit).execute().data
+
+    def dequeue_object_deletions(self, object_names):
+        self.table("object_gc_queue").delete().in_("object_name", list(object_names)).execute()
+
+    def retry_object_deletion(self, object_name: str, attempts: int, error: str, next_attempt_at: str):
+        self.table("object_gc_queue").update({
+            "attempts": attempts,
+            "last_error": error,
+            "next_attempt_at": next_attempt_at
+        }).eq("object_name", object_name).execute()
+
+class SQLiteMetadataStore(MetadataStore):
+    """An embedded SQLite database, for local deployments and load tests.
+
+    The schema mirrors migrations/, with triggers maintaining the listing
+    version and change feed in the same transaction as each write. The
+    database runs in WAL mode, so readers never wait for the writer;
+    connections are pooled and every query is a fixed parameterized
+    statement, with lists of ids passed as one JSON array, so each is
+    prepared once per connection and then served from its statement cache.
+    Writes take the write lock up front (BEGIN IMMEDIATE), which orders
+    them: a change is visible as soon as it is committed, so the change
+    feed does not need to wait for concurrent writes to settle.
+    """
+
+    name = "sqlite"
+    NOW = "(strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))"
+    SCHEMA = f"""
+        create table if not exists file_metadata (
+            id                  text    primary key,
+            user_id             text    not null,
+            filename            text    not null,
+            original_path       text,
+            encrypted_path      text,
+            size                integer not null,
+            hash_sha256         text,
+            content_fingerprint text,
+            manifest            text,
+            oci_object_name     text,
+            uploaded_at         text    not null default {NOW},
+            created_at          text    not null default {NOW}
+        );
+        create index if not exists file_metadata_user_uploaded_idx on file_metadata (user_id, uploaded_at, id);
+        create index if not exists file_metadata_user_filename_idx on file_metadata (user_id, filename, id);
+        create index if not exists file_metadata_user_fingerprint_idx on file_metadata (user_id, content_fingerprint);
+        create index if not exists file_metadata_user_hash_idx on file_metadata (user_id, hash_sha256);
+        create index if not exists file_metadata_object_name_idx on file_metadata (oci_object_name);
+
+        create table if not exists file_listing_versions (
+            user_id    text    primary key,
+            version    integer not null default 0,
+            updated_at text    not null default {NOW}
+        );
+
+        create table if not exists file_changes (
+            seq                 integer primary key autoincrement,
+            user_id             text    not null,
+            file_id             text    not null,
+            op                  text    not null check (op in ('insert', 'delete')),
+            filename            text,
+            size                integer,
+            hash_sha256         text,
+            content_fingerprint text,
+            changed_at          text    not null default {NOW}
+        );
+        create index if not exists file_changes_user_seq_idx on file_changes (user_id, seq);
+
+        create trigger if not exists file_metadata_insert after insert on file_metadata begin
+            insert into file_changes (user_id, file_id, op, filename, size, hash_sha256, content_fingerprint)
+            values (new.user_id, new.id, 'insert', new.filename, new.size, new.hash_sha256, new.content_fingerprint);
+            insert into file_listing_versions (user_id, version) values (new.user_id, 1)
+            on conflict (user_id) do update set version = version + 1, updated_at = excluded.updated_at;
+        end;
+        create trigger if not exists file_metadata_update after update on file_metadata begin
+            insert into file_listing_versions (user_id, version) values (new.user_id, 1)
+            on conflict (user_id) do update set version = version + 1, updated_at = excluded.updated_at;
+        end;
+        create trigger if not exists file_metadata_delete after delete on file_metadata begin
+            insert into file_changes (user_id, file_id, op, filename, size, hash_sha256, content_fingerprint)
+            values (old.user_id, old.id, 'delete', old.filename, old.size, old.hash_sha256, old.content_fingerprint);
+            insert into file_listing_versions (user_id, version) values (old.user_id, 1)
+            on conflict (user_id) do update set version = version + 1, updated_at = excluded.updated_at;
+        end;
+
+        create table if not exists chunk_store (
+            user_id     text    not null,
+            chunk_id    text    not null,
+            object_name text    not null,
+            size        integer not null,
+            ref_count   integer not null default 0,
+            created_at  text    not null default {NOW},
+            unreferenced_at text,
+            primary key (user_id, chunk_id)
+        ) without rowid;
+        create index if not exists chunk_store_object_name_idx on chunk_store (object_name);
+        create index if not exists chunk_store_unreferenced_idx on chunk_store (object_name) where ref_count <= 0;
+
+        create table if not exists upload_sessions (
+            id                  text    primary key,
+            user_id             text    not null,
+            filename            text    not null,
+            size                integer not null,
+            part_size           integer not null,
+            content_fingerprint text,
+            oci_object_name     text    not null,
+            oci_upload_id       text    not null,
+            created_at          text    not null default {NOW},
+            expires_at          text    not null
+        );
+        create index if not exists upload_sessions_expires_idx on upload_sessions (expires_at);
+
+        create table if not exists upload_parts (
+            session_id text    not null references upload_sessions (id) on delete cascade,
+            part_num   integer not null,
+            etag       text    not null,
+            size       integer not null,
+            sha256     text    not null,
+            primary key (session_id, part_num)
+        ) without rowid;
+
+        create table if not exists object_gc_queue (
+            object_name     text    primary key,
+            user_id         text    not null,
+            attempts        integer not null default 0,
+            last_error      text,
+            queued_at       text    not null default {NOW},
+            next_attempt_at text    not null default {NOW}
+        ) without rowid;
+        create index if not exists object_gc_queue_due_idx on object_gc_queue (next_attempt_at);
+    """
+    FILE_COLUMNS = ("id", "user_id", "filename", "original_path", "encrypted_path", "size", "hash_sha256",
+                    "content_fingerprint", "manifest", "oci_object_name", "uploaded_at", "created_at")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.pool = queue.SimpleQueue()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self.connection() as conn:
+            conn.execute("pragma journal_mode = wal")
+            conn.executescript(self.SCHEMA)
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None,
+                               check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        # WAL stays consistent across a crash at this level; only the last commits may be lost on power failure
+        conn.execute("pragma synchronous = normal")
+        conn.execute("pragma foreign_keys = on")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.pool.get_nowait()
+        except queue.Empty:
+            conn = self.connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                # A transaction that could not be rolled back: do not hand it to the next caller
+                conn.close()
+            else:
+                self.pool.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        with self.connection() as conn:
+            conn.execute("begin immediate")
+            try:
+                yield conn
+                conn.execute("commit")
+            except BaseException:
+                # Also when the commit itself fails, which leaves the transaction open
+                if conn.in_transaction:
+                    conn.execute("rollback")
+                raise
+
+    def query(self, sql: str, params=()):
+        with self.connection() as conn:
+            return [self.row(row) for row in conn.execute(sql, params)]
+
+    @staticmethod
+    def row(row):
+        row = dict(row)
+        if row.get("manifest") is not None:
+            row["manifest"] = json.loads(row["manifest"])
+        return row
+
+    def file_columns(self, columns):
+        unknown = set(columns) - set(self.FILE_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown file_metadata columns: {', '.join(sorted(unknown))}")
+        return ", ".join(columns)
+
+    def list_files(self, user_id: str, columns, sort: str, descending: bool, limit: int,
+                   after=None, prefix: str = None, name: str = None, ids=None):
+        self.file_columns([sort])
+        where, params = ["user_id = ?"], [user_id]
+        if name:
+            where.append("filename = ?")
+            params.append(name)
+        if ids:
+            where.append("id in (select value from json_each(?))")
+            params.append(json.dumps(list(ids)))
+        if prefix:
+            # A range rather than LIKE, which ignores case, so the filename index is used
+            where.append("filename >= ? and filename < ?")
+            params += [prefix, prefix + "\U0010ffff"]
+        if after:
+            where.append(f"({sort}, id) {'<' if descending else '>'} (?, ?)")
+            params += list(after)
+        direction = "desc" if descending else "asc"
+        return self.query(
+            f"select {self.file_columns(columns)} from file_metadata where {' and '.join(where)} "
+            f"order by {sort} {direction}, id {direction} limit ?",
+            params + [limit]
         )
-        return True, response
-    except Exception as e:
-        return False, str(e)
 
-def download_from_oci(object_name: str):
-    """Download file from OCI Object Storage"""
-    if not object_storage_client:
-        return False, "OCI not configured"
-    
-    try:
-        response = object_storage_client.get_object(
-            namespace_name=OCI_NAMESPACE,
-            bucket_name=OCI_BUCKET_NAME,
-            object_name=object_name
+    def get_file(self, user_id: str, file_id: str):
+        rows = self.query("select * from file_metadata where id = ? and user_id = ?", (file_id, user_id))
+        return rows[0] if rows else None
+
+    def find_files(self, user_id: str, column: str, values, columns=("id", "filename", "size")):
+        select_columns = self.file_columns(dict.fromkeys(tuple(columns) + (column,)))
+        return self.query(
+            f"select {select_columns} from file_metadata "
+            f"where user_id = ? and {column} in (select value from json_each(?))",
+            (user_id, json.dumps(list(values)))
+        )
+
+    def count_files(self, user_id: str):
+        return self.query("select count(*) as count from file_metadata where user_id = ?", (user_id,))[0]["count"]
+
+    def insert_files(self, rows):
+        now = datetime.now(timezone.utc).isoformat()
+        stored = [{"id": str(uuid.uuid4()), "uploaded_at": now, "created_at": now, **row} for row in rows]
+        with self.transaction() as conn:
+            conn.executemany(
+                f"insert into file_metadata ({', '.join(self.FILE_COLUMNS)}) "
+                f"values ({', '.join('?' * len(self.FILE_COLUMNS))})",
+                [
+                    [json.dumps(row["manifest"]) if column == "manifest" and row.get("manifest") is not None
+                     else row.get(column) for column in self.FILE_COLUMNS]
+                    for row in stored
+                ]
+            )
+        return stored
+
+    def delete_files(self, user_id: str, file_ids):
+        params = (user_id, json.dumps(list(file_ids)))
+        where = "user_id = ? and id in (select value from json_each(?))"
+        with self.transaction() as conn:
+            deleted = [self.row(row) for row in conn.execute(f"select * from file_metadata where {where}", params)]
+            conn.execute(f"delete from file_metadata where {where}", params)
+        return deleted
+
+    def listing_version(self, user_id: str):
+        rows = self.query("select version, updated_at from file_listing_versions where user_id = ?", (user_id,))
+        return rows[0] if rows else {"version": 0, "updated_at": None}
+
+    def latest_change(self, user_id: str, settled: str):
+        rows = self.query("select max(seq) as seq from file_changes where user_id = ?", (user_id,))
+        return rows[0]["seq"] or 0
+
+    def changes(self, user_id: str, since: int, settled: str, limit: int):
+        return self.query(
+            "select seq, op, file_id, filename, size, hash_sha256, content_fingerprint, changed_at "
+            "from file_changes where user_id = ? and seq > ? order by seq limit ?",
+            (user_id, since, limit)
+        )
+
+    def referenced_objects(self, after: str, prefix: str, limit: int, collect_before: str):
+        # Text compares as bytes here, which is the order storage lists objects in
+        rows = self.query(
+            "select oci_object_name as name from file_metadata where oci_object_name > ? and substr(oci_object_name, 1, ?) = ? "
+            "union all "
+            "select object_name from chunk_store where object_name > ? and substr(object_name, 1, ?) = ? "
+            "and not (ref_count <= 0 and coalesce(unreferenced_at, created_at) < ?) "
+            "order by name limit ?",
+            (after, len(prefix), prefix, after, len(prefix), prefix, collect_before, limit)
+        )
+        return [row["name"] for row in rows]
+
+    def find_chunks(self, user_id: str, chunk_ids):
+        rows = self.query(
+            "select chunk_id from chunk_store where user_id = ? and chunk_id in (select value from json_each(?))",
+            (user_id, json.dumps(list(chunk_ids)))
+        )
+        return {row["chunk_id"] for row in rows}
+
+    def register_chunk(self, user_id: str, chunk_id: str, object_name: str, size: int):
+        with self.transaction() as conn:
+            conn.execute(
+                "insert into chunk_store (user_id, chunk_id, object_name, size) values (?, ?, ?, ?) "
+                "on conflict (user_id, chunk_id) do nothing",
+                (user_id, chunk_id, object_name, size)
+            )
+
+    def adjust_chunk_refs(self, user_id: str, chunk_ids, delta: int):
+        occurrences = {}
+        for chunk_id in chunk_ids:
+            occurrences[chunk_id] = occurrences.get(chunk_id, 0) + 1
+        with self.transaction() as conn:
+            conn.executemany(
+                "update chunk_store set ref_count = ref_count + :delta, "
+                f"unreferenced_at = case when ref_count + :delta <= 0 then coalesce(unreferenced_at, {self.NOW}) end "
+                "where user_id = :user_id and chunk_id = :chunk_id",
+                [{"delta": delta * count, "user_id": user_id, "chunk_id": chunk_id}
+                 for chunk_id, count in occurrences.items()]
+            )
+
+    def delete_unreferenced_chunks(self, before: str, limit: int):
+        with self.transaction() as conn:
+            dead = [dict(row) for row in conn.execute(
+                "select user_id, chunk_id, object_name from chunk_store "
+                "where ref_count <= 0 and coalesce(unreferenced_at, created_at) < ? order by object_name limit ?",
+                (before, limit)
+            )]
+            conn.executemany(
+                "delete from chunk_store where user_id = ? and chunk_id = ?",
+                [(row["user_id"], row["chunk_id"]) for row in dead]
+            )
+        return dead
+
+    def create_upload_session(self, session: dict):
+        with self.transaction() as conn:
+            conn.execute(
+                "insert into upload_sessions (id, user_id, filename, size, part_size, content_fingerprint, "
+                "oci_object_name, oci_upload_id, created_at, expires_at) "
+                "values (:id, :user_id, :filename, :size, :part_size, :content_fingerprint, "
+                ":oci_object_name, :oci_upload_id, :created_at, :expires_at)",
+                session
+            )
+
+    def get_upload_session(self, user_id: str, session_id: str, now: str):
+        rows = self.query(
+            "select * from upload_sessions where id = ? and user_id = ? and expires_at > ?",
+            (session_id, user_id, now)
+        )
+        return rows[0] if rows else None
+
+    def record_upload_part(self, part: dict):
+        with self.transaction() as conn:
+            conn.execute(
+                "insert or replace into upload_parts (session_id, part_num, etag, size, sha256) "
+                "values (:session_id, :part_num, :etag, :size, :sha256)",
+                part
+            )
+
+    def get_upload_parts(self, session_id: str):
+        return self.query(
+            "select part_num, etag, size, sha256 from upload_parts where session_id = ? order by part_num",
+            (session_id,)
+        )
+
+    def delete_upload_session(self, session_id: str):
+        with self.transaction() as conn:
+            conn.execute("delete from upload_sessions where id = ?", (session_id,))
+
+    def expired_upload_sessions(self, now: str, limit: int):
+        return self.query(
+            "select id, oci_object_name, oci_upload_id from upload_sessions where expires_at <= ? "
+            "order by expires_at limit ?",
+            (now, limit)
+        )
+
+    def queue_object_deletions(self, user_id: str, failures: dict):
+        now = datetime.now(timezone.utc).isoformat()
+        with self.transaction() as conn:
+            conn.executemany(
+                "insert into object_gc_queue (object_name, user_id, last_error, queued_at, next_attempt_at) "
+                "values (?, ?, ?, ?, ?) "
+                "on conflict (object_name) do update set user_id = excluded.user_id, last_error = excluded.last_error",
+                [(object_name, user_id, error, now, now) for object_name, error in failures.items()]
+            )
+
+    def due_object_deletions(self, now: str, limit: int):
+        return self.query(
+            "select object_name, attempts from object_gc_queue where next_attempt_at <= ? "
+            "order by next_attempt_at limit ?",
+            (now, limit)
         )
-        return True, response.data.content
+
+    def dequeue_object_deletions(self, object_names):
+        with self.transaction() as conn:
+            conn.execute(
+                "delete from object_gc_queue where object_name in (select value from json_each(?))",
+                (json.dumps(list(object_names)),)
+            )
+
+    def retry_object_deletion(self, object_name: str, attempts: int, error: str, next_attempt_at: str):
+        with self.transaction() as conn:
+            conn.execute(
+                "update object_gc_queue set attempts = ?, last_error = ?, next_attempt_at = ? where object_name = ?",
+                (attempts, error, next_attempt_at, object_name)
+            )
+
+def create_metadata_store():
+    """The configured metadata store: METADATA_BACKEND, else Supabase when configured, else SQLite.
+
+    As with storage, a backend named in METADATA_BACKEND that cannot be
+    used is an error rather than a reason to fall back.
+    """
+    backend = METADATA_BACKEND or ("supabase" if supabase else "sqlite")
+    if backend == "supabase":
+        if not supabase:
+            raise RuntimeError("METADATA_BACKEND is supabase but the Supabase client is not available")
+        return SupabaseMetadataStore(supabase)
+    if backend != "sqlite":
+        raise ValueError(f"Unknown metadata backend {backend!r}; use supabase or sqlite")
+    print(f"Keeping metadata in SQLite at {METADATA_SQLITE_PATH}")
+    return SQLiteMetadataStore(METADATA_SQLITE_PATH)
+
+metadata = create_metadata_store()
+
+def get_user_files(user_id: str, limit: int = LIST_PAGE_SIZE, cursor=None, sort: str = "uploaded_at",
+                   descending: bool = True, prefix: str = None, name: str = None, ids=None,
+                   columns=FILE_LIST_COLUMNS):
+    """Get one page of user files from the metadata store.
+
+    Pages are ordered by (sort, id) and continue after cursor, a (sort value,
+    id) pair, so each page is an index range scan however deep it is.
+    Returns (files, next_cursor); next_cursor is None on the last page.
+    """
+    try:
+        select_columns = list(dict.fromkeys(("id", sort) + tuple(columns)))
+        rows = metadata.list_files(user_id, select_columns, sort, descending, limit + 1,
+                                   after=cursor, prefix=prefix, name=name, ids=ids)
+        next_cursor = encode_list_cursor(sort, descending, rows[limit - 1]) if len(rows) > limit else None
+        rows = rows[:limit]
+        if prefix:
+            # Stores may match loosely (PostgREST also treats * as a wildcard); keep only true prefix matches
+            rows = [row for row in rows if row["filename"].startswith(prefix)]
+        return rows, next_cursor
     except Exception as e:
-        return False, str(e)
+        print(f"Error getting user files: {e}")
+        return [], None
 
-def delete_from_oci(object_name: str):
-    """Delete file from OCI Object Storage"""
-    if not object_storage_client:
-        # Fallback: simulate successful deletion for development
-        print(f"OCI not available, simulating deletion for {object_name}")
-        return True, "Simulated deletion successful"
-    
+def get_listing_version(user_id: str):
+    """Return the user's listing version row ({version, updated_at}), or None if unavailable"""
     try:
-        print(f"🗑️  Deleting from OCI: {object_name}")
-        object_storage_client.delete_object(
-            namespace_name=OCI_NAMESPACE,
-            bucket_name=OCI_BUCKET_NAME,
-            object_name=object_name
-        )
-        print(f"File deleted successfully from OCI: {object_name}")
-        return True, "File deleted successfully"
+        return metadata.listing_version(user_id)
     except Exception as e:
-        print(f"Failed to delete from OCI: {object_name} - Error: {e}")
-        return False, str(e)
+        print(f"Warning: Could not read listing version: {e}")
+        return None
 
-def delete_file_metadata(user_id: str, file_id: str):
-    """Delete file metadata from Supabase"""
-    if not supabase:
-        # Fallback: simulate successful deletion for development
-        print(f"Supabase not available, simulating metadata deletion for {file_id}")
-        return True, {"oci_object_name": f"simulated/{file_id}"}
+def parse_timestamp(value):
+    """Parse a database timestamp into an aware UTC datetime (None stays None)"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def is_not_modified(etag: str, last_modified=None):
+    """Whether the request's validators show the client already has this representation"""
+    if request.if_none_match:
+        return etag is not None and request.if_none_match.contains(etag)
+    if request.if_modified_since and last_modified:
+        # HTTP dates have one second resolution
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+def with_validators(response, etag: str = None, last_modified=None):
+    """Attach ETag and Last-Modified; clients must revalidate before reusing the response"""
+    if etag:
+        response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified(etag: str = None, last_modified=None):
+    """304 response carrying the current validators"""
+    return with_validators(Response(status=304), etag, last_modified)
+
+def get_file_changes(user_id: str, since=None, limit: int = CHANGE_FEED_PAGE_SIZE):
+    """Return (changes, cursor, has_more) for the user's changes after sequence number since.
+
+    Without since, no changes are returned, only the cursor of the latest
+    one: clients take it before a full listing and poll from there.
+    """
+    settled = (datetime.now(timezone.utc) - timedelta(seconds=CHANGE_FEED_SETTLE)).isoformat()
+    if since is None:
+        return [], metadata.latest_change(user_id, settled), False
+    
+    rows = metadata.changes(user_id, since, settled, limit + 1)
+    changes = rows[:limit]
+    return changes, changes[-1]["seq"] if changes else since, len(rows) > limit
+
+def is_hex_digest(value) -> bool:
+    """Check that a client-supplied fingerprint or chunk id is a hex HMAC-SHA256"""
+    return isinstance(value, str) and re.fullmatch(r"[0-9a-f]{64}", value) is not None
+
+def find_or_copy_file(user_id: str, column: str, value: str, filename: str, copy: bool = True):
+    """Return (file, copied) for the user's file of this name whose content_fingerprint or hash_sha256 is value.
+
+    When only files of other names hold the content, the file is stored as
+    a copy of one of them (unless copy is false), so its content is not
+    uploaded again. Returns (None, False) if the user has no such content.
+    """
+    sources = metadata.find_files(user_id, column, [value], columns=FILE_SOURCE_COLUMNS)
+    for row in sources:
+        if row["filename"] == filename:
+            return row, False
+    for row in sources if copy and filename else []:
+        copied = copy_file(user_id, row, filename)
+        if copied:
+            return copied, True
+    return None, False
+
+def copy_file(user_id: str, source: dict, filename: str):
+    """Store filename as a copy of the user's file source, referencing its object or chunks.
+
+    Returns the new file, or None if it could not be stored or the source
+    was deleted meanwhile.
+    """
+    manifest = source.get("manifest")
+    chunk_ids = [chunk["id"] for chunk in manifest["chunks"]] if manifest else []
+    adjust_chunk_refs(user_id, chunk_ids, 1)
+    success, copied = store_file_metadata(user_id, filename, source["size"], source["hash_sha256"],
+                                          source["oci_object_name"], source["content_fingerprint"], manifest)
+    if not success:
+        adjust_chunk_refs(user_id, chunk_ids, -1)
+        return None
     
+    # The copy is stored before the source is checked: a deletion of the
+    # source either sees the copy and keeps the object, or is seen here
+    if metadata.get_file(user_id, source["id"]) is None:
+        success, deleted = delete_files_metadata(user_id, [copied["id"]])
+        if success:
+            release_file_storage(user_id, deleted)
+        return None
+    return copied
+
+def duplicate_result(existing: dict, copied: bool = False):
+    """Upload result for content the server already holds, under this name or (copied) another"""
+    return {
+        "success": True,
+        "message": "File stored as a copy of an existing file" if copied else "File already exists (duplicate detected)",
+        "file_id": existing["id"],
+        "filename": existing["filename"],
+        "size": existing["size"],
+        "duplicate": True,
+        "copied": copied
+    }
+
+def count_user_files(user_id: str):
+    """Number of files the user has stored"""
+    return metadata.count_files(user_id)
+
+def check_file_limit(user_id: str):
+    """Return an error response if the user is at the file limit, else None"""
     try:
-        # First get the file metadata to retrieve OCI object name
-        print(f"🔍 Getting metadata for file {file_id} (user: {user_id})")
-        response = supabase.table("file_metadata").select("*").eq("id", file_id).eq("user_id", user_id).execute()
-        
-        if not response.data:
-            print(f"File not found: {file_id}")
-            return False, "File not found"
-        
-        file_metadata = response.data[0]
-        print(f"Found file metadata: {file_metadata['filename']} -> {file_metadata['oci_object_name']}")
-        
-        # Delete the record from database
-        print(f"Deleting metadata from database for file {file_id}")
-        delete_response = supabase.table("file_metadata").delete().eq("id", file_id).eq("user_id", user_id).execute()
-        
-        verify_response = supabase.table("file_metadata").select("id").eq("id", file_id).eq("user_id", user_id).execute()
+        current_file_count = count_user_files(user_id)
+        if current_file_count >= MAX_FILES_PER_USER:
+            return jsonify({
+                "success": False,
+                "error": file_limit_message(current_file_count)
+            }), 400
         
-        if not verify_response.data:
-            print(f"Metadata deleted successfully for file {file_id}")
-            return True, file_metadata
-        else:
-            print(f"Metadata deletion failed - record still exists for {file_id}")
-            return False, "Failed to delete metadata"
-            
+        print(f"User {user_id} has {current_file_count}/{MAX_FILES_PER_USER} files")
+    except Exception as e:
+        print(f"Warning: Could not check file count: {e}")
+    return None
+
+def file_limit_message(file_count: int):
+    return (f"File limit exceeded. You have {file_count}/{MAX_FILES_PER_USER} files. "
+            "Please delete some files before uploading new ones.")
+
+def find_existing_files(user_id: str, fingerprints, hashes):
+    """Return the user's files matching any of these fingerprints or ciphertext hashes.
+
+    One query per kind of key; the result maps ("fingerprint", value,
+    filename) and ("hash", value, filename) to the file of that name, and
+    ("fingerprint", value) and ("hash", value) to a file of any name, which
+    a file of another name can be stored as a copy of.
+    """
+    existing = {}
+    for key, column, values in (("fingerprint", "content_fingerprint", fingerprints), ("hash", "hash_sha256", hashes)):
+        values = sorted(set(values))
+        if not values:
+            continue
+        for row in metadata.find_files(user_id, column, values, columns=FILE_SOURCE_COLUMNS):
+            existing.setdefault((key, row[column], row["filename"]), row)
+            existing.setdefault((key, row[column]), row)
+    return existing
+
+def file_metadata_row(user_id: str, filename: str, file_size: int, file_hash: str, oci_object_name: str,
+                      content_fingerprint: str = None, manifest: dict = None):
+    """Build the file_metadata row for a stored file"""
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "user_id": user_id,
+        "filename": filename,
+        "original_path": filename,  # Using filename as original_path for now
+        "encrypted_path": oci_object_name,  # OCI path as encrypted path
+        "size": file_size,
+        "hash_sha256": file_hash,
+        "content_fingerprint": content_fingerprint,
+        "manifest": manifest,
+        "oci_object_name": oci_object_name,
+        "uploaded_at": now,
+        "created_at": now
+    }
+
+def store_file_metadata(user_id: str, filename: str, file_size: int, file_hash: str, oci_object_name: str,
+                        content_fingerprint: str = None, manifest: dict = None):
+    """Store file metadata in the metadata store"""
+    success, result = store_file_metadata_batch([
+        file_metadata_row(user_id, filename, file_size, file_hash, oci_object_name, content_fingerprint, manifest)
+    ])
+    return success, result[0] if success else result
+
+def store_file_metadata_batch(rows):
+    """Insert file_metadata rows in one statement; returns (success, stored rows or error)"""
+    names = ", ".join(row["filename"] for row in rows)
+    try:
+        print(f"🔍 Storing metadata for {names} (user: {rows[0]['user_id']})")
+        stored = metadata.insert_files(rows)
+        print(f"Metadata stored successfully for {names}")
+        return True, stored
     except Exception as e:
-        print(f"Database error deleting metadata for {file_id}: {e}")
+        print(f"Database error storing metadata for {names}: {e}")
+        print(f"   Error type: {type(e).__name__}")
+        print(f"   Error details: {str(e)}")
         return False, str(e)
 
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    """Health check endpoint for Railway"""
-    return jsonify({
-        "status": "healthy",
-        "service": "SecureCloudFS API",
-        "version": "1.0.0",
-        "oci_available": OCI_AVAILABLE,
-        "supabase_available": SUPABASE_AVAILABLE,
-        "oci_configured": object_storage_client is not None,
-        "supabase_configured": supabase is not None
-    })
+def chunk_object_name(user_id: str, chunk_id: str):
+    """OCI object holding one encrypted chunk of the user's chunk store"""
+    return f"{user_id}/chunks/{chunk_id}"
 
-@app.route('/api/debug', methods=['GET'])
-def debug_info():
-    """Debug endpoint to check configuration"""
-    debug_data = {
-        "service": "SecureCloudFS API Debug",
-        "environment": {
-            "OCI_USER_OCID": "configured" if os.getenv("OCI_USER_OCID") else "missing",
-            "OCI_FINGERPRINT": "configured" if os.getenv("OCI_FINGERPRINT") else "missing",
-            "OCI_TENANCY_OCID": "configured" if os.getenv("OCI_TENANCY_OCID") else "missing",
-            "OCI_REGION": os.getenv("OCI_REGION", "not set"),
-            "OCI_NAMESPACE": os.getenv("OCI_NAMESPACE", "not set"),
-            "OCI_BUCKET_NAME": os.getenv("OCI_BUCKET_NAME", "not set"),
-            "OCI_KEY_CONTENT": "configured" if get_oci_key_content() else "missing",
+def find_chunks(user_id: str, chunk_ids):
+    """Return the subset of chunk_ids already in the user's chunk store"""
+    return metadata.find_chunks(user_id, chunk_ids)
+
+def register_chunk(user_id: str, chunk_id: str, size: int):
+    """Record a stored chunk; it stays unreferenced until a manifest uses it"""
+    metadata.register_chunk(user_id, chunk_id, chunk_object_name(user_id, chunk_id), size)
+
+def adjust_chunk_refs(user_id: str, chunk_ids, delta: int):
+    """Add delta to the reference count of each chunk (once per occurrence).
+
+    Chunks whose count drops to zero are left for the garbage collector,
+    which deletes them once they have stayed unreferenced for
+    CHUNK_GC_GRACE seconds, so a manifest committed meanwhile can still
+    claim them.
+    """
+    if not chunk_ids:
+        return
+    metadata.adjust_chunk_refs(user_id, chunk_ids, delta)
+
+class StoredObject(ABC):
+    """Open body of a stored object (or of a byte range of it) of length bytes.
+
+    Read it with stream(), which closes it when done, or hand it to the
+    WSGI server with object_body().
+    """
+
+    def __init__(self, length: int = None):
+        self.length = length
+
+    @abstractmethod
+    def stream(self, chunk_size: int = DOWNLOAD_CHUNK_SIZE):
+        """Yield the body in chunks, closing it when done"""
+        raise NotImplementedError
+
+    def fileobj(self):
+        """Open file positioned at the body, which runs to its end, for sendfile(); else None"""
+        return None
+
+class OCIObject(StoredObject):
+    def __init__(self, response):
+        content_length = response.headers.get('Content-Length')
+        super().__init__(int(content_length) if content_length else None)
+        self.response = response
+
+    def stream(self, chunk_size: int = DOWNLOAD_CHUNK_SIZE):
+        """Yield the body in fixed-size chunks, releasing the connection when done"""
+        try:
+            for chunk in self.response.data.raw.stream(chunk_size, decode_content=False):
+                yield chunk
+        finally:
+            self.response.data.close()
+
+class LocalObject(StoredObject):
+    def __init__(self, file, length: int, to_end: bool = True):
+        super().__init__(length)
+        self.file = file
+        self.to_end = to_end
+
+    def stream(self, chunk_size: int = DOWNLOAD_CHUNK_SIZE):
+        try:
+            remaining = self.length
+            while remaining > 0:
+                chunk = self.file.read(min(chunk_size, remaining))
+                if not chunk:
+                    raise IOError("Object is shorter than its recorded length")
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            self.file.close()
+
+    def fileobj(self):
+        # Not every WSGI server stops a file wrapper at Content-Length
+        return self.file if self.to_end else None
+
+class StorageBackend(ABC):
+    """Where encrypted objects are kept.
+
+    Objects are addressed by name and never modified once written. Like the
+    rest of the API, operations return (success, result or error) instead of
+    raising; deleting an object that does not exist succeeds.
+    """
+
+    name = None
+
+    @abstractmethod
+    def put(self, object_name: str, data, size: int = None):
+        """Store bytes or a readable stream (of size bytes, if known) under object_name"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get(self, object_name: str, byte_range=None):
+        """Open an object, or the inclusive (start, end) byte_range of it, as a StoredObject"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, object_name: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    def list(self, prefix: str = "", start: str = None, limit: int = RECONCILE_PAGE_SIZE):
+        """One page of (name, time_created) in name order from start on, and the name to continue from (or None)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def create_multipart(self, object_name: str):
+        """Start a multipart upload, returning (success, upload id or error)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def upload_part(self, object_name: str, upload_id: str, part_num: int, part_data, size: int):
+        """Store one part of a multipart upload, returning (success, etag or error)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def commit_multipart(self, object_name: str, upload_id: str, parts):
+        """Assemble the uploaded parts, given as (part_num, etag) pairs, into the object"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def abort_multipart(self, object_name: str, upload_id: str):
+        """Discard a multipart upload and the parts stored for it"""
+        raise NotImplementedError
+
+class OCIStorage(StorageBackend):
+    """OCI Object Storage bucket"""
+
+    name = "oci"
+
+    def __init__(self, client, namespace: str, bucket: str):
+        self.client = client
+        self.namespace = namespace
+        self.bucket = bucket
+
+    def put(self, object_name: str, data, size: int = None):
+        """Upload to OCI; streams of at least MULTIPART_UPLOAD_THRESHOLD bytes go as a parallel multipart upload"""
+        try:
+            if size is not None and size >= MULTIPART_UPLOAD_THRESHOLD and hasattr(data, "read"):
+                upload_manager = oci.object_storage.UploadManager(self.client, allow_parallel_uploads=True)
+                response = upload_manager.upload_stream(
+                    self.namespace,
+                    self.bucket,
+                    object_name,
+                    data,
+                    part_size=MULTIPART_PART_SIZE
+                )
+                return True, response
+            
+            kwargs = {}
+            if size is not None:
+                kwargs["content_length"] = size
+            response = self.client.put_object(
+                namespace_name=self.namespace,
+                bucket_name=self.bucket,
+                object_name=object_name,
+                put_object_body=data,
+                **kwargs
+            )
+            return True, response
+        except Exception as e:
+            return False, str(e)
+
+    def get(self, object_name: str, byte_range=None):
+        """Open a streaming download; the body is not read here"""
+        try:
+            kwargs = {}
+            if byte_range:
+                kwargs["range"] = f"bytes={byte_range[0]}-{byte_range[1]}"
+            response = self.client.get_object(
+                namespace_name=self.namespace,
+                bucket_name=self.bucket,
+                object_name=object_name,
+                **kwargs
+            )
+            return True, OCIObject(response)
+        except Exception as e:
+            return False, str(e)
+
+    def delete(self, object_name: str):
+        try:
+            print(f"🗑️  Deleting from OCI: {object_name}")
+            self.client.delete_object(
+                namespace_name=self.namespace,
+                bucket_name=self.bucket,
+                object_name=object_name
+            )
+            print(f"File deleted successfully from OCI: {object_name}")
+            return True, "File deleted successfully"
+        except Exception as e:
+            if getattr(e, "status", None) == 404:
+                # Already gone, e.g. removed by an earlier attempt
+                return True, "File already deleted"
+            print(f"Failed to delete from OCI: {object_name} - Error: {e}")
+            return False, str(e)
+
+    def list(self, prefix: str = "", start: str = None, limit: int = RECONCILE_PAGE_SIZE):
+        response = self.client.list_objects(
+            self.namespace,
+            self.bucket,
+            prefix=prefix or None,
+            start=start,
+            limit=limit,
+            fields="name,timeCreated"
+        )
+        return [(obj.name, obj.time_created) for obj in response.data.objects], response.data.next_start_with
+
+    def create_multipart(self, object_name: str):
+        try:
+            response = self.client.create_multipart_upload(
+                namespace_name=self.namespace,
+                bucket_name=self.bucket,
+                create_multipart_upload_details=oci.object_storage.models.CreateMultipartUploadDetails(
+                    object=object_name
+                )
+            )
+            return True, response.data.upload_id
+        except Exception as e:
+            return False, str(e)
+
+    def upload_part(self, object_name: str, upload_id: str, part_num: int, part_data, size: int):
+        try:
+            response = self.client.upload_part(
+                namespace_name=self.namespace,
+                bucket_name=self.bucket,
+                object_name=object_name,
+                upload_id=upload_id,
+                upload_part_num=part_num,
+                upload_part_body=part_data,
+                content_length=size
+            )
+            return True, response.headers.get('etag')
+        except Exception as e:
+            return False, str(e)
+
+    def commit_multipart(self, object_name: str, upload_id: str, parts):
+        try:
+            response = self.client.commit_multipart_upload(
+                namespace_name=self.namespace,
+                bucket_name=self.bucket,
+                object_name=object_name,
+                upload_id=upload_id,
+                commit_multipart_upload_details=oci.object_storage.models.CommitMultipartUploadDetails(
+                    parts_to_commit=[
+                        oci.object_storage.models.CommitMultipartUploadPartDetails(part_num=part_num, etag=etag)
+                        for part_num, etag in parts
+                    ]
+                )
+            )
+            return True, response
+        except Exception as e:
+            return False, str(e)
+
+    def abort_multipart(self, object_name: str, upload_id: str):
+        try:
+            self.client.abort_multipart_upload(
+                namespace_name=self.namespace,
+                bucket_name=self.bucket,
+                object_name=object_name,
+                upload_id=upload_id
+            )
+            return True, "Multipart upload aborted"
+        except Exception as e:
+            if getattr(e, "status", None) == 404:
+                # Already committed or aborted
+                return True, "Multipart upload aborted"
+            return False, str(e)
+
+class LocalStorage(StorageBackend):
+    """Objects in a directory on local disk, for development and load tests.
+
+    Each object is a file named by the SHA-256 of its name, sharded into two
+    levels of 256 directories so no directory grows too large. The file holds
+    a short header with the object name, then the bytes as stored, so
+    downloads can be sent with sendfile() from an offset. Writes go to a
+    temp file that is renamed into place once complete; fsync is "always"
+    (file and directory, so an acknowledged write survives a crash), "file",
+    or "never" (leave it to the OS). Multipart parts are staged under
+    .uploads and concatenated on commit.
+    """
+
+    name = "local"
+    HEADER = struct.Struct(">H")
+
+    def __init__(self, root: str, fsync: str = "always"):
+        if fsync not in LOCAL_FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync!r}; use one of {', '.join(LOCAL_FSYNC_POLICIES)}")
+        self.root = os.path.abspath(root)
+        self.fsync = fsync
+        self.temp_dir = os.path.join(self.root, ".tmp")
+        self.uploads_dir = os.path.join(self.root, ".uploads")
+        os.makedirs(self.temp_dir, exist_ok=True)
+        os.makedirs(self.uploads_dir, exist_ok=True)
+        # (prefix, built at, sorted [(name, modified)]) of the latest listing
+        self.listing = None
+
+    def _path(self, object_name: str):
+        digest = hashlib.sha256(object_name.encode()).hexdigest()
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def _sync_dir(self, path: str):
+        if self.fsync == "always":
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _write(self, path: str, header: bytes, write):
+        """Write header, then write(file), to a temp file and rename it to path; returns the bytes written by write.
+
+        If write raises, path is left as it was.
+        """
+        temp_path = os.path.join(self.temp_dir, uuid.uuid4().hex)
+        try:
+            with open(temp_path, "wb") as f:
+                f.write(header)
+                written = write(f)
+                f.flush()
+                if self.fsync != "never":
+                    os.fsync(f.fileno())
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            os.replace(temp_path, path)
+            self._sync_dir(directory)
+            return written
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    @staticmethod
+    def _copy(data, f, size: int = None):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            f.write(data)
+            return len(data)
+        written = 0
+        for block in iter(lambda: data.read(DOWNLOAD_CHUNK_SIZE), b""):
+            f.write(block)
+            written += len(block)
+            if size is not None and written > size:
+                break
+        return written
+
+    def _header(self, object_name: str) -> bytes:
+        encoded = object_name.encode()
+        return self.HEADER.pack(len(encoded)) + encoded
+
+    def _open(self, path: str):
+        """Open an object file, returning (file positioned at the data, object name, data length)"""
+        f = open(path, "rb")
+        try:
+            (name_length,) = self.HEADER.unpack(f.read(self.HEADER.size))
+            name = f.read(name_length).decode()
+            return f, name, os.fstat(f.fileno()).st_size - self.HEADER.size - name_length
+        except BaseException:
+            f.close()
+            raise
+
+    def put(self, object_name: str, data, size: int = None):
+        def write(f):
+            written = self._copy(data, f, size)
+            # Checked before the rename, so a short upload never replaces the object
+            if size is not None and written != size:
+                raise ValueError(f"Expected {size} bytes but got {written}")
+            return written
+        
+        try:
+            self._write(self._path(object_name), self._header(object_name), write)
+            return True, "Stored"
+        except (OSError, ValueError) as e:
+            return False, str(e)
+
+    def get(self, object_name: str, byte_range=None):
+        try:
+            f, _, length = self._open(self._path(object_name))
+        except FileNotFoundError:
+            return False, "Object not found"
+        except OSError as e:
+            return False, str(e)
+        if not byte_range:
+            return True, LocalObject(f, length)
+        start, end = byte_range[0], min(byte_range[1], length - 1)
+        f.seek(start, os.SEEK_CUR)
+        return True, LocalObject(f, max(end - start + 1, 0), end == length - 1)
+
+    def delete(self, object_name: str):
+        path = self._path(object_name)
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return True, "File already deleted"
+        except OSError as e:
+            print(f"Failed to delete from local storage: {object_name} - Error: {e}")
+            return False, str(e)
+        self._sync_dir(os.path.dirname(path))
+        return True, "File deleted successfully"
+
+    def _scan(self, prefix: str):
+        """(name, modified) of every object under prefix, sorted by name"""
+        objects = []
+        for directory, subdirs, files in os.walk(self.root):
+            if directory == self.root:
+                subdirs[:] = [d for d in subdirs if not d.startswith(".")]
+            for file in files:
+                try:
+                    f, name, _ = self._open(os.path.join(directory, file))
+                except (OSError, struct.error, UnicodeDecodeError):
+                    continue
+                with f:
+                    modified = datetime.fromtimestamp(os.fstat(f.fileno()).st_mtime, timezone.utc)
+                if name.startswith(prefix):
+                    objects.append((name, modified))
+        objects.sort()
+        return objects
+
+    def list(self, prefix: str = "", start: str = None, limit: int = RECONCILE_PAGE_SIZE):
+        """Names are hashed, so there is no order on disk: the first page
+        walks every shard and keeps the sorted listing, and the pages after
+        it are cut from that (it is walked again if it is older than
+        LOCAL_LISTING_TTL or was built for another prefix). Objects written
+        meanwhile may be missed, as with any listing of a changing bucket.
+        """
+        listing = self.listing
+        if start is None or not listing or listing[0] != prefix or time.monotonic() - listing[1] > LOCAL_LISTING_TTL:
+            listing = self.listing = (prefix, time.monotonic(), self._scan(prefix))
+        objects = listing[2]
+        first = 0 if start is None else bisect.bisect_left(objects, (start,))
+        page = objects[first:first + limit + 1]
+        # The extra name is where the next page starts
+        if len(page) > limit:
+            return page[:limit], page[limit][0]
+        return page, None
+
+    def _upload_dir(self, upload_id: str):
+        if not re.fullmatch(r"[0-9a-f]{32}", upload_id or ""):
+            raise ValueError("Invalid upload id")
+        return os.path.join(self.uploads_dir, upload_id)
+
+    def create_multipart(self, object_name: str):
+        upload_id = uuid.uuid4().hex
+        try:
+            os.makedirs(self._upload_dir(upload_id))
+            return True, upload_id
+        except OSError as e:
+            return False, str(e)
+
+    def upload_part(self, object_name: str, upload_id: str, part_num: int, part_data, size: int):
+        hasher = hashlib.sha256()
+        
+        def write(f):
+            written = 0
+            for block in iter(lambda: part_data.read(DOWNLOAD_CHUNK_SIZE), b""):
+                hasher.update(block)
+                f.write(block)
+                written += len(block)
+            return written
+        
+        try:
+            path = os.path.join(self._upload_dir(upload_id), str(part_num))
+            if not os.path.isdir(os.path.dirname(path)):
+                return False, "Upload not found"
+            if self._write(path, b"", write) != size:
+                return False, f"Part {part_num} must be {size} bytes"
+            return True, hasher.hexdigest()
+        except (OSError, ValueError) as e:
+            return False, str(e)
+
+    def commit_multipart(self, object_name: str, upload_id: str, parts):
+        def write(f):
+            written = 0
+            for part_num, _ in parts:
+                with open(os.path.join(upload_dir, str(part_num)), "rb") as part:
+                    written += self._copy(part, f)
+            return written
+        
+        try:
+            upload_dir = self._upload_dir(upload_id)
+            self._write(self._path(object_name), self._header(object_name), write)
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            return True, "Committed"
+        except (OSError, ValueError) as e:
+            return False, str(e)
+
+    def abort_multipart(self, object_name: str, upload_id: str):
+        try:
+            shutil.rmtree(self._upload_dir(upload_id))
+            return True, "Multipart upload aborted"
+        except FileNotFoundError:
+            return True, "Multipart upload aborted"
+        except (OSError, ValueError) as e:
+            return False, str(e)
+
+def create_storage():
+    """The configured storage backend: STORAGE_BACKEND, else OCI when configured, else local disk.
+
+    A backend named in STORAGE_BACKEND that cannot be used is an error
+    rather than a reason to fall back: objects must not silently land on
+    local disk.
+    """
+    backend = STORAGE_BACKEND or ("oci" if object_storage_client else "local")
+    if backend == "oci":
+        if not object_storage_client:
+            raise RuntimeError("STORAGE_BACKEND is oci but the OCI client is not available")
+        return OCIStorage(object_storage_client, OCI_NAMESPACE, OCI_BUCKET_NAME)
+    if backend != "local":
+        raise ValueError(f"Unknown storage backend {backend!r}; use oci or local")
+    print(f"Storing objects on local disk in {LOCAL_STORAGE_PATH} (fsync: {LOCAL_STORAGE_FSYNC})")
+    return LocalStorage(LOCAL_STORAGE_PATH, LOCAL_STORAGE_FSYNC)
+
+def object_body(stored: StoredObject):
+    """Response body for a stored object, sent with sendfile() where the WSGI server supports it.
+
+    The server's file wrapper starts at the current file position. Callers
+    must set the Content-Length header.
+    """
+    file_wrapper = request.environ.get("wsgi.file_wrapper")
+    fileobj = stored.fileobj()
+    if file_wrapper and fileobj:
+        return file_wrapper(fileobj, DOWNLOAD_CHUNK_SIZE)
+    return stored.stream()
+
+storage = create_storage()
+
+def delete_objects(object_names):
+    """Delete stored objects concurrently; returns {object_name: error} for those that failed"""
+    if not object_names:
+        return {}
+    with ThreadPoolExecutor(max_workers=OBJECT_DELETE_WORKERS) as executor:
+        outcomes = executor.map(storage.delete, object_names)
+        return {name: result for name, (success, result) in zip(object_names, outcomes) if not success}
+
+def queue_object_deletions(user_id: str, failures: dict):
+    """Queue stored objects whose deletion failed for the garbage collector"""
+    if not failures:
+        return
+    
+    try:
+        metadata.queue_object_deletions(user_id, {
+            object_name: str(error)[:500] for object_name, error in failures.items()
+        })
+        print(f"Queued {len(failures)} objects for garbage collection")
+    except Exception as e:
+        print(f"Warning: Could not queue {len(failures)} objects for garbage collection: {e}")
+
+def chunk_collection_cutoff():
+    """Chunks unreferenced since before this time belong to the garbage collector"""
+    return (datetime.now(timezone.utc) - timedelta(seconds=CHUNK_GC_GRACE)).isoformat()
+
+def collect_unreferenced_chunks(limit: int = GC_BATCH_SIZE):
+    """Delete chunks that stayed unreferenced past the grace period; returns (deleted, failed)
+
+    Rows are deleted before their objects, so no manifest can claim a
+    chunk whose object is going away; objects that cannot be deleted are
+    queued for collect_garbage() to retry.
+    """
+    dead = metadata.delete_unreferenced_chunks(chunk_collection_cutoff(), limit)
+    if not dead:
+        return 0, 0
+    
+    failed = delete_objects([row["object_name"] for row in dead])
+    failures_by_user = {}
+    for row in dead:
+        if row["object_name"] in failed:
+            failures_by_user.setdefault(row["user_id"], {})[row["object_name"]] = failed[row["object_name"]]
+    for user_id, failures in failures_by_user.items():
+        queue_object_deletions(user_id, failures)
+    return len(dead) - len(failed), len(failed)
+
+def abort_expired_uploads(limit: int = GC_BATCH_SIZE):
+    """Abort the multipart uploads of expired sessions and forget the sessions; returns (aborted, failed)
+
+    A session whose upload cannot be aborted is kept, so the next pass retries it.
+    """
+    expired = metadata.expired_upload_sessions(datetime.now(timezone.utc).isoformat(), limit)
+    aborted = 0
+    for session in expired:
+        abort_success, abort_result = storage.abort_multipart(session["oci_object_name"], session["oci_upload_id"])
+        if not abort_success:
+            print(f"Warning: Could not abort expired upload session {session['id']}: {abort_result}")
+            continue
+        delete_upload_session(session["id"])
+        aborted += 1
+    return aborted, len(expired) - aborted
+
+def collect_garbage(limit: int = GC_BATCH_SIZE):
+    """Retry the queued object deletions that are due, collect unreferenced
+    chunks and abort expired uploads; returns (deleted, still failing)"""
+    deleted, failed = retry_object_deletions(limit)
+    chunks_deleted, chunks_failed = collect_unreferenced_chunks(limit)
+    aborted, abort_failed = abort_expired_uploads(limit)
+    return deleted + chunks_deleted + aborted, failed + chunks_failed + abort_failed
+
+def retry_object_deletions(limit: int = GC_BATCH_SIZE):
+    """Retry the queued object deletions that are due; returns (deleted, still failing)"""
+    now = datetime.now(timezone.utc)
+    due = metadata.due_object_deletions(now.isoformat(), limit)
+    if not due:
+        return 0, 0
+    
+    failed = delete_objects([row["object_name"] for row in due])
+    deleted = [row["object_name"] for row in due if row["object_name"] not in failed]
+    if deleted:
+        metadata.dequeue_object_deletions(deleted)
+    for row in due:
+        if row["object_name"] in failed:
+            attempts = row["attempts"] + 1
+            delay = min(GC_INTERVAL * 2 ** attempts, GC_MAX_DELAY)
+            metadata.retry_object_deletion(
+                row["object_name"], attempts, str(failed[row["object_name"]])[:500],
+                (now + timedelta(seconds=delay)).isoformat()
+            )
+    return len(deleted), len(failed)
+
+def start_garbage_collector(interval: int = GC_INTERVAL):
+    """Run collect_garbage() every interval seconds on a daemon thread"""
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                deleted, failed = collect_garbage()
+                if deleted or failed:
+                    print(f"Garbage collection: {deleted} objects deleted, {failed} still failing")
+            except Exception as e:
+                print(f"Garbage collection failed: {e}")
+    
+    thread = threading.Thread(target=run, name="scfs-gc", daemon=True)
+    thread.start()
+    return thread
+
+garbage_collector = None
+garbage_collector_lock = threading.Lock()
+
+@app.before_request
+def ensure_garbage_collector():
+    """Start the garbage collector once per process, on its first request.
+
+    Starting here rather than at import keeps it running under any WSGI
+    server, in each worker process after it has been forked.
+    """
+    global garbage_collector
+    if garbage_collector or GC_INTERVAL <= 0:
+        return
+    with garbage_collector_lock:
+        if not garbage_collector:
+            garbage_collector = start_garbage_collector()
+
+def iter_stored_objects(prefix: str = "", page_size: int = RECONCILE_PAGE_SIZE):
+    """Yield (name, time_created) of every stored object, in name order, a page at a time"""
+    start = None
+    while True:
+        objects, start = storage.list(prefix, start, page_size)
+        yield from objects
+        if not start:
+            return
+
+def iter_referenced_objects(prefix: str = "", page_size: int = RECONCILE_PAGE_SIZE):
+    """Yield every object name the database refers to (files and chunks), in byte order"""
+    collect_before = chunk_collection_cutoff()
+    after = ""
+    while True:
+        names = metadata.referenced_objects(after, prefix, page_size, collect_before)
+        yield from names
+        if len(names) < page_size:
+            return
+        after = names[-1]
+
+def _in_order(items, key=lambda item: item):
+    """Pass items through, failing if their names are not ascending: the merge join would be wrong"""
+    previous = None
+    for item in items:
+        name = key(item)
+        if previous is not None and name < previous:
+            raise ValueError(f"Listing out of order: {name!r} after {previous!r}")
+        previous = name
+        yield item
+
+def reconcile(objects, referenced, grace: float = RECONCILE_GRACE, now=None):
+    """Merge-join stored objects with referenced names, both sorted by name.
+
+    objects yields (name, time_created) and referenced yields names; each is
+    read once, so memory stays constant however large the bucket. Yields
+    ("orphan", name) for objects nothing refers to, skipping those younger
+    than grace seconds, and ("missing", name) for references to objects
+    that do not exist.
+    """
+    now = now or datetime.now(timezone.utc)
+    objects, referenced = _in_order(objects, key=lambda item: item[0]), _in_order(referenced)
+    reference = next(referenced, None)
+    for name, time_created in objects:
+        while reference is not None and reference < name:
+            yield "missing", reference
+            reference = next(referenced, None)
+        if reference == name:
+            while reference == name:
+                reference = next(referenced, None)
+        elif time_created is None or (now - time_created).total_seconds() >= grace:
+            yield "orphan", name
+    while reference is not None:
+        yield "missing", reference
+        reference = next(referenced, None)
+
+def run_reconciliation(objects, referenced, delete: bool = False, grace: float = RECONCILE_GRACE,
+                       batch_size: int = RECONCILE_PAGE_SIZE):
+    """Report orphaned objects and dangling references; with delete, remove the orphans.
+
+    Orphans are deleted concurrently, batch_size at a time, while the
+    listings are still being read. Returns a summary of counts.
+    """
+    summary = {"orphans": 0, "deleted": 0, "failed": 0, "missing": 0}
+    batch = []
+    
+    def flush():
+        failed = delete_objects(batch)
+        summary["deleted"] += len(batch) - len(failed)
+        summary["failed"] += len(failed)
+        batch.clear()
+    
+    for kind, name in reconcile(objects, referenced, grace):
+        if kind == "missing":
+            summary["missing"] += 1
+            print(f"Missing object (referenced in the database): {name}")
+            continue
+        summary["orphans"] += 1
+        print(f"Orphaned object: {name}")
+        if delete:
+            batch.append(name)
+            if len(batch) >= batch_size:
+                flush()
+    if batch:
+        flush()
+    return summary
+
+def is_file_id(value) -> bool:
+    """Check that a client-supplied file id is a UUID, as file_metadata ids are"""
+    try:
+        uuid.UUID(value)
+        return True
+    except (TypeError, ValueError, AttributeError):
+        return False
+
+def delete_files_metadata(user_id: str, file_ids):
+    """Delete the user's file metadata rows with these ids in one statement.
+
+    Returns (success, deleted rows or error). The delete returns the rows it
+    removed, so ids that matched nothing are simply absent from them.
+    """
+    try:
+        print(f"Deleting metadata for {len(file_ids)} files (user: {user_id})")
+        deleted = metadata.delete_files(user_id, file_ids)
+        print(f"Metadata deleted for {len(deleted)} of {len(file_ids)} files")
+        return True, deleted
+    except Exception as e:
+        print(f"Database error deleting metadata for {len(file_ids)} files: {e}")
+        return False, str(e)
+
+def delete_file_metadata(user_id: str, file_id: str):
+    """Delete file metadata from the metadata store"""
+    if not is_file_id(file_id):
+        return False, "File not found"
+    
+    success, result = delete_files_metadata(user_id, [file_id])
+    if not success:
+        return False, result
+    if not result:
+        print(f"File not found: {file_id}")
+        return False, "File not found"
+    return True, result[0]
+
+def unreferenced_objects(user_id: str, object_names):
+    """The object_names no file of the user references any more.
+
+    Copies share their source's object, which goes with the last file
+    referencing it. If the references cannot be checked, none are returned
+    and reconciliation removes the objects left behind.
+    """
+    if not object_names:
+        return []
+    try:
+        referenced = {
+            row["oci_object_name"]
+            for row in metadata.find_files(user_id, "oci_object_name", object_names, columns=("oci_object_name",))
+        }
+    except Exception as e:
+        print(f"Warning: Could not check which objects are still referenced: {e}")
+        return []
+    return [name for name in object_names if name not in referenced]
+
+def release_file_storage(user_id: str, deleted_files):
+    """Free what deleted files held: chunk references of manifest files, OCI objects of the rest.
+
+    Objects that cannot be deleted now are queued for the garbage collector.
+    Returns {object_name: error} for those.
+    """
+    chunk_ids = [chunk["id"] for row in deleted_files if row.get("manifest") for chunk in row["manifest"]["chunks"]]
+    # Chunks may be shared with other files; unreferenced ones are garbage collected
+    adjust_chunk_refs(user_id, chunk_ids, -1)
+    
+    failed = delete_objects(unreferenced_objects(user_id, list(dict.fromkeys(
+        row["oci_object_name"] for row in deleted_files if not row.get("manifest") and row.get("oci_object_name")
+    ))))
+    if failed:
+        print(f"Warning: File metadata deleted but OCI deletion failed for {len(failed)} objects")
+        queue_object_deletions(user_id, failed)
+    return failed
+
+def create_upload_session(session: dict):
+    """Persist a new upload session"""
+    metadata.create_upload_session(session)
+
+def get_upload_session(user_id: str, session_id: str):
+    """Return the user's unexpired upload session, or None"""
+    return metadata.get_upload_session(user_id, session_id, datetime.now(timezone.utc).isoformat())
+
+def record_upload_part(session_id: str, part_num: int, etag: str, size: int, sha256: str):
+    """Acknowledge a stored part; re-sending a part replaces the earlier record"""
+    metadata.record_upload_part({"session_id": session_id, "part_num": part_num, "etag": etag, "size": size, "sha256": sha256})
+
+def get_upload_parts(session_id: str):
+    """Acknowledged parts of a session, ordered by part number"""
+    return metadata.get_upload_parts(session_id)
+
+def delete_upload_session(session_id: str):
+    """Forget a session; its parts are removed with it"""
+    metadata.delete_upload_session(session_id)
+
+def expected_part_size(session: dict, part_num: int):
+    """Size of part part_num (1-based) of a session, or None if out of range"""
+    part_size = session["part_size"]
+    part_count = max(1, -(-session["size"] // part_size))
+    if not 1 <= part_num <= part_count:
+        return None
+    return min(part_size, session["size"] - (part_num - 1) * part_size)
+
+def describe_upload_session(session: dict, parts):
+    """Client view of a session: which byte ranges the server has acknowledged"""
+    part_size = session["part_size"]
+    return {
+        "success": True,
+        "session_id": session["id"],
+        "filename": session["filename"],
+        "size": session["size"],
+        "part_size": part_size,
+        "part_count": max(1, -(-session["size"] // part_size)),
+        "parts": [
+            {"part_num": part["part_num"], "offset": (part["part_num"] - 1) * part_size, "size": part["size"]}
+            for part in parts
+        ],
+        "expires_at": session["expires_at"]
+    }
+
+def manifest_pieces(user_id: str, manifest: dict, byte_range=None):
+    """Yield (object name, byte range) for each chunk overlapping byte_range of a chunked file.
+
+    The range is None for chunks that are needed whole.
+    """
+    offset = 0
+    for chunk in manifest["chunks"]:
+        chunk_end = offset + chunk["enc_size"] - 1
+        if byte_range is None:
+            yield chunk_object_name(user_id, chunk["id"]), None
+        elif chunk_end >= byte_range[0] and offset <= byte_range[1]:
+            first = max(byte_range[0], offset) - offset
+            last = min(byte_range[1], chunk_end) - offset
+            whole = first == 0 and last == chunk["enc_size"] - 1
+            yield chunk_object_name(user_id, chunk["id"]), None if whole else (first, last)
+        offset = chunk_end + 1
+
+def stream_chunk_objects(pieces):
+    """Yield the concatenation of several stored objects (or ranges of them), opening one at a time"""
+    for object_name, byte_range in pieces:
+        download_success, stored = storage.get(object_name, byte_range)
+        if not download_success:
+            # Headers are already sent; cutting the body short lets the client detect it
+            raise IOError(f"Chunk {object_name} unavailable: {stored}")
+        yield from stored.stream()
+
+def parse_range_header(range_header: str, size: int):
+    """Parse a single 'bytes=' range into an inclusive (start, end) tuple.
+
+    Returns None when there is no usable range (the whole object is served)
+    and raises ValueError when the range cannot be satisfied.
+    """
+    match = re.fullmatch(r"bytes=(\d*)-(\d*)", (range_header or "").strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the last N bytes
+        if int(last) == 0 or size == 0:
+            raise ValueError(f"Range {range_header} not satisfiable for {size} bytes")
+        return max(size - int(last), 0), size - 1
+    
+    start = int(first)
+    end = int(last) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(f"Range {range_header} not satisfiable for {size} bytes")
+    return start, min(end, size - 1)
+
+@app.route('/api/health', methods=['GET'])
+def health_check():
+    """Health check endpoint for Railway"""
+    return jsonify({
+        "status": "healthy",
+        "service": "SecureCloudFS API",
+        "version": "1.0.0",
+        "oci_available": OCI_AVAILABLE,
+        "supabase_available": SUPABASE_AVAILABLE,
+        "oci_configured": object_storage_client is not None,
+        "storage_backend": storage.name,
+        "metadata_backend": metadata.name,
+        "supabase_configured": supabase is not None
+    })
+
+@app.route('/api/limits', methods=['GET'])
+def upload_limits():
+    """Limits uploads must stay within, so clients can pick a way to send a file the server accepts"""
+    return jsonify({
+        "success": True,
+        "max_file_size": MAX_FILE_SIZE,
+        "max_files_per_user": MAX_FILES_PER_USER,
+        "max_batch_files": MAX_BATCH_FILES,
+        "max_chunk_size": MAX_CHUNK_SIZE,
+        "max_manifest_chunks": MAX_MANIFEST_CHUNKS,
+        "min_part_size": MIN_UPLOAD_PART_SIZE,
+        "max_part_size": MAX_UPLOAD_PART_SIZE
+    })
+
+@app.route('/api/debug', methods=['GET'])
+def debug_info():
+    """Debug endpoint to check configuration"""
+    debug_data = {
+        "service": "SecureCloudFS API Debug",
+        "environment": {
+            "OCI_USER_OCID": "configured" if os.getenv("OCI_USER_OCID") else "missing",
+            "OCI_FINGERPRINT": "configured" if os.getenv("OCI_FINGERPRINT") else "missing",
+            "OCI_TENANCY_OCID": "configured" if os.getenv("OCI_TENANCY_OCID") else "missing",
+            "OCI_REGION": os.getenv("OCI_REGION", "not set"),
+            "OCI_NAMESPACE": os.getenv("OCI_NAMESPACE", "not set"),
+            "OCI_BUCKET_NAME": os.getenv("OCI_BUCKET_NAME", "not set"),
+            "OCI_KEY_CONTENT": "configured" if get_oci_key_content() else "missing",
             "OCI_KEY_FILE": os.getenv("OCI_KEY_FILE", "not set"),
             "SUPABASE_URL": "configured" if os.getenv("SUPABASE_URL") else "missing",
             "SUPABASE_API_KEY": "configured" if os.getenv("SUPABASE_API_KEY") else "missing"
@@ -295,161 +2268,684 @@ def debug_info():
             "oci_available": OCI_AVAILABLE,
             "supabase_available": SUPABASE_AVAILABLE,
             "oci_client": object_storage_client is not None,
+            "storage_backend": storage.name,
+            "metadata_backend": metadata.name,
             "supabase_client": supabase is not None
         }
     }
     
-    # Test Supabase connection
-    if supabase:
-        try:
-            response = supabase.table("file_metadata").select("id").limit(1).execute()
-            debug_data["supabase_table_test"] = "success"
-        except Exception as e:
-            debug_data["supabase_table_test"] = f"failed: {str(e)}"
-    else:
-        debug_data["supabase_table_test"] = "client not available"
+    # Test the metadata store
+    try:
+        metadata.count_files("")
+        debug_data["metadata_table_test"] = "success"
+    except Exception as e:
+        debug_data["metadata_table_test"] = f"failed: {str(e)}"
     
     return jsonify(debug_data)
 
+@app.route('/api/auth/login', methods=['POST'])
+def login():
+    """Exchange email and password for an access/refresh token pair"""
+    data = request.get_json(silent=True) or {}
+    email = data.get('email')
+    password = data.get('password')
+    
+    if not email or not password:
+        return jsonify({
+            "success": False,
+            "error": "Email and password are required"
+        }), 400
+    
+    identity, error = verify_credentials(email, password)
+    if not identity:
+        return jsonify({
+            "success": False,
+            "error": f"Authentication failed: {error}"
+        }), 401
+    
+    return jsonify({
+        "success": True,
+        "user": identity,
+        **issue_session(identity["id"], identity["email"])
+    })
+
+@app.route('/api/auth/refresh', methods=['POST'])
+def refresh_session():
+    """Issue a new token pair from a valid refresh token"""
+    data = request.get_json(silent=True) or {}
+    try:
+        identity = refresh_tokens.loads(data.get('refresh_token', ''), max_age=REFRESH_TOKEN_TTL)
+    except (BadSignature, SignatureExpired):
+        return jsonify({
+            "success": False,
+            "error": "Invalid or expired refresh token"
+        }), 401
+    
+    return jsonify({
+        "success": True,
+        "user": identity,
+        **issue_session(identity["id"], identity["email"])
+    })
+
 @app.route('/api/files', methods=['GET'])
 def list_files():
     """List user files"""
     try:
-        email = request.headers.get('X-User-Email')
-        password = request.headers.get('X-User-Password')
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+        user_id = user["id"]
+        
+        args = request.args
+        try:
+            limit = min(max(int(args.get('limit', LIST_PAGE_SIZE)), 1), MAX_LIST_PAGE_SIZE)
+            sort = args.get('sort', 'uploaded_at')
+            if sort not in FILE_SORT_KEYS:
+                raise ValueError(f"sort must be one of {', '.join(FILE_SORT_KEYS)}")
+            order = args.get('order', 'desc' if sort == 'uploaded_at' else 'asc')
+            if order not in ('asc', 'desc'):
+                raise ValueError("order must be asc or desc")
+            descending = order == 'desc'
+            
+            columns = FILE_LIST_COLUMNS
+            if args.get('fields'):
+                columns = tuple(field.strip() for field in args['fields'].split(','))
+                unknown = [field for field in columns if field not in FILE_SELECTABLE_COLUMNS]
+                if unknown:
+                    raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+            
+            ids = [file_id.strip() for file_id in args['ids'].split(',')] if args.get('ids') else None
+            if ids and len(ids) > MAX_LIST_PAGE_SIZE:
+                raise ValueError(f"At most {MAX_LIST_PAGE_SIZE} ids per request")
+            
+            cursor = decode_list_cursor(args['cursor'], sort, descending) if args.get('cursor') else None
+        except ValueError as e:
+            return jsonify({
+                "success": False,
+                "error": str(e)
+            }), 400
+        
+        # Read the version before the listing: a concurrent write can only
+        # make the ETag older than the data, which costs one extra refetch
+        etag, last_modified = None, None
+        listing_version = get_listing_version(user_id)
+        if listing_version is not None:
+            etag = hashlib.sha256(json.dumps(
+                [user_id, listing_version["version"], sorted(args.items(multi=True))]
+            ).encode()).hexdigest()[:32]
+            last_modified = parse_timestamp(listing_version.get("updated_at"))
+            if is_not_modified(etag, last_modified):
+                return not_modified(etag, last_modified)
+        
+        # Get one page of user files
+        files, next_cursor = get_user_files(
+            user_id, limit, cursor, sort, descending,
+            prefix=args.get('prefix'), name=args.get('name'), ids=ids, columns=columns
+        )
+        
+        response = jsonify({
+            "success": True,
+            "files": files,
+            "next_cursor": next_cursor
+        })
+        return with_validators(response, etag, last_modified)
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Error obteniendo archivos: {str(e)}"
+        }), 500
+
+@app.route('/api/files/changes', methods=['GET'])
+def list_file_changes():
+    """Return the user's file inserts and deletes after a change cursor"""
+    try:
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+        user_id = user["id"]
+        
+        try:
+            since = int(request.args['since']) if request.args.get('since') else None
+            if since is not None and since < 0:
+                raise ValueError()
+            limit = min(max(int(request.args.get('limit', CHANGE_FEED_PAGE_SIZE)), 1), MAX_CHANGE_FEED_PAGE_SIZE)
+        except ValueError:
+            return jsonify({
+                "success": False,
+                "error": "since and limit must be non-negative integers"
+            }), 400
+        
+        changes, cursor, has_more = get_file_changes(user_id, since, limit)
+        return jsonify({
+            "success": True,
+            "changes": changes,
+            "cursor": str(cursor),
+            "has_more": has_more
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Could not read changes: {str(e)}"
+        }), 500
+
+@app.route('/api/files/upload', methods=['POST'])
+def upload_file():
+    """Upload a file"""
+    try:
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+        user_id = user["id"]
+        
+        # Check file limit (10 files per user)
+        limit_error = check_file_limit(user_id)
+        if limit_error:
+            return limit_error
+        
+        # Get file data from request; the body is hashed and spooled as it is parsed
+        try:
+            uploaded_files = request.files
+        except RequestEntityTooLarge:
+            return jsonify({
+                "success": False,
+                "error": f"File too large. Maximum size is {MAX_FILE_SIZE / (1024 * 1024):.0f} MB."
+            }), 413
+        
+        if 'file' not in uploaded_files:
+            return jsonify({
+                "success": False,
+                "error": "No file provided"
+            }), 400
+        
+        file = uploaded_files['file']
+        if file.filename == '':
+            return jsonify({
+                "success": False,
+                "error": "No file selected"
+            }), 400
+        
+        file_size, file_hash = hash_upload(file)
+        
+        # Check file size limit
+        if file_size > MAX_FILE_SIZE:
+            return jsonify({
+                "success": False,
+                "error": f"File too large. Maximum size is {MAX_FILE_SIZE / (1024 * 1024):.0f} MB, but your file is {file_size / (1024 * 1024):.2f} MB."
+            }), 400
+        
+        content_fingerprint = request.form.get('fingerprint')
+        if content_fingerprint and not is_hex_digest(content_fingerprint):
+            return jsonify({
+                "success": False,
+                "error": "Invalid content fingerprint"
+            }), 400
+        
+        # Check if file already exists (by plaintext fingerprint or ciphertext hash)
+        try:
+            if content_fingerprint:
+                existing, copied = find_or_copy_file(user_id, "content_fingerprint", content_fingerprint, file.filename)
+            else:
+                existing, copied = find_or_copy_file(user_id, "hash_sha256", file_hash, file.filename)
+            if existing:
+                return jsonify(duplicate_result(existing, copied))
+        except Exception as e:
+            print(f"Warning: Could not check for duplicates: {e}")
+        
+        # Generate unique object name for OCI
+        oci_object_name = f"{user_id}/{file_hash}_{file.filename}"
+        
+        # Upload to object storage
+        upload_success, upload_result = storage.put(oci_object_name, file.stream, file_size)
+        if not upload_success:
+            return jsonify({
+                "success": False,
+                "error": f"Upload to storage failed: {upload_result}"
+            }), 500
+        
+        # Store metadata in Supabase
+        metadata_success, metadata_result = store_file_metadata(
+            user_id, file.filename, file_size, file_hash, oci_object_name, content_fingerprint
+        )
+        
+        if not metadata_success:
+            return jsonify({
+                "success": False,
+                "error": f"Metadata storage failed: {metadata_result}"
+            }), 500
+        
+        return jsonify({
+            "success": True,
+            "message": "File uploaded successfully",
+            "file_id": metadata_result.get("id"),
+            "filename": file.filename,
+            "size": file_size
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Upload failed: {str(e)}"
+        }), 500
+
+@app.route('/api/files/batch', methods=['POST'])
+def upload_batch():
+    """Upload several files in one request.
+
+    The body holds one "file" part per file, each with a "fingerprint" field
+    (empty if unknown), and is bounded by the same size limit as a single
+    upload. Duplicate and file count checks run once for the whole batch,
+    objects go to OCI concurrently and the metadata rows are inserted in one
+    statement. The response has one result per file, in request order, shaped
+    like the response of /api/files/upload.
+    """
+    try:
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+        user_id = user["id"]
+        
+        try:
+            files = request.files.getlist('file')
+            fingerprints = request.form.getlist('fingerprint')
+        except RequestEntityTooLarge:
+            return jsonify({
+                "success": False,
+                "error": f"Batch too large. Maximum size is {MAX_FILE_SIZE / (1024 * 1024):.0f} MB."
+            }), 413
+        
+        if not files:
+            return jsonify({
+                "success": False,
+                "error": "No files provided"
+            }), 400
+        if len(files) > MAX_BATCH_FILES:
+            return jsonify({
+                "success": False,
+                "error": f"Too many files. A batch holds at most {MAX_BATCH_FILES} files."
+            }), 400
+        if fingerprints and len(fingerprints) != len(files):
+            return jsonify({
+                "success": False,
+                "error": "Expected one fingerprint per file"
+            }), 400
+        
+        results = [None] * len(files)
+        items = []
+        for index, (file, content_fingerprint) in enumerate(zip(files, fingerprints or [""] * len(files))):
+            if file.filename == '':
+                results[index] = {"success": False, "error": "No file selected"}
+            elif content_fingerprint and not is_hex_digest(content_fingerprint):
+                results[index] = {"success": False, "error": "Invalid content fingerprint"}
+            else:
+                file_size, file_hash = hash_upload(file)
+                items.append({
+                    "index": index,
+                    "file": file,
+                    "size": file_size,
+                    "hash": file_hash,
+                    "fingerprint": content_fingerprint or None,
+                    "key": ("fingerprint", content_fingerprint, file.filename) if content_fingerprint
+                           else ("hash", file_hash, file.filename)
+                })
+        
+        # Files already stored, or repeated earlier in this batch, are duplicates
+        try:
+            existing = find_existing_files(
+                user_id,
+                [item["fingerprint"] for item in items if item["fingerprint"]],
+                [item["hash"] for item in items if not item["fingerprint"]]
+            )
+        except Exception as e:
+            print(f"Warning: Could not check for duplicates: {e}")
+            existing = {}
+        
+        new_items, repeats = {}, []
+        for item in items:
+            match = existing.get(item["key"])
+            if match:
+                results[item["index"]] = duplicate_result(match)
+            elif item["key"] in new_items:
+                repeats.append(item)
+            else:
+                new_items[item["key"]] = item
+        pending = list(new_items.values())
+        
+        # The file limit is checked once, for all new files together
+        if pending:
+            try:
+                file_count = count_user_files(user_id)
+                allowed = max(MAX_FILES_PER_USER - file_count, 0)
+                for item in pending[allowed:]:
+                    results[item["index"]] = {"success": False, "error": file_limit_message(file_count)}
+                pending = pending[:allowed]
+            except Exception as e:
+                print(f"Warning: Could not check file count: {e}")
+        
+        # Content already stored under another name is stored as a copy of it
+        for item in pending:
+            source = existing.get(item["key"][:2])
+            copied = source and copy_file(user_id, source, item["file"].filename)
+            if copied:
+                results[item["index"]] = duplicate_result(copied, True)
+        pending = [item for item in pending if results[item["index"]] is None]
+        
+        def store(item):
+            item["object_name"] = f"{user_id}/{item['hash']}_{item['file'].filename}"
+            return storage.put(item["object_name"], item["file"].stream, item["size"])
+        
+        stored = []
+        with ThreadPoolExecutor(max_workers=BATCH_UPLOAD_WORKERS) as executor:
+            for item, (upload_success, upload_result) in zip(pending, executor.map(store, pending)):
+                if upload_success:
+                    stored.append(item)
+                else:
+                    results[item["index"]] = {"success": False, "error": f"Upload to storage failed: {upload_result}"}
+        
+        if stored:
+            metadata_success, metadata_result = store_file_metadata_batch([
+                file_metadata_row(user_id, item["file"].filename, item["size"], item["hash"],
+                                  item["object_name"], item["fingerprint"])
+                for item in stored
+            ])
+            if metadata_success:
+                rows = {row["oci_object_name"]: row for row in metadata_result}
+                for item in stored:
+                    results[item["index"]] = {
+                        "success": True,
+                        "message": "File uploaded successfully",
+                        "file_id": rows[item["object_name"]]["id"],
+                        "filename": item["file"].filename,
+                        "size": item["size"]
+                    }
+            else:
+                # Nothing refers to the stored objects; remove them again
+                queue_object_deletions(user_id, delete_objects(
+                    unreferenced_objects(user_id, [item["object_name"] for item in stored])
+                ))
+                for item in stored:
+                    results[item["index"]] = {"success": False, "error": f"Metadata storage failed: {metadata_result}"}
+        
+        for item in repeats:
+            first = results[new_items[item["key"]]["index"]]
+            results[item["index"]] = dict(first, message="File already exists (duplicate detected)", duplicate=True) \
+                if first["success"] else first
+        
+        return jsonify({
+            "success": True,
+            "results": results
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Batch upload failed: {str(e)}"
+        }), 500
+
+@app.route('/api/files/check', methods=['POST'])
+def check_file():
+    """Tell the client whether it already stored this file: the same content under the same name.
+
+    Content the user stored under another name is stored as a copy under
+    this name, and reported as existing, so the client need not upload it.
+    """
+    try:
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+        user_id = user["id"]
         
-        if not email or not password:
+        data = request.get_json(silent=True) or {}
+        content_fingerprint = data.get('fingerprint')
+        if not is_hex_digest(content_fingerprint):
             return jsonify({
                 "success": False,
-                "error": "Authentication required"
-            }), 401
+                "error": "A hex HMAC-SHA256 fingerprint is required"
+            }), 400
         
-        # Authenticate user
-        auth_success, auth_result = authenticate_user(email, password)
-        if not auth_success:
+        filename = data.get('filename')
+        if not isinstance(filename, str):
+            filename = None
+        # A copy is a file of its own, so it must fit within the file limit
+        existing, copied = find_or_copy_file(user_id, "content_fingerprint", content_fingerprint, filename,
+                                             copy=count_user_files(user_id) < MAX_FILES_PER_USER)
+        if not existing:
             return jsonify({
-                "success": False,
-                "error": f"Authentication failed: {auth_result}"
-            }), 401
-        
-        # Get user ID from auth result
-        user_id = auth_result.user.id if hasattr(auth_result, 'user') else email
-        
-        # Get user files
-        files = get_user_files(user_id)
+                "success": True,
+                "exists": False
+            })
         
         return jsonify({
             "success": True,
-            "files": files
+            "exists": True,
+            "file_id": existing["id"],
+            "filename": existing["filename"],
+            "size": existing["size"],
+            "copied": copied
         })
         
     except Exception as e:
         return jsonify({
             "success": False,
-            "error": f"Error obteniendo archivos: {str(e)}"
+            "error": f"Duplicate check failed: {str(e)}"
         }), 500
 
-@app.route('/api/files/upload', methods=['POST'])
-def upload_file():
-    """Upload a file"""
+@app.route('/api/chunks/missing', methods=['POST'])
+def missing_chunks():
+    """Return which of the given chunk ids the user's chunk store lacks.
+
+    Clients send the stored size of the file the chunks make up, so a file
+    the manifest commit would refuse is refused before its chunks are sent.
+    """
     try:
-        # Get user authentication
-        email = request.headers.get('X-User-Email')
-        password = request.headers.get('X-User-Password')
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+        user_id = user["id"]
         
-        if not email or not password:
+        data = request.get_json(silent=True) or {}
+        chunk_ids = data.get('chunks')
+        if not isinstance(chunk_ids, list) or len(chunk_ids) > MAX_MANIFEST_CHUNKS or not all(is_hex_digest(c) for c in chunk_ids):
             return jsonify({
                 "success": False,
-                "error": "Authentication required"
-            }), 401
+                "error": f"Expected a list of at most {MAX_MANIFEST_CHUNKS} chunk ids"
+            }), 400
         
-        # Authenticate user
-        auth_success, auth_result = authenticate_user(email, password)
-        if not auth_success:
+        stored_size = data.get('size')
+        if stored_size is not None and (not isinstance(stored_size, int) or stored_size < 0):
+            return jsonify({
+                "success": False,
+                "error": "Invalid file size"
+            }), 400
+        if stored_size is not None and stored_size > MAX_FILE_SIZE:
             return jsonify({
                 "success": False,
-                "error": f"Authentication failed: {auth_result}"
-            }), 401
+                "error": f"File too large. Maximum size is {MAX_FILE_SIZE / (1024 * 1024):.0f} MB, but your file is {stored_size / (1024 * 1024):.2f} MB."
+            }), 400
         
-        # Get user ID
-        user_id = auth_result.user.id if hasattr(auth_result, 'user') else email
+        found = find_chunks(user_id, chunk_ids)
+        return jsonify({
+            "success": True,
+            "missing": [chunk_id for chunk_id in dict.fromkeys(chunk_ids) if chunk_id not in found]
+        })
         
-        # Check file limit (10 files per user)
-        if supabase:
-            try:
-                file_count_response = supabase.table("file_metadata").select("id", count="exact").eq("user_id", user_id).execute()
-                current_file_count = file_count_response.count if hasattr(file_count_response, 'count') else len(file_count_response.data)
-                
-                if current_file_count >= 10:
-                    return jsonify({
-                        "success": False,
-                        "error": f"File limit exceeded. You have {current_file_count}/10 files. Please delete some files before uploading new ones."
-                    }), 400
-                    
-                print(f"User {user_id} has {current_file_count}/10 files")
-            except Exception as e:
-                print(f"Warning: Could not check file count: {e}")
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Chunk lookup failed: {str(e)}"
+        }), 500
+
+@app.route('/api/chunks/<chunk_id>', methods=['PUT'])
+def put_chunk(chunk_id):
+    """Store one encrypted chunk, addressed by the client's keyed hash"""
+    try:
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+        user_id = user["id"]
         
-        # Get file data from request
-        if 'file' not in request.files:
+        if not is_hex_digest(chunk_id):
             return jsonify({
                 "success": False,
-                "error": "No file provided"
+                "error": "Invalid chunk id"
             }), 400
         
-        file = request.files['file']
-        if file.filename == '':
+        if chunk_id in find_chunks(user_id, [chunk_id]):
+            return jsonify({
+                "success": True,
+                "chunk_id": chunk_id,
+                "duplicate": True
+            })
+        
+        # Read the raw body through the same size-enforcing spool as file uploads
+        spool = HashingSpool(MAX_CHUNK_SIZE)
+        try:
+            for block in iter(lambda: request.stream.read(UPLOAD_SPOOL_MEMORY), b""):
+                spool.write(block)
+        except RequestEntityTooLarge:
             return jsonify({
                 "success": False,
-                "error": "No file selected"
+                "error": f"Chunk too large. Maximum size is {MAX_CHUNK_SIZE} bytes."
+            }), 413
+        if spool.size == 0:
+            return jsonify({
+                "success": False,
+                "error": "Empty chunk"
             }), 400
+        spool.seek(0)
         
-        # Read file data
-        file_data = file.read()
-        file_size = len(file_data)
-        
-        # Check file size limit (5 MB maximum)
-        MAX_FILE_SIZE = 5 * 1024 * 1024  # 5 MB in bytes
-        if file_size > MAX_FILE_SIZE:
+        upload_success, upload_result = storage.put(chunk_object_name(user_id, chunk_id), spool, spool.size)
+        if not upload_success:
             return jsonify({
                 "success": False,
-                "error": f"File too large. Maximum size is 5 MB, but your file is {file_size / (1024 * 1024):.2f} MB."
-            }), 400
+                "error": f"Upload to storage failed: {upload_result}"
+            }), 500
         
-        file_hash = hashlib.sha256(file_data).hexdigest()
+        register_chunk(user_id, chunk_id, spool.size)
+        return jsonify({
+            "success": True,
+            "chunk_id": chunk_id,
+            "size": spool.size
+        })
         
-        # Check if file already exists (by hash and user)
-        try:
-            existing_file = supabase.table("file_metadata").select("*").eq("user_id", user_id).eq("hash_sha256", file_hash).execute()
-            if existing_file.data:
-                return jsonify({
-                    "success": True,
-                    "message": "File already exists (duplicate detected)",
-                    "file_id": existing_file.data[0]["id"],
-                    "filename": existing_file.data[0]["filename"],
-                    "size": existing_file.data[0]["size"],
-                    "duplicate": True
-                })
-        except Exception as e:
-            print(f"Warning: Could not check for duplicates: {e}")
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Chunk upload failed: {str(e)}"
+        }), 500
+
+@app.route('/api/chunks/<chunk_id>', methods=['GET'])
+def get_chunk(chunk_id):
+    """Stream one encrypted chunk from the user's chunk store"""
+    try:
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+        user_id = user["id"]
         
-        # Generate unique object name for OCI
-        oci_object_name = f"{user_id}/{file_hash}_{file.filename}"
+        if not is_hex_digest(chunk_id) or chunk_id not in find_chunks(user_id, [chunk_id]):
+            return jsonify({
+                "success": False,
+                "error": "Chunk not found"
+            }), 404
         
-        # Upload to OCI
-        upload_success, upload_result = upload_to_oci(file_data, oci_object_name)
-        if not upload_success:
+        download_success, stored = storage.get(chunk_object_name(user_id, chunk_id))
+        if not download_success:
             return jsonify({
                 "success": False,
-                "error": f"Upload to storage failed: {upload_result}"
+                "error": f"Download from storage failed: {stored}"
             }), 500
         
-        # Store metadata in Supabase
-        metadata_success, metadata_result = store_file_metadata(
-            user_id, file.filename, file_size, file_hash, oci_object_name
+        headers = {}
+        if stored.length is not None:
+            headers['Content-Length'] = str(stored.length)
+        return Response(
+            object_body(stored),
+            mimetype='application/octet-stream',
+            headers=headers,
+            direct_passthrough=True
         )
         
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Chunk download failed: {str(e)}"
+        }), 500
+
+@app.route('/api/files/manifest', methods=['POST'])
+def commit_manifest():
+    """Create a file from chunks already in the user's chunk store"""
+    try:
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+        user_id = user["id"]
+        
+        data = request.get_json(silent=True) or {}
+        filename = data.get('filename')
+        content_fingerprint = data.get('fingerprint')
+        chunks = data.get('chunks')
+        
+        try:
+            if not filename or not isinstance(chunks, list) or len(chunks) > MAX_MANIFEST_CHUNKS:
+                raise ValueError("filename and a list of chunks are required")
+            if content_fingerprint and not is_hex_digest(content_fingerprint):
+                raise ValueError("Invalid content fingerprint")
+            manifest = {
+                "version": 1,
+                "chunks": [
+                    {"id": chunk["id"], "size": int(chunk["size"]), "enc_size": int(chunk["enc_size"])}
+                    for chunk in chunks
+                ]
+            }
+            if not all(is_hex_digest(chunk["id"]) for chunk in manifest["chunks"]):
+                raise ValueError("Invalid chunk id")
+        except (KeyError, TypeError, ValueError) as e:
+            return jsonify({
+                "success": False,
+                "error": f"Invalid manifest: {e}"
+            }), 400
+        
+        stored_size = sum(chunk["enc_size"] for chunk in manifest["chunks"])
+        if stored_size > MAX_FILE_SIZE:
+            return jsonify({
+                "success": False,
+                "error": f"File too large. Maximum size is {MAX_FILE_SIZE / (1024 * 1024):.0f} MB, but your file is {stored_size / (1024 * 1024):.2f} MB."
+            }), 400
+        
+        limit_error = check_file_limit(user_id)
+        if limit_error:
+            return limit_error
+        
+        if content_fingerprint:
+            existing, copied = find_or_copy_file(user_id, "content_fingerprint", content_fingerprint, filename)
+            if existing:
+                return jsonify(duplicate_result(existing, copied))
+        
+        # Claim the chunks before checking they exist, so the garbage
+        # collector cannot delete one between the check and the commit
+        chunk_ids = [chunk["id"] for chunk in manifest["chunks"]]
+        adjust_chunk_refs(user_id, chunk_ids, 1)
+        try:
+            missing = set(chunk_ids) - find_chunks(user_id, chunk_ids)
+            if missing:
+                adjust_chunk_refs(user_id, chunk_ids, -1)
+                return jsonify({
+                    "success": False,
+                    "error": "Manifest references chunks that were not uploaded",
+                    "missing": sorted(missing)
+                }), 409
+            
+            manifest_hash = hashlib.sha256("".join(chunk_ids).encode()).hexdigest()
+            metadata_success, metadata_result = store_file_metadata(
+                user_id, filename, stored_size, manifest_hash, None, content_fingerprint, manifest
+            )
+        except Exception:
+            adjust_chunk_refs(user_id, chunk_ids, -1)
+            raise
         if not metadata_success:
+            adjust_chunk_refs(user_id, chunk_ids, -1)
             return jsonify({
                 "success": False,
                 "error": f"Metadata storage failed: {metadata_result}"
@@ -459,75 +2955,348 @@ def upload_file():
             "success": True,
             "message": "File uploaded successfully",
             "file_id": metadata_result.get("id"),
-            "filename": file.filename,
-            "size": file_size
+            "filename": filename,
+            "size": stored_size
         })
         
     except Exception as e:
         return jsonify({
             "success": False,
-            "error": f"Upload failed: {str(e)}"
+            "error": f"Manifest commit failed: {str(e)}"
         }), 500
 
-@app.route('/api/files/download/<file_id>', methods=['GET'])
-def download_file(file_id):
-    """Download a file"""
+@app.route('/api/uploads', methods=['POST'])
+def start_upload():
+    """Open a resumable upload session for an encrypted file of known size"""
     try:
-        # Get user authentication
-        email = request.headers.get('X-User-Email')
-        password = request.headers.get('X-User-Password')
-        
-        if not email or not password:
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+        user_id = user["id"]
+
+        data = request.get_json(silent=True) or {}
+        filename = data.get('filename')
+        content_fingerprint = data.get('fingerprint')
+        try:
+            size = int(data.get('size'))
+            part_size = int(data.get('part_size') or UPLOAD_PART_SIZE)
+        except (TypeError, ValueError):
+            size = part_size = 0
+
+        if not filename or size <= 0:
             return jsonify({
                 "success": False,
-                "error": "Authentication required"
-            }), 401
-        
-        # Authenticate user
-        auth_success, auth_result = authenticate_user(email, password)
-        if not auth_success:
+                "error": "filename and a positive size are required"
+            }), 400
+        if content_fingerprint and not is_hex_digest(content_fingerprint):
             return jsonify({
                 "success": False,
-                "error": f"Authentication failed: {auth_result}"
-            }), 401
-        
-        # Get user ID
-        user_id = auth_result.user.id if hasattr(auth_result, 'user') else email
-        
-        # Get file metadata from Supabase
-        if not supabase:
+                "error": "Invalid content fingerprint"
+            }), 400
+        if size > MAX_FILE_SIZE:
+            return jsonify({
+                "success": False,
+                "error": f"File too large. Maximum size is {MAX_FILE_SIZE / (1024 * 1024):.0f} MB, but your file is {size / (1024 * 1024):.2f} MB."
+            }), 400
+
+        limit_error = check_file_limit(user_id)
+        if limit_error:
+            return limit_error
+
+        if content_fingerprint:
+            existing, copied = find_or_copy_file(user_id, "content_fingerprint", content_fingerprint, filename)
+            if existing:
+                return jsonify(duplicate_result(existing, copied))
+
+        # A part is never larger than the file, so it fits in one request body
+        part_size = min(max(MIN_UPLOAD_PART_SIZE, min(part_size, MAX_UPLOAD_PART_SIZE)), size)
+        session_id = str(uuid.uuid4())
+        oci_object_name = f"{user_id}/{session_id}_{filename}"
+
+        create_success, upload_id = storage.create_multipart(oci_object_name)
+        if not create_success:
+            return jsonify({
+                "success": False,
+                "error": f"Could not start upload in storage: {upload_id}"
+            }), 500
+
+        now = datetime.now(timezone.utc)
+        session = {
+            "id": session_id,
+            "user_id": user_id,
+            "filename": filename,
+            "size": size,
+            "part_size": part_size,
+            "content_fingerprint": content_fingerprint,
+            "oci_object_name": oci_object_name,
+            "oci_upload_id": upload_id,
+            "created_at": now.isoformat(),
+            "expires_at": (now + timedelta(seconds=UPLOAD_SESSION_TTL)).isoformat()
+        }
+        create_upload_session(session)
+        print(f"Upload session {session_id} opened for {filename} ({size} bytes)")
+        return jsonify(describe_upload_session(session, []))
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Could not start upload: {str(e)}"
+        }), 500
+
+@app.route('/api/uploads/<session_id>', methods=['GET'])
+def get_upload(session_id):
+    """Report which parts of an upload session the server holds"""
+    try:
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+
+        session = get_upload_session(user["id"], session_id)
+        if not session:
             return jsonify({
                 "success": False,
-                "error": "Database not configured"
+                "error": "Upload session not found or expired"
+            }), 404
+
+        return jsonify(describe_upload_session(session, get_upload_parts(session_id)))
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Upload lookup failed: {str(e)}"
+        }), 500
+
+@app.route('/api/uploads/<session_id>/parts/<int:part_num>', methods=['PUT'])
+def put_upload_part(session_id, part_num):
+    """Store one part of an upload session as an OCI multipart part"""
+    try:
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+
+        session = get_upload_session(user["id"], session_id)
+        if not session:
+            return jsonify({
+                "success": False,
+                "error": "Upload session not found or expired"
+            }), 404
+
+        part_size = expected_part_size(session, part_num)
+        if part_size is None:
+            return jsonify({
+                "success": False,
+                "error": f"Part {part_num} is out of range"
+            }), 400
+
+        spool = HashingSpool(part_size)
+        try:
+            for block in iter(lambda: request.stream.read(UPLOAD_SPOOL_MEMORY), b""):
+                spool.write(block)
+            complete = spool.size == part_size
+        except RequestEntityTooLarge:
+            complete = False
+        if not complete:
+            return jsonify({
+                "success": False,
+                "error": f"Part {part_num} must be exactly {part_size} bytes"
+            }), 400
+        spool.seek(0)
+
+        upload_success, etag = storage.upload_part(
+            session["oci_object_name"], session["oci_upload_id"], part_num, spool, spool.size
+        )
+        if not upload_success:
+            return jsonify({
+                "success": False,
+                "error": f"Upload to storage failed: {etag}"
+            }), 500
+
+        record_upload_part(session_id, part_num, etag, spool.size, spool.hexdigest())
+        return jsonify({
+            "success": True,
+            "part_num": part_num,
+            "offset": (part_num - 1) * session["part_size"],
+            "size": spool.size
+        })
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Part upload failed: {str(e)}"
+        }), 500
+
+@app.route('/api/uploads/<session_id>/complete', methods=['POST'])
+def complete_upload(session_id):
+    """Assemble an upload session's parts into a stored file"""
+    try:
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+        user_id = user["id"]
+
+        session = get_upload_session(user_id, session_id)
+        if not session:
+            return jsonify({
+                "success": False,
+                "error": "Upload session not found or expired"
+            }), 404
+
+        parts = get_upload_parts(session_id)
+        part_count = max(1, -(-session["size"] // session["part_size"]))
+        received = {part["part_num"] for part in parts}
+        missing = [n for n in range(1, part_count + 1) if n not in received]
+        if missing:
+            return jsonify({
+                "success": False,
+                "error": "Upload is incomplete",
+                "missing": missing
+            }), 409
+
+        limit_error = check_file_limit(user_id)
+        if limit_error:
+            return limit_error
+
+        commit_success, commit_result = storage.commit_multipart(
+            session["oci_object_name"], session["oci_upload_id"],
+            [(part["part_num"], part["etag"]) for part in parts]
+        )
+        if not commit_success:
+            return jsonify({
+                "success": False,
+                "error": f"Could not assemble upload in storage: {commit_result}"
             }), 500
+
+        # Multipart objects have no single body hash; use the hash of the part hashes
+        file_hash = hashlib.sha256(b"".join(bytes.fromhex(part["sha256"]) for part in parts)).hexdigest()
+        metadata_success, metadata_result = store_file_metadata(
+            user_id, session["filename"], session["size"], file_hash,
+            session["oci_object_name"], session.get("content_fingerprint")
+        )
+        if not metadata_success:
+            return jsonify({
+                "success": False,
+                "error": f"Metadata storage failed: {metadata_result}"
+            }), 500
+
+        delete_upload_session(session_id)
+        return jsonify({
+            "success": True,
+            "message": "File uploaded successfully",
+            "file_id": metadata_result.get("id"),
+            "filename": session["filename"],
+            "size": session["size"]
+        })
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Upload completion failed: {str(e)}"
+        }), 500
+
+@app.route('/api/uploads/<session_id>', methods=['DELETE'])
+def abort_upload(session_id):
+    """Abandon an upload session and discard its parts"""
+    try:
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+
+        session = get_upload_session(user["id"], session_id)
+        if not session:
+            return jsonify({
+                "success": False,
+                "error": "Upload session not found or expired"
+            }), 404
+
+        abort_success, abort_result = storage.abort_multipart(session["oci_object_name"], session["oci_upload_id"])
+        if not abort_success:
+            print(f"Warning: Could not abort multipart upload for session {session_id}: {abort_result}")
+
+        delete_upload_session(session_id)
+        return jsonify({
+            "success": True,
+            "message": "Upload aborted",
+            "session_id": session_id
+        })
+
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Abort failed: {str(e)}"
+        }), 500
+
+@app.route('/api/files/download/<file_id>', methods=['GET'])
+def download_file(file_id):
+    """Download a file"""
+    try:
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+        user_id = user["id"]
         
+        # Get file metadata
         try:
-            response = supabase.table("file_metadata").select("*").eq("id", file_id).eq("user_id", user_id).execute()
-            if not response.data:
+            file_metadata = metadata.get_file(user_id, file_id)
+            if not file_metadata:
                 return jsonify({
                     "success": False,
                     "error": "File not found"
                 }), 404
             
-            file_metadata = response.data[0]
             oci_object_name = file_metadata["oci_object_name"]
+            object_size = file_metadata["size"]
+            
+            # Stored objects never change, so the hash of their bytes is a strong validator
+            etag = file_metadata.get("hash_sha256")
+            last_modified = parse_timestamp(file_metadata.get("uploaded_at"))
+            if is_not_modified(etag, last_modified):
+                return not_modified(etag, last_modified)
             
-            # Download from OCI
-            download_success, file_data = download_from_oci(oci_object_name)
+            try:
+                byte_range = parse_range_header(request.headers.get('Range'), object_size)
+            except ValueError:
+                return Response(status=416, headers={'Content-Range': f'bytes */{object_size}'})
+            
+            headers = {
+                'Content-Disposition': f'attachment; filename="{file_metadata["filename"]}"',
+                'Accept-Ranges': 'bytes'
+            }
+            if byte_range:
+                start, end = byte_range
+                headers['Content-Range'] = f'bytes {start}-{end}/{object_size}'
+                headers['Content-Length'] = str(end - start + 1)
+            else:
+                headers['Content-Length'] = str(object_size)
+            
+            manifest = file_metadata.get("manifest")
+            if manifest:
+                # Chunked file: relay the encrypted chunks covering the range back to back, in order
+                return with_validators(Response(
+                    stream_chunk_objects(manifest_pieces(user_id, manifest, byte_range)),
+                    status=206 if byte_range else 200,
+                    mimetype='application/octet-stream',
+                    headers=headers,
+                    direct_passthrough=True
+                ), etag, last_modified)
+            
+            # Open the stored object; the body is relayed without being buffered
+            download_success, stored = storage.get(oci_object_name, byte_range)
             if not download_success:
                 return jsonify({
                     "success": False,
-                    "error": f"Download from storage failed: {file_data}"
+                    "error": f"Download from storage failed: {stored}"
                 }), 500
             
-            # Return file data
-            return Response(
-                file_data,
+            if stored.length is not None:
+                headers['Content-Length'] = str(stored.length)
+            
+            return with_validators(Response(
+                object_body(stored),
+                status=206 if byte_range else 200,
                 mimetype='application/octet-stream',
-                headers={
-                    'Content-Disposition': f'attachment; filename="{file_metadata["filename"]}"'
-                }
-            )
+                headers=headers,
+                direct_passthrough=True
+            ), etag, last_modified)
             
         except Exception as e:
             return jsonify({
@@ -545,26 +3314,10 @@ def download_file(file_id):
 def delete_file(file_id):
     """Delete a file"""
     try:
-        # Get user authentication
-        email = request.headers.get('X-User-Email')
-        password = request.headers.get('X-User-Password')
-        
-        if not email or not password:
-            return jsonify({
-                "success": False,
-                "error": "Authentication required"
-            }), 401
-        
-        # Authenticate user
-        auth_success, auth_result = authenticate_user(email, password)
-        if not auth_success:
-            return jsonify({
-                "success": False,
-                "error": f"Authentication failed: {auth_result}"
-            }), 401
-        
-        # Get user ID
-        user_id = auth_result.user.id if hasattr(auth_result, 'user') else email
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+        user_id = user["id"]
         
         # Delete metadata from Supabase and get OCI object name
         metadata_success, metadata_result = delete_file_metadata(user_id, file_id)
@@ -574,6 +3327,17 @@ def delete_file(file_id):
                 "error": f"File not found or metadata deletion failed: {metadata_result}"
             }), 404 if "not found" in str(metadata_result).lower() else 500
         
+        manifest = metadata_result.get("manifest")
+        if manifest:
+            # Chunks may be shared with other files; unreferenced ones are garbage collected
+            adjust_chunk_refs(user_id, [chunk["id"] for chunk in manifest["chunks"]], -1)
+            return jsonify({
+                "success": True,
+                "message": "File deleted successfully",
+                "file_id": file_id,
+                "oci_deletion": "chunks released"
+            })
+        
         # Get OCI object name from metadata
         oci_object_name = metadata_result.get("oci_object_name")
         if not oci_object_name:
@@ -582,16 +3346,62 @@ def delete_file(file_id):
                 "error": "No OCI object name found in metadata"
             }), 500
         
-        # Delete from OCI Object Storage
-        oci_success, oci_result = delete_from_oci(oci_object_name)
-        if not oci_success:
-            print(f"Warning: File metadata deleted but OCI deletion failed: {oci_result}")
+        # Delete from object storage unless copies still use the object;
+        # a failure is retried by the garbage collector
+        oci_result = release_file_storage(user_id, [metadata_result]).get(oci_object_name)
         
         return jsonify({
             "success": True,
             "message": "File deleted successfully",
             "file_id": file_id,
-            "oci_deletion": "success" if oci_success else f"failed: {oci_result}"
+            "oci_deletion": "success" if oci_result is None else f"failed: {oci_result}"
+        })
+        
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": f"Delete failed: {str(e)}"
+        }), 500
+
+@app.route('/api/files/delete', methods=['POST'])
+def delete_files():
+    """Delete several files.
+
+    Takes {"ids": [...]}. The metadata rows are deleted in one statement and
+    the OCI objects concurrently after that; objects that cannot be deleted
+    are queued for the garbage collector, so a file is gone once its metadata
+    is. Ids matching none of the user's files are reported as not_found.
+    """
+    try:
+        user, auth_error = get_authenticated_user()
+        if auth_error:
+            return auth_error
+        user_id = user["id"]
+        
+        file_ids = (request.get_json(silent=True) or {}).get('ids')
+        if not isinstance(file_ids, list) or not file_ids or len(file_ids) > MAX_DELETE_BATCH \
+                or not all(isinstance(file_id, str) for file_id in file_ids):
+            return jsonify({
+                "success": False,
+                "error": f"Expected a list of at most {MAX_DELETE_BATCH} file ids"
+            }), 400
+        file_ids = list(dict.fromkeys(file_ids))
+        
+        valid_ids = [file_id for file_id in file_ids if is_file_id(file_id)]
+        metadata_success, deleted_files = delete_files_metadata(user_id, valid_ids) if valid_ids else (True, [])
+        if not metadata_success:
+            return jsonify({
+                "success": False,
+                "error": f"Metadata deletion failed: {deleted_files}"
+            }), 500
+        
+        failed = release_file_storage(user_id, deleted_files)
+        deleted = {row["id"] for row in deleted_files}
+        return jsonify({
+            "success": True,
+            "deleted": [file_id for file_id in file_ids if file_id in deleted],
+            "not_found": [file_id for file_id in file_ids if file_id not in deleted],
+            "oci_deletion": f"{len(failed)} objects queued for garbage collection" if failed else "success"
         })
         
     except Exception as e:
@@ -610,11 +3420,23 @@ def root():
         "client_download": "https://raw.githubusercontent.com/Jozefhdez/SecureCloudFS/main/securecloud.py",
         "endpoints": {
             "health": "/api/health",
+            "limits": "/api/limits",
             "debug": "/api/debug",
+            "login": "/api/auth/login",
+            "refresh": "/api/auth/refresh",
             "files": "/api/files",
+            "changes": "/api/files/changes",
             "upload": "/api/files/upload",
+            "batch": "/api/files/batch",
+            "check": "/api/files/check",
+            "manifest": "/api/files/manifest",
+            "chunks": "/api/chunks/<chunk_id>",
+            "missing_chunks": "/api/chunks/missing",
+            "uploads": "/api/uploads",
+            "upload_parts": "/api/uploads/<session_id>/parts/<part_num>",
             "download": "/api/files/download/<file_id>",
-            "delete": "/api/files/<file_id>"
+            "delete": "/api/files/<file_id>",
+            "bulk_delete": "/api/files/delete"
         }
     })
 
@@ -624,24 +3446,54 @@ def test():
     return "OK"
 
 def main():
-    """Main function to start the Flask server"""
+    """Main function to start the Flask server, or run a maintenance command"""
     parser = argparse.ArgumentParser(description='SecureCloudFS Backend API')
+    parser.add_argument('command', nargs='?', default='serve', choices=['serve', 'reconcile', 'gc'],
+                        help='serve the API (default), reconcile stored objects with the database, '
+                             'or run garbage collection until nothing is left to collect')
     parser.add_argument('--port', type=int, default=5000, help='Port to run the server on')
     parser.add_argument('--host', default='0.0.0.0', help='Host to bind the server to')
+    parser.add_argument('--prefix', default='', help='reconcile: only objects under this prefix (e.g. a user id)')
+    parser.add_argument('--delete', action='store_true', help='reconcile: delete orphaned objects instead of only reporting them')
+    parser.add_argument('--grace', type=int, default=RECONCILE_GRACE,
+                        help='reconcile: ignore objects younger than this many seconds')
     
     args = parser.parse_args()
     
+    if args.command == 'reconcile':
+        print(f"Reconciling objects under '{args.prefix or '/'}' ({'deleting' if args.delete else 'reporting'} orphans)")
+        summary = run_reconciliation(
+            iter_stored_objects(args.prefix), iter_referenced_objects(args.prefix),
+            delete=args.delete, grace=args.grace
+        )
+        print(f"{summary['orphans']} orphaned objects ({summary['deleted']} deleted, {summary['failed']} failed), "
+              f"{summary['missing']} missing objects")
+        sys.exit(1 if summary["failed"] else 0)
+    
+    if args.command == 'gc':
+        total_deleted = failed = 0
+        while True:
+            deleted, failed = collect_garbage()
+            total_deleted += deleted
+            if not deleted:
+                break
+        print(f"Garbage collection: {total_deleted} objects deleted, {failed} still failing")
+        sys.exit(1 if failed else 0)
+    
     print("Starting SecureCloudFS Backend API")
     print(f"   Host: {args.host}")
     print(f"   Port: {args.port}")
     print(f"   OCI Available: {OCI_AVAILABLE}")
     print(f"   Supabase Available: {SUPABASE_AVAILABLE}")
     print(f"   OCI Client: {'Available' if object_storage_client else 'Not Available'}")
+    print(f"   Storage: {storage.name}")
+    print(f"   Metadata: {metadata.name}")
     print(f"   Supabase Client: {'Available' if supabase else 'Not Available'}")
     print("=" * 40)
     
+    ensure_garbage_collector()
     try:
-        app.run(host=args.host, port=args.port, debug=False)
+        app.run(host=args.host, port=args.port, debug=DEBUG)
     except Exception as e:
         print(f"Failed to start server: {e}")
         sys.exit(1)
@@ -0,0 +1,114 @@
+import io
+import os
+import sys
+import tempfile
+from urllib.parse import urlsplit
+
+import pytest
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# scfs_api picks its backends when imported: keep them in a scratch directory,
+# never on Supabase or OCI, whatever the developer's environment says
+_scratch = tempfile.mkdtemp(prefix="scfs-tests-")
+os.environ["LOCAL_STORAGE_PATH"] = os.path.join(_scratch, "objects")
+os.environ["METADATA_SQLITE_PATH"] = os.path.join(_scratch, "metadata.db")
+os.environ["LOCAL_STORAGE_FSYNC"] = "never"
+os.environ["GC_INTERVAL"] = "0"
+os.environ["SESSION_SECRET"] = "test-session-secret"
+for name in ("FLASK_DEBUG", "STORAGE_BACKEND", "METADATA_BACKEND", "SUPABASE_URL", "SUPABASE_API_KEY",
+             "OCI_USER_OCID", "OCI_FINGERPRINT", "OCI_TENANCY_OCID"):
+    os.environ.pop(name, None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scfs_api  # noqa: E402
+import securecloud  # noqa: E402
+
+
+@pytest.fixture
+def sqlite_store(tmp_path):
+    return scfs_api.SQLiteMetadataStore(str(tmp_path / "metadata.db"))
+
+
+@pytest.fixture
+def local_storage(tmp_path):
+    return scfs_api.LocalStorage(str(tmp_path / "objects"), "never")
+
+
+AUTH = {"X-User-Email": "user@example.com", "X-User-Password": "secret"}
+
+
+@pytest.fixture
+def api(monkeypatch, sqlite_store, local_storage):
+    """Flask test client on fresh stores; without Supabase any credentials sign in"""
+    monkeypatch.setattr(scfs_api, "metadata", sqlite_store)
+    monkeypatch.setattr(scfs_api, "storage", local_storage)
+    monkeypatch.setattr(scfs_api, "MAX_FILES_PER_USER", 1000)
+    return scfs_api.app.test_client()
+
+
+def forward(api, method, url, headers, body):
+    """Send a request the client built to the Flask test client"""
+    url = urlsplit(url)
+    headers = {name: value for name, value in headers.items()
+               if name.lower() not in ("content-length", "transfer-encoding", "host")}
+    return api.open(url.path, method=method, query_string=url.query, headers=headers, data=body)
+
+
+class FlaskAdapter(requests.adapters.BaseAdapter):
+    """Sends a requests session's traffic to a Flask test client instead of the network.
+
+    fail(request), if given, may return an exception to raise instead of
+    sending the request, like a dropped connection would.
+    """
+
+    def __init__(self, api, fail=None):
+        super().__init__()
+        self.api = api
+        self.fail = fail
+
+    def send(self, request, **kwargs):
+        error = self.fail and self.fail(request)
+        if error:
+            raise error
+        body = request.body
+        if body is not None and not isinstance(body, (bytes, str)):
+            body = body.read() if hasattr(body, "read") else b"".join(body)
+        result = forward(self.api, request.method, request.url, request.headers, body)
+
+        response = requests.Response()
+        response.status_code = result.status_code
+        response.reason = result.status
+        response.headers = CaseInsensitiveDict(result.headers)
+        response.raw = io.BytesIO(result.get_data())
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def client(api, monkeypatch, tmp_path):
+    """SecureCloudClient signed in as AUTH's user, talking to the api test client"""
+    monkeypatch.setattr(securecloud, "STATE_DIR", tmp_path / "state")
+    client = securecloud.SecureCloudClient(AUTH["X-User-Email"], AUTH["X-User-Password"])
+    client.transport.session.mount(securecloud.API_BASE_URL, FlaskAdapter(api))
+    return client
+
+
+@pytest.fixture
+def async_client(api, monkeypatch, tmp_path):
+    """AsyncSecureCloudClient for the same user, over an httpx transport calling the api test client"""
+    httpx = pytest.importorskip("httpx")
+    monkeypatch.setattr(securecloud, "STATE_DIR", tmp_path / "state")
+    client = securecloud.AsyncSecureCloudClient(AUTH["X-User-Email"], AUTH["X-User-Password"])
+
+    async def handler(request):
+        result = forward(api, request.method, str(request.url), request.headers, await request.aread())
+        return httpx.Response(result.status_code, headers=list(result.headers.items()), content=result.get_data())
+
+    client.http = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
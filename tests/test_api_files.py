@@ -0,0 +1,162 @@
+import hashlib
+import io
+import os
+
+import scfs_api
+from conftest import AUTH
+
+USER = AUTH["X-User-Email"]
+FINGERPRINT = "ab" * 32
+
+
+def upload(api, filename, data, fingerprint=FINGERPRINT):
+    response = api.post("/api/files/upload", headers=AUTH, data={
+        "file": (io.BytesIO(data), filename), "fingerprint": fingerprint
+    })
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def filenames(api):
+    return sorted(file["filename"] for file in api.get("/api/files", headers=AUTH).get_json()["files"])
+
+
+def download(api, file_id):
+    return api.get(f"/api/files/download/{file_id}", headers=AUTH)
+
+
+def test_same_content_under_a_new_name_is_stored_as_a_copy(api, local_storage):
+    original = upload(api, "small.bin", b"same bytes")
+    copy = upload(api, "copy.bin", b"same bytes")
+    assert copy["duplicate"] and copy["copied"] and copy["file_id"] != original["file_id"]
+    assert copy["filename"] == "copy.bin"
+    assert filenames(api) == ["copy.bin", "small.bin"]
+    assert len(list(scfs_api.iter_stored_objects())) == 1
+
+    again = upload(api, "small.bin", b"same bytes")
+    assert again["duplicate"] and not again["copied"] and again["file_id"] == original["file_id"]
+    assert filenames(api) == ["copy.bin", "small.bin"]
+
+
+def test_shared_object_goes_with_the_last_file(api, local_storage):
+    original = upload(api, "small.bin", b"same bytes")
+    copy = upload(api, "copy.bin", b"same bytes")
+
+    assert api.delete(f"/api/files/{original['file_id']}", headers=AUTH).status_code == 200
+    assert download(api, copy["file_id"]).data == b"same bytes"
+
+    response = api.post("/api/files/delete", headers=AUTH, json={"ids": [copy["file_id"]]})
+    assert response.status_code == 200, response.get_json()
+    assert list(scfs_api.iter_stored_objects()) == []
+
+
+def test_copy_of_a_deleted_source_is_undone(api):
+    original = upload(api, "small.bin", b"same bytes")
+    source = scfs_api.metadata.get_file(USER, original["file_id"])
+    # The source is deleted between the lookup and the copy
+    api.delete(f"/api/files/{original['file_id']}", headers=AUTH)
+    assert scfs_api.copy_file(USER, source, "copy.bin") is None
+    assert filenames(api) == []
+
+
+def test_check_matches_name_and_copies_content(api):
+    original = upload(api, "small.bin", b"same bytes")
+    check = lambda body: api.post("/api/files/check", headers=AUTH, json=body).get_json()
+    same = check({"fingerprint": FINGERPRINT, "filename": "small.bin"})
+    assert same["file_id"] == original["file_id"] and not same["copied"]
+    copy = check({"fingerprint": FINGERPRINT, "filename": "copy.bin"})
+    assert copy["exists"] and copy["copied"] and copy["file_id"] != original["file_id"]
+    assert check({"fingerprint": FINGERPRINT})["exists"] is False
+    assert filenames(api) == ["copy.bin", "small.bin"]
+    assert download(api, copy["file_id"]).data == b"same bytes"
+
+
+def test_check_copies_only_within_the_file_limit(api, monkeypatch):
+    upload(api, "small.bin", b"same bytes")
+    monkeypatch.setattr(scfs_api, "MAX_FILES_PER_USER", 1)
+    check = api.post("/api/files/check", headers=AUTH, json={"fingerprint": FINGERPRINT, "filename": "copy.bin"})
+    assert check.get_json()["exists"] is False
+    assert filenames(api) == ["small.bin"]
+
+
+def test_batch_stores_copies_and_skips_repeats(api, local_storage):
+    upload(api, "stored.txt", b"stored", fingerprint="cd" * 32)
+    files = [(io.BytesIO(b"same"), "a.txt"), (io.BytesIO(b"same"), "b.txt"), (io.BytesIO(b"same"), "a.txt"),
+             (io.BytesIO(b"stored"), "c.txt")]
+    response = api.post("/api/files/batch", headers=AUTH, data={
+        "file": files, "fingerprint": [FINGERPRINT] * 3 + ["cd" * 32]
+    })
+    results = response.get_json()["results"]
+    assert [result["success"] for result in results] == [True, True, True, True]
+    assert [bool(result.get("duplicate")) for result in results] == [False, False, True, True]
+    assert results[3]["copied"] and results[3]["filename"] == "c.txt"
+    assert results[2]["file_id"] == results[0]["file_id"] != results[1]["file_id"]
+    assert filenames(api) == ["a.txt", "b.txt", "c.txt", "stored.txt"]
+    assert len(list(scfs_api.iter_stored_objects())) == 3
+
+
+def test_manifest_copies_share_chunks(api, sqlite_store):
+    chunk = b"encrypted chunk"
+    chunk_id = hashlib.sha256(chunk).hexdigest()
+    assert api.put(f"/api/chunks/{chunk_id}", headers=AUTH, data=chunk).status_code == 200
+    manifest = {"chunks": [{"id": chunk_id, "size": 10, "enc_size": len(chunk)}], "fingerprint": FINGERPRINT}
+    first = api.post("/api/files/manifest", headers=AUTH, json=dict(manifest, filename="a.bin")).get_json()
+    second = api.post("/api/files/manifest", headers=AUTH, json=dict(manifest, filename="b.bin")).get_json()
+    assert first["success"] and second["success"] and second["copied"]
+    assert first["file_id"] != second["file_id"]
+    refs = sqlite_store.query("select ref_count from chunk_store where user_id = ?", (USER,))
+    assert refs == [{"ref_count": 2}]
+
+
+def test_chunks_of_deleted_files_are_collected(api, sqlite_store, local_storage, monkeypatch):
+    chunk = b"encrypted chunk"
+    chunk_id = hashlib.sha256(chunk).hexdigest()
+    api.put(f"/api/chunks/{chunk_id}", headers=AUTH, data=chunk)
+    manifest = {"chunks": [{"id": chunk_id, "size": 10, "enc_size": len(chunk)}], "filename": "a.bin"}
+    file_id = api.post("/api/files/manifest", headers=AUTH, json=manifest).get_json()["file_id"]
+    assert scfs_api.collect_garbage() == (0, 0)
+
+    assert api.delete(f"/api/files/{file_id}", headers=AUTH).status_code == 200
+    assert scfs_api.collect_garbage() == (0, 0)
+    assert api.get(f"/api/chunks/{chunk_id}", headers=AUTH).status_code == 200
+
+    monkeypatch.setattr(scfs_api, "CHUNK_GC_GRACE", -1)
+    assert scfs_api.collect_garbage() == (1, 0)
+    assert sqlite_store.query("select * from chunk_store") == []
+    assert list(scfs_api.iter_stored_objects()) == []
+
+
+def test_manifest_with_missing_chunks_claims_nothing(api, sqlite_store):
+    chunk = b"encrypted chunk"
+    chunk_id = hashlib.sha256(chunk).hexdigest()
+    api.put(f"/api/chunks/{chunk_id}", headers=AUTH, data=chunk)
+    manifest = {"filename": "a.bin", "chunks": [
+        {"id": chunk_id, "size": 10, "enc_size": len(chunk)}, {"id": "cd" * 32, "size": 10, "enc_size": 10}
+    ]}
+    response = api.post("/api/files/manifest", headers=AUTH, json=manifest)
+    assert response.status_code == 409 and response.get_json()["missing"] == ["cd" * 32]
+    assert sqlite_store.query("select ref_count from chunk_store") == [{"ref_count": 0}]
+
+
+def test_expired_uploads_are_aborted(api, sqlite_store, local_storage):
+    response = api.post("/api/uploads", headers=AUTH, json={"filename": "big.bin", "size": 3 * 1024 * 1024})
+    session = response.get_json()
+    assert session["part_size"] == 3 * 1024 * 1024
+    api.put(f"/api/uploads/{session['session_id']}/parts/1", headers=AUTH, data=b"x" * session["part_size"])
+    assert os.listdir(local_storage.uploads_dir)
+    assert scfs_api.collect_garbage() == (0, 0)
+
+    sqlite_store.query("update upload_sessions set expires_at = '2000-01-01T00:00:00+00:00'")
+    assert scfs_api.collect_garbage() == (1, 0)
+    assert not os.listdir(local_storage.uploads_dir)
+    assert api.get(f"/api/uploads/{session['session_id']}", headers=AUTH).status_code == 404
+
+
+def test_garbage_collector_starts_once_on_first_request(api, monkeypatch):
+    started = []
+    monkeypatch.setattr(scfs_api, "GC_INTERVAL", 300)
+    monkeypatch.setattr(scfs_api, "garbage_collector", None)
+    monkeypatch.setattr(scfs_api, "start_garbage_collector", lambda: started.append(1) or object())
+    api.get("/api/health")
+    api.get("/api/files", headers=AUTH)
+    assert started == [1]
@@ -0,0 +1,97 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import scfs_api
+from scfs_api import parse_range_header, encode_list_cursor, decode_list_cursor, reconcile
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("", None),
+    ("bytes=-", None),
+    ("items=0-5", None),
+    ("bytes=0-9,20-29", None),
+    ("bytes=0-0", (0, 0)),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=10-", (10, 99)),
+    ("bytes=90-500", (90, 99)),
+    ("bytes=-10", (90, 99)),
+    ("bytes=-500", (0, 99)),
+    (" bytes=5-6 ", (5, 6)),
+])
+def test_parse_range_header(header, expected):
+    assert parse_range_header(header, 100) == expected
+
+
+@pytest.mark.parametrize("header, size", [
+    ("bytes=100-", 100),
+    ("bytes=100-200", 100),
+    ("bytes=10-5", 100),
+    ("bytes=-0", 100),
+    ("bytes=-5", 0),
+    ("bytes=0-", 0),
+])
+def test_parse_range_header_unsatisfiable(header, size):
+    with pytest.raises(ValueError):
+        parse_range_header(header, size)
+
+
+def test_list_cursor_round_trip():
+    row = {"id": "6f1c", "uploaded_at": "2026-01-01T00:00:00+00:00", "filename": 'dir/"quoted",name'}
+    for sort in scfs_api.FILE_SORT_KEYS:
+        for descending in (True, False):
+            cursor = encode_list_cursor(sort, descending, row)
+            assert decode_list_cursor(cursor, sort, descending) == (row[sort], row["id"])
+
+
+@pytest.mark.parametrize("sort, descending", [("filename", True), ("uploaded_at", False)])
+def test_list_cursor_is_bound_to_its_order(sort, descending):
+    cursor = encode_list_cursor("uploaded_at", True, {"id": "1", "uploaded_at": "x"})
+    with pytest.raises(ValueError):
+        decode_list_cursor(cursor, sort, descending)
+
+
+@pytest.mark.parametrize("cursor", ["", "not base64!", "bm90IGpzb24="])
+def test_list_cursor_rejects_garbage(cursor):
+    with pytest.raises(ValueError):
+        decode_list_cursor(cursor, "uploaded_at", True)
+
+
+NOW = datetime(2026, 1, 1, tzinfo=timezone.utc)
+OLD = NOW - timedelta(days=1)
+
+
+def test_reconcile_merge_join():
+    objects = [("a", OLD), ("b", OLD), ("b2", NOW), ("d", OLD), ("f", None)]
+    referenced = ["b", "b", "c", "d", "e"]
+    assert list(reconcile(objects, referenced, grace=60, now=NOW)) == [
+        ("orphan", "a"), ("missing", "c"), ("missing", "e"), ("orphan", "f")
+    ]
+
+
+def test_reconcile_compares_bytes_not_case():
+    # Storage lists in byte order: upper case sorts before lower case
+    objects = [("B", OLD), ("a", OLD)]
+    assert list(reconcile(objects, ["a"], grace=0, now=NOW)) == [("orphan", "B")]
+
+
+@pytest.mark.parametrize("objects, referenced", [
+    ([("b", OLD), ("a", OLD)], []),
+    ([], ["b", "a"]),
+])
+def test_reconcile_refuses_unordered_input(objects, referenced):
+    with pytest.raises(ValueError):
+        list(reconcile(objects, referenced, grace=0, now=NOW))
+
+
+def test_run_reconciliation_deletes_only_orphans(monkeypatch):
+    batches = []
+    monkeypatch.setattr(scfs_api, "delete_objects", lambda names: batches.append(list(names)) or {
+        name: "boom" for name in names if name == "c"
+    })
+    summary = scfs_api.run_reconciliation(
+        [("a", OLD), ("b", OLD), ("c", OLD)], ["b", "z"], delete=True, grace=0, batch_size=1
+    )
+    assert batches == [["a"], ["c"]]
+    assert summary == {"orphans": 2, "deleted": 1, "failed": 1, "missing": 1}
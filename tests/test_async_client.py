@@ -0,0 +1,88 @@
+import asyncio
+import os
+
+import pytest
+
+import securecloud
+
+
+def run(client, scenario):
+    async def main():
+        async with client:
+            return await scenario()
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def files(tmp_path):
+    folder = tmp_path / "files"
+    folder.mkdir()
+    sizes = {"small.txt": 1000, "chunked.bin": 3 * 1024 * 1024 // 2}
+    for name, size in sizes.items():
+        (folder / name).write_bytes(os.urandom(size))
+    return folder
+
+
+def test_upload_and_download_concurrently(async_client, files, tmp_path):
+    names = sorted(os.listdir(files))
+
+    async def scenario():
+        results = await asyncio.gather(*(async_client.upload(str(files / name)) for name in names))
+        listed = await async_client.list_files(fields=securecloud.DOWNLOAD_FIELDS)
+        await asyncio.gather(*(async_client.download(file_data, str(tmp_path / f"out-{file_data['filename']}"))
+                               for file_data in listed))
+        return results, listed
+
+    results, listed = run(async_client, scenario)
+    assert all(result["success"] and not result.get("duplicate") for result in results)
+    assert sorted(file_data["filename"] for file_data in listed) == names
+    assert [file_data["filename"] for file_data in listed if file_data.get("manifest")] == ["chunked.bin"]
+    for name in names:
+        assert (tmp_path / f"out-{name}").read_bytes() == (files / name).read_bytes()
+
+
+def test_resumable_upload(async_client, files, tmp_path, monkeypatch):
+    monkeypatch.setattr(securecloud, "RESUMABLE_UPLOAD_THRESHOLD", 1024 * 1024)
+    path = files / "chunked.bin"
+
+    async def scenario():
+        result = await async_client.upload(str(path))
+        await async_client.download_file("chunked.bin", str(tmp_path / "out.bin"))
+        return result
+
+    assert run(async_client, scenario)["success"]
+    assert (tmp_path / "out.bin").read_bytes() == path.read_bytes()
+    assert not list((securecloud.STATE_DIR / "uploads").iterdir())
+
+
+def test_duplicates_and_copies(async_client, files):
+    path = files / "small.txt"
+    (files / "renamed.txt").write_bytes(path.read_bytes())
+
+    async def scenario():
+        first = await async_client.upload(str(path))
+        again = await async_client.upload(str(path))
+        copy = await async_client.upload(str(files / "renamed.txt"))
+        return first, again, copy
+
+    first, again, copy = run(async_client, scenario)
+    assert again["duplicate"] and again["file_id"] == first["file_id"]
+    assert copy["copied"] and copy["file_id"] != first["file_id"]
+
+
+def test_rejected_token_signs_in_again(async_client, files):
+    async def scenario():
+        assert await async_client.authenticate()
+        async_client.access_token = "revoked"
+        return await async_client.upload(str(files / "small.txt"))
+
+    assert run(async_client, scenario)["success"]
+    assert async_client.access_token not in (None, "revoked")
+
+
+def test_only_the_rejected_token_is_cleared(async_client):
+    async_client.access_token, async_client.refresh_token = "renewed", "refresh"
+    async_client._clear_session("rejected")
+    assert async_client.access_token == "renewed"
+    async_client._clear_session("renewed")
+    assert async_client.access_token is None and async_client.refresh_token is None
@@ -0,0 +1,88 @@
+import pytest
+
+import scfs_api
+from conftest import AUTH
+
+
+@pytest.fixture
+def caches(monkeypatch):
+    """Empty token and credential caches, so no test sees another's sign-ins"""
+    monkeypatch.setattr(scfs_api, "token_cache", scfs_api.TTLCache(8, 60))
+    monkeypatch.setattr(scfs_api, "credential_cache", scfs_api.TTLCache(8, 60))
+
+
+@pytest.fixture
+def sign_ins(monkeypatch, caches):
+    """Calls reaching authenticate_user (Supabase in production)"""
+    calls = []
+    authenticate_user = scfs_api.authenticate_user
+
+    def counting(email, password):
+        calls.append(email)
+        return authenticate_user(email, password)
+
+    monkeypatch.setattr(scfs_api, "authenticate_user", counting)
+    return calls
+
+
+def test_ttl_cache_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(scfs_api.time, "monotonic", lambda: now[0])
+    cache = scfs_api.TTLCache(8, 10)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=30)
+
+    now[0] += 20
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    cache.pop("b")
+    assert cache.get("b") is None
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = scfs_api.TTLCache(2, 60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+
+
+def test_credentials_are_verified_once(api, sign_ins):
+    for _ in range(3):
+        assert api.get("/api/files", headers=AUTH).status_code == 200
+    assert sign_ins == [AUTH["X-User-Email"]]
+
+    other_password = {**AUTH, "X-User-Password": "another"}
+    assert api.get("/api/files", headers=other_password).status_code == 200
+    assert len(sign_ins) == 2
+
+
+def test_login_tokens_authenticate_requests(api, sign_ins):
+    session = api.post("/api/auth/login", json={"email": AUTH["X-User-Email"], "password": "secret"}).get_json()
+    assert session["success"] and session["token_type"] == "Bearer"
+
+    bearer = {"Authorization": f"Bearer {session['access_token']}"}
+    assert api.get("/api/files", headers=bearer).status_code == 200
+    assert api.get("/api/files", headers={"Authorization": "Bearer forged"}).status_code == 401
+    # A refresh token is not an access token
+    assert api.get("/api/files", headers={"Authorization": f"Bearer {session['refresh_token']}"}).status_code == 401
+    assert sign_ins == [AUTH["X-User-Email"]]
+
+
+def test_refresh_issues_a_new_session(api, caches):
+    session = api.post("/api/auth/login", json={"email": AUTH["X-User-Email"], "password": "secret"}).get_json()
+    refreshed = api.post("/api/auth/refresh", json={"refresh_token": session["refresh_token"]})
+    assert refreshed.status_code == 200
+    assert refreshed.get_json()["user"] == session["user"]
+
+    rejected = api.post("/api/auth/refresh", json={"refresh_token": session["access_token"]})
+    assert rejected.status_code == 401
+
+
+def test_expired_access_token_is_rejected(api, caches, monkeypatch):
+    session = api.post("/api/auth/login", json={"email": AUTH["X-User-Email"], "password": "secret"}).get_json()
+    monkeypatch.setattr(scfs_api, "ACCESS_TOKEN_TTL", -1)
+    response = api.get("/api/files", headers={"Authorization": f"Bearer {session['access_token']}"})
+    assert response.status_code == 401
@@ -0,0 +1,69 @@
+import io
+
+import pytest
+
+import scfs_api
+from conftest import AUTH
+
+
+def upload(api, filename, data):
+    response = api.post("/api/files/upload", headers=AUTH, data={"file": (io.BytesIO(data), filename)})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()["file_id"]
+
+
+def changes(api, **params):
+    response = api.get("/api/files/changes", headers=AUTH, query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_feed_replays_changes_after_the_cursor(api):
+    upload(api, "old.txt", b"before the cursor")
+    start = changes(api)
+    assert start["changes"] == [] and not start["has_more"]
+
+    first = upload(api, "a.txt", b"alpha")
+    second = upload(api, "b.txt", b"beta")
+    api.delete(f"/api/files/{first}", headers=AUTH)
+
+    feed = changes(api, since=start["cursor"])
+    assert [(change["op"], change["file_id"], change["filename"]) for change in feed["changes"]] == [
+        ("insert", first, "a.txt"), ("insert", second, "b.txt"), ("delete", first, "a.txt")
+    ]
+    assert not feed["has_more"]
+    assert changes(api, since=feed["cursor"]) == {**feed, "changes": []}
+
+
+def test_feed_pages_follow_the_cursor(api):
+    cursor = changes(api)["cursor"]
+    ids = [upload(api, f"{index}.txt", str(index).encode()) for index in range(3)]
+
+    seen = []
+    while True:
+        page = changes(api, since=cursor, limit=2)
+        seen += [change["file_id"] for change in page["changes"]]
+        cursor = page["cursor"]
+        if not page["has_more"]:
+            break
+    assert seen == ids
+
+
+@pytest.mark.parametrize("params", [{"since": "-1"}, {"since": "latest"}, {"limit": "many"}])
+def test_feed_rejects_bad_parameters(api, params):
+    assert api.get("/api/files/changes", headers=AUTH, query_string=params).status_code == 400
+
+
+def test_client_reads_the_whole_feed(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(scfs_api, "CHANGE_FEED_PAGE_SIZE", 1)
+    feed, cursor = client.get_changes()
+    assert feed == []
+
+    for name in ("a.txt", "b.txt", "c.txt"):
+        path = tmp_path / name
+        path.write_bytes(name.encode())
+        client.upload(str(path))
+
+    feed, cursor = client.get_changes(cursor)
+    assert [change["filename"] for change in feed] == ["a.txt", "b.txt", "c.txt"]
+    assert client.get_changes(cursor) == ([], cursor)
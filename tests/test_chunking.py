@@ -0,0 +1,67 @@
+import io
+import os
+import random
+
+import pytest
+
+import scfs_api
+import securecloud
+from securecloud import CDC_MIN_SIZE, CDC_MAX_SIZE, cdc_cut_point, iter_chunks
+from conftest import AUTH
+
+
+def sample(seed, size):
+    return random.Random(seed).randbytes(size)
+
+
+def cut_points(data):
+    points, offset = [], 0
+    while offset < len(data):
+        offset += cdc_cut_point(data[offset:offset + CDC_MAX_SIZE])
+        points.append(offset)
+    return points
+
+
+def test_chunks_cover_the_file_within_size_bounds():
+    data = sample(1, 4 * CDC_MAX_SIZE)
+    chunks = list(iter_chunks(io.BytesIO(data)))
+    assert b"".join(chunks) == data
+    assert all(CDC_MIN_SIZE < len(chunk) <= CDC_MAX_SIZE for chunk in chunks[:-1])
+
+
+def test_edits_only_change_nearby_chunks():
+    data = sample(2, 4 * CDC_MAX_SIZE)
+    edited = data[:CDC_MAX_SIZE] + b"inserted" + data[CDC_MAX_SIZE:]
+    before, after = set(iter_chunks(io.BytesIO(data))), list(iter_chunks(io.BytesIO(edited)))
+    assert sum(chunk not in before for chunk in after) <= 2
+
+
+@pytest.mark.parametrize("data", [
+    sample(3, 3 * CDC_MAX_SIZE),
+    bytes(2 * CDC_MAX_SIZE),
+    sample(4, CDC_MIN_SIZE + 100),
+    b"ab" * (CDC_MAX_SIZE // 3),
+])
+def test_numpy_finds_the_same_cut_points(data, monkeypatch):
+    pytest.importorskip("numpy")
+    vectorised = cut_points(data)
+    monkeypatch.setattr(securecloud, "numpy", None)
+    assert cut_points(data) == vectorised
+
+
+def test_oversized_files_are_refused_before_chunks_are_sent(api):
+    response = api.post("/api/chunks/missing", headers=AUTH, json={
+        "chunks": ["ab" * 32], "size": scfs_api.MAX_FILE_SIZE + 1
+    })
+    assert response.status_code == 400 and "too large" in response.get_json()["error"]
+    response = api.post("/api/chunks/missing", headers=AUTH, json={"chunks": ["ab" * 32], "size": 1000})
+    assert response.get_json()["missing"] == ["ab" * 32]
+
+
+def test_client_sends_no_chunks_of_an_oversized_file(client, sqlite_store, tmp_path, monkeypatch):
+    path = tmp_path / "big.bin"
+    path.write_bytes(os.urandom(3 * 1024 * 1024 // 2))
+    monkeypatch.setattr(scfs_api, "MAX_FILE_SIZE", 1024 * 1024)
+    with pytest.raises(securecloud.UploadError, match="too large"):
+        client.upload(str(path))
+    assert sqlite_store.query("select * from chunk_store") == []
@@ -0,0 +1,80 @@
+import stat
+
+import pytest
+
+import securecloud
+from conftest import AUTH
+
+
+@pytest.fixture
+def state_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(securecloud, "STATE_DIR", tmp_path / "state")
+    return tmp_path / "state"
+
+
+@pytest.fixture
+def derivations(monkeypatch):
+    """Keys derived with PBKDF2 rather than read from a cache"""
+    calls = []
+    kdf = securecloud.PBKDF2HMAC
+
+    def counting(*args, **kwargs):
+        calls.append(kwargs.get("iterations"))
+        return kdf(*args, **kwargs)
+
+    monkeypatch.setattr(securecloud, "PBKDF2HMAC", counting)
+    return calls
+
+
+@pytest.fixture
+def requests_seen(client):
+    """Paths of the requests the client sends"""
+    paths = []
+    adapter = client.transport.session.get_adapter(securecloud.API_BASE_URL)
+    adapter.fail = lambda request: paths.append(request.path_url.split("?")[0])
+    return paths
+
+
+def test_key_cache_round_trip(state_dir):
+    cache = securecloud.KeyCache("file")
+    key = bytes(range(32))
+    cache.store("User@example.com", "secret", key)
+
+    assert cache.load("user@example.com", "secret") == key
+    assert cache.load("user@example.com", "wrong") is None
+    assert cache.load("other@example.com", "secret") is None
+    [path] = (state_dir / "keys").iterdir()
+    assert stat.S_IMODE(path.stat().st_mode) == 0o600
+
+
+def test_cached_key_skips_derivation(state_dir, derivations):
+    first = securecloud.SecureCloudClient(AUTH["X-User-Email"], AUTH["X-User-Password"], key_cache="file")
+    second = securecloud.SecureCloudClient(AUTH["X-User-Email"], AUTH["X-User-Password"], key_cache="file")
+    assert len(derivations) == 1
+    assert second.fingerprint_key == first.fingerprint_key
+
+    securecloud.SecureCloudClient(AUTH["X-User-Email"], "changed", key_cache="file")
+    assert len(derivations) == 2
+
+
+def test_session_is_reused(client, requests_seen):
+    for _ in range(3):
+        assert client.list_files() == []
+    assert requests_seen.count("/api/auth/login") == 1
+    assert requests_seen.count("/api/files") == 3
+
+
+def test_expiring_session_is_refreshed(client, requests_seen):
+    assert client.authenticate()
+    client.token_expires_at = 0
+    assert client.list_files() == []
+    assert requests_seen.count("/api/auth/login") == 1
+    assert requests_seen.count("/api/auth/refresh") == 1
+
+
+def test_rejected_token_signs_in_again(client, requests_seen):
+    assert client.authenticate()
+    client.access_token = "revoked"
+    assert client.list_files() == []
+    assert requests_seen.count("/api/auth/login") == 2
+    assert client.access_token != "revoked"
@@ -0,0 +1,83 @@
+import io
+
+import pytest
+
+import scfs_api
+from conftest import AUTH
+
+
+def upload(api, filename, data):
+    response = api.post("/api/files/upload", headers=AUTH, data={"file": (io.BytesIO(data), filename)})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+@pytest.fixture
+def not_modified(monkeypatch):
+    """304 responses the api sent"""
+    sent = []
+    respond = scfs_api.not_modified
+
+    def counting(*args, **kwargs):
+        sent.append(args)
+        return respond(*args, **kwargs)
+
+    monkeypatch.setattr(scfs_api, "not_modified", counting)
+    return sent
+
+
+def test_listing_is_revalidated(api):
+    upload(api, "a.txt", b"alpha")
+    first = api.get("/api/files", headers=AUTH)
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    again = api.get("/api/files", headers={**AUTH, "If-None-Match": etag})
+    assert again.status_code == 304 and again.data == b""
+    assert again.headers["ETag"] == etag
+
+    # Another query is another representation
+    other = api.get("/api/files?limit=1", headers={**AUTH, "If-None-Match": etag})
+    assert other.status_code == 200 and other.headers["ETag"] != etag
+
+    upload(api, "b.txt", b"beta")
+    changed = api.get("/api/files", headers={**AUTH, "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["ETag"] != etag
+    assert len(changed.get_json()["files"]) == 2
+
+
+def test_download_is_revalidated(api):
+    file_id = upload(api, "a.txt", b"alpha")["file_id"]
+    first = api.get(f"/api/files/download/{file_id}", headers=AUTH)
+    assert first.data == b"alpha"
+
+    by_etag = api.get(f"/api/files/download/{file_id}", headers={**AUTH, "If-None-Match": first.headers["ETag"]})
+    assert by_etag.status_code == 304 and by_etag.data == b""
+    by_date = api.get(f"/api/files/download/{file_id}",
+                      headers={**AUTH, "If-Modified-Since": first.headers["Last-Modified"]})
+    assert by_date.status_code == 304
+    stale = api.get(f"/api/files/download/{file_id}", headers={**AUTH, "If-None-Match": '"other"'})
+    assert stale.status_code == 200 and stale.data == b"alpha"
+
+
+def test_client_reuses_unchanged_listing_pages(client, not_modified):
+    client.list_files()
+    assert client.list_files() == []
+    assert len(not_modified) == 1
+
+
+def test_client_skips_unchanged_downloads(client, not_modified, tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"alpha")
+    client.upload(str(path))
+    [file_data] = client.list_files(fields=["id", "filename", "size", "hash_sha256"])
+    output = tmp_path / "out.txt"
+
+    assert client.download(file_data, str(output))
+    assert not client.download(file_data, str(output))
+    assert len(not_modified) == 1
+
+    # A local edit means the cached copy can no longer stand in for the file
+    output.write_bytes(b"edited")
+    assert client.download(file_data, str(output))
+    assert output.read_bytes() == b"alpha"
@@ -0,0 +1,127 @@
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError
+
+import securecloud
+
+URL = "http://scripted/api/thing"
+
+
+class ScriptedAdapter(requests.adapters.BaseAdapter):
+    """Answers each request with the next scripted status code or exception"""
+
+    def __init__(self, script):
+        super().__init__()
+        self.script = list(script)
+        self.sent = []
+
+    def send(self, request, **kwargs):
+        self.sent.append(request.method)
+        step = self.script.pop(0) if len(self.script) > 1 else self.script[0]
+        if isinstance(step, Exception):
+            raise step
+        status, headers = step if isinstance(step, tuple) else (step, {})
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers)
+        response.request = request
+        response.raw = None
+        response._content = b""
+        return response
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    monkeypatch.setattr(securecloud, "RETRY_BACKOFF", 0)
+    slept = []
+    monkeypatch.setattr(securecloud.time, "sleep", slept.append)
+    return slept
+
+
+def transport(*script):
+    transport = securecloud.HttpTransport(retries=3)
+    adapter = ScriptedAdapter(script)
+    transport.session.mount("http://scripted/", adapter)
+    return transport, adapter
+
+
+def refused():
+    return requests.ConnectionError(MaxRetryError(None, URL, securecloud.NewConnectionError(None, "refused")))
+
+
+def test_transient_statuses_are_retried(sleeps):
+    http, adapter = transport(503, 502, 200)
+    assert http.request("GET", URL).status_code == 200
+    assert adapter.sent == ["GET"] * 3
+    assert len(sleeps) == 2
+
+
+def test_last_response_is_returned_when_retries_run_out(sleeps):
+    http, adapter = transport(500)
+    assert http.request("GET", URL).status_code == 500
+    assert len(adapter.sent) == 4
+
+
+def test_backoff_grows_exponentially(monkeypatch, sleeps):
+    monkeypatch.setattr(securecloud, "RETRY_BACKOFF", 1.0)
+    http, _ = transport(500)
+    http.request("GET", URL)
+    # Each delay is its base plus up to as much again of jitter
+    assert len(sleeps) == 3
+    assert all(base <= delay <= 2 * base for base, delay in zip([1, 2, 4], sleeps))
+
+
+@pytest.mark.parametrize("header, delay", [("7", 7), ("1000", securecloud.HTTP_MAX_RETRY_AFTER),
+                                           ("Wed, 21 Oct 2026 07:28:00 GMT", 0)])
+def test_retry_after_is_honoured(sleeps, header, delay):
+    http, _ = transport((429, {"Retry-After": header}), 200)
+    assert http.request("GET", URL).status_code == 200
+    assert sleeps == [delay]
+
+
+def test_unsafe_requests_are_not_repeated(sleeps):
+    http, adapter = transport(500, 200)
+    assert http.request("POST", URL, data=b"body").status_code == 500
+    assert adapter.sent == ["POST"]
+
+    http, adapter = transport(500, 200)
+    assert http.request("POST", URL, data=b"body", idempotent=True).status_code == 200
+    assert adapter.sent == ["POST", "POST"]
+
+
+def test_rejected_requests_are_repeated_when_the_body_allows(sleeps):
+    http, adapter = transport(503, 200)
+    assert http.request("POST", URL, data=b"body").status_code == 200
+    assert len(adapter.sent) == 2
+
+    # A streamed body cannot be sent again
+    http, adapter = transport(503, 200)
+    assert http.request("PUT", URL, data=iter([b"body"])).status_code == 503
+    assert len(adapter.sent) == 1
+
+
+def test_dropped_connections(sleeps):
+    http, _ = transport(requests.ConnectionError("reset"), 200)
+    assert http.request("GET", URL).status_code == 200
+
+    # The server may have processed a POST whose connection dropped
+    http, adapter = transport(requests.ConnectionError("reset"), 200)
+    with pytest.raises(requests.ConnectionError):
+        http.request("POST", URL, data=b"body")
+    assert len(adapter.sent) == 1
+
+    # but not one that never got a connection
+    http, adapter = transport(refused(), 200)
+    assert http.request("POST", URL, data=b"body").status_code == 200
+    assert len(adapter.sent) == 2
+
+
+def test_pool_only_grows():
+    http = securecloud.HttpTransport(pool_size=4)
+    http.resize(8)
+    http.resize(2)
+    assert http.pool_size == 8
+    assert http.session.get_adapter("https://example.com")._pool_maxsize == 8
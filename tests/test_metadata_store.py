@@ -0,0 +1,228 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import scfs_api
+from scfs_api import MetadataStore, file_metadata_row
+
+
+@pytest.fixture
+def store(sqlite_store):
+    assert isinstance(sqlite_store, MetadataStore)
+    return sqlite_store
+
+
+def add_files(store, user_id, count, manifest=None):
+    rows = [
+        file_metadata_row(user_id, f"dir/f{i:02d}.txt", i, f"hash{i}", f"{user_id}/obj{i:02d}", f"fp{i}", manifest)
+        for i in range(count)
+    ]
+    return store.insert_files(rows)
+
+
+def test_insert_get_count(store):
+    stored = add_files(store, "u1", 3, {"chunks": [{"id": "c1"}]})
+    assert len({row["id"] for row in stored}) == 3
+    assert store.count_files("u1") == 3 and store.count_files("u2") == 0
+    row = store.get_file("u1", stored[1]["id"])
+    assert row["filename"] == "dir/f01.txt" and row["manifest"] == {"chunks": [{"id": "c1"}]}
+    assert store.get_file("u2", stored[1]["id"]) is None
+
+
+def test_list_pages_by_cursor(store):
+    add_files(store, "u1", 25)
+    add_files(store, "u2", 5)
+    for sort in scfs_api.FILE_SORT_KEYS:
+        for descending in (True, False):
+            seen, after = [], None
+            while True:
+                rows = store.list_files("u1", ["id", sort, "filename"], sort, descending, 7, after=after)
+                seen += rows
+                if len(rows) < 7:
+                    break
+                after = (rows[-1][sort], rows[-1]["id"])
+            keys = [(row[sort], row["id"]) for row in seen]
+            assert len(seen) == 25 and keys == sorted(keys, reverse=descending)
+
+
+def test_list_filters(store):
+    stored = add_files(store, "u1", 25)
+    by_prefix = store.list_files("u1", ["id", "filename"], "filename", False, 100, prefix="dir/f1")
+    assert [row["filename"] for row in by_prefix] == [f"dir/f1{i}.txt" for i in range(10)]
+    assert store.list_files("u1", ["id"], "filename", False, 100, prefix="DIR/") == []
+    assert len(store.list_files("u1", ["id"], "filename", False, 100, name="dir/f03.txt")) == 1
+    ids = [stored[0]["id"], stored[4]["id"], "not-an-id"]
+    assert {row["id"] for row in store.list_files("u1", ["id"], "filename", False, 100, ids=ids)} == set(ids[:2])
+    with pytest.raises(ValueError):
+        store.list_files("u1", ["id", "password"], "filename", False, 10)
+
+
+def test_find_files(store):
+    add_files(store, "u1", 5)
+    found = store.find_files("u1", "content_fingerprint", ["fp1", "fp3", "zzz"])
+    assert sorted(row["content_fingerprint"] for row in found) == ["fp1", "fp3"]
+    assert [row["filename"] for row in store.find_files("u1", "hash_sha256", ["hash2"])] == ["dir/f02.txt"]
+    assert store.find_files("u2", "hash_sha256", ["hash2"]) == []
+
+
+def test_delete_returns_rows_and_feeds_changes(store):
+    assert store.listing_version("u1") == {"version": 0, "updated_at": None}
+    assert store.latest_change("u1", "9999") == 0
+    stored = add_files(store, "u1", 3, {"chunks": []})
+    version = store.listing_version("u1")["version"]
+    deleted = store.delete_files("u1", [stored[0]["id"], "not-an-id"])
+    assert [row["id"] for row in deleted] == [stored[0]["id"]] and deleted[0]["manifest"] == {"chunks": []}
+    assert store.delete_files("u2", [stored[1]["id"]]) == []
+    assert store.count_files("u1") == 2
+    assert store.listing_version("u1")["version"] > version
+    changes = store.changes("u1", 0, "9999", 100)
+    assert [(change["op"], change["file_id"]) for change in changes] == [
+        ("insert", stored[0]["id"]), ("insert", stored[1]["id"]), ("insert", stored[2]["id"]),
+        ("delete", stored[0]["id"])
+    ]
+    assert store.latest_change("u1", "9999") == changes[-1]["seq"]
+    assert store.changes("u1", changes[1]["seq"], "9999", 1)[0]["seq"] == changes[2]["seq"]
+
+
+def test_chunk_refs(store):
+    store.register_chunk("u1", "c1", "u1/chunks/c1", 5)
+    store.register_chunk("u1", "c1", "u1/chunks/c1", 9)
+    store.register_chunk("u1", "c2", "u1/chunks/c2", 5)
+    assert store.find_chunks("u1", ["c1", "c3"]) == {"c1"}
+    assert store.find_chunks("u2", ["c1"]) == set()
+    store.adjust_chunk_refs("u1", ["c1", "c1", "c2", "c3"], 1)
+    counts = {row["chunk_id"]: row["ref_count"] for row in store.query("select chunk_id, ref_count from chunk_store")}
+    assert counts == {"c1": 2, "c2": 1}
+
+
+def iso(moment):
+    return moment.isoformat()
+
+
+def test_referenced_objects_in_byte_order(store):
+    cutoff = iso(datetime.now(timezone.utc) - timedelta(hours=1))
+    add_files(store, "u1", 3)
+    store.register_chunk("u1", "c1", "u1/chunks/c1", 5)
+    store.adjust_chunk_refs("u1", ["c1"], 1)
+    assert store.referenced_objects("", "u1/", 10, cutoff) == ["u1/chunks/c1", "u1/obj00", "u1/obj01", "u1/obj02"]
+    assert store.referenced_objects("u1/obj00", "u1/", 1, cutoff) == ["u1/obj01"]
+    assert store.referenced_objects("", "u2/", 10, cutoff) == []
+
+
+def test_unreferenced_chunks_are_collected_after_grace(store):
+    store.register_chunk("u1", "live", "u1/chunks/live", 5)
+    store.register_chunk("u1", "dead", "u1/chunks/dead", 5)
+    store.register_chunk("u1", "new", "u1/chunks/new", 5)
+    store.adjust_chunk_refs("u1", ["live", "dead"], 1)
+    store.adjust_chunk_refs("u1", ["dead"], -1)
+    now = datetime.now(timezone.utc)
+    # Within the grace period nothing is collected and everything is still referenced
+    before = iso(now - timedelta(hours=1))
+    assert store.delete_unreferenced_chunks(before, 10) == []
+    assert len(store.referenced_objects("", "u1/", 10, before)) == 3
+    # Past it, unreferenced and never referenced chunks go, and reconciliation stops counting them
+    after = iso(now + timedelta(seconds=1))
+    assert store.referenced_objects("", "u1/", 10, after) == ["u1/chunks/live"]
+    dead = store.delete_unreferenced_chunks(after, 10)
+    assert sorted(row["object_name"] for row in dead) == ["u1/chunks/dead", "u1/chunks/new"]
+    assert store.find_chunks("u1", ["live", "dead", "new"]) == {"live"}
+
+
+def test_claiming_a_chunk_again_restarts_its_grace(store):
+    store.register_chunk("u1", "c1", "u1/chunks/c1", 5)
+    store.adjust_chunk_refs("u1", ["c1"], 1)
+    store.adjust_chunk_refs("u1", ["c1"], -1)
+    store.adjust_chunk_refs("u1", ["c1"], 1)
+    later = iso(datetime.now(timezone.utc) + timedelta(days=1))
+    assert store.delete_unreferenced_chunks(later, 10) == []
+    assert store.query("select unreferenced_at from chunk_store")[0]["unreferenced_at"] is None
+
+
+def test_upload_sessions(store):
+    now = datetime.now(timezone.utc)
+    session = {
+        "id": "4b5e0a6e-0000-4000-8000-000000000001", "user_id": "u1", "filename": "big.bin", "size": 10,
+        "part_size": 5, "content_fingerprint": None, "oci_object_name": "u1/big", "oci_upload_id": "up1",
+        "created_at": now.isoformat(), "expires_at": (now + timedelta(hours=1)).isoformat()
+    }
+    store.create_upload_session(session)
+    assert store.get_upload_session("u1", session["id"], now.isoformat())["oci_upload_id"] == "up1"
+    assert store.get_upload_session("u2", session["id"], now.isoformat()) is None
+    assert store.get_upload_session("u1", session["id"], (now + timedelta(hours=2)).isoformat()) is None
+    store.record_upload_part({"session_id": session["id"], "part_num": 2, "etag": "e2", "size": 5, "sha256": "s"})
+    store.record_upload_part({"session_id": session["id"], "part_num": 1, "etag": "e1", "size": 5, "sha256": "s"})
+    store.record_upload_part({"session_id": session["id"], "part_num": 1, "etag": "e1b", "size": 5, "sha256": "s"})
+    assert [(part["part_num"], part["etag"]) for part in store.get_upload_parts(session["id"])] == [(1, "e1b"), (2, "e2")]
+    assert store.expired_upload_sessions(now.isoformat(), 10) == []
+    expired = store.expired_upload_sessions((now + timedelta(hours=2)).isoformat(), 10)
+    assert expired == [{"id": session["id"], "oci_object_name": "u1/big", "oci_upload_id": "up1"}]
+    store.delete_upload_session(session["id"])
+    assert store.get_upload_parts(session["id"]) == []
+
+
+def test_object_gc_queue(store):
+    now = datetime.now(timezone.utc)
+    store.queue_object_deletions("u1", {"a": "first", "b": "error"})
+    store.queue_object_deletions("u1", {"a": "again"})
+    due = store.due_object_deletions((now + timedelta(seconds=1)).isoformat(), 10)
+    assert sorted((row["object_name"], row["attempts"]) for row in due) == [("a", 0), ("b", 0)]
+    store.retry_object_deletion("a", 1, "still failing", (now + timedelta(hours=1)).isoformat())
+    store.dequeue_object_deletions(["b"])
+    assert store.due_object_deletions((now + timedelta(seconds=1)).isoformat(), 10) == []
+    assert [row["object_name"] for row in store.due_object_deletions((now + timedelta(hours=2)).isoformat(), 10)] == ["a"]
+
+
+def test_concurrent_writers(store):
+    errors = []
+
+    def write(worker):
+        try:
+            for i in range(20):
+                store.insert_files([file_metadata_row("u1", f"w{worker}/{i}", 1, "h", f"u1/w{worker}/{i}")])
+                store.list_files("u1", ["id"], "uploaded_at", True, 5)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert store.count_files("u1") == 160
+    assert store.listing_version("u1")["version"] == 160
+    assert store.query("pragma journal_mode")[0]["journal_mode"] == "wal"
+
+
+def test_interface_is_abstract():
+    with pytest.raises(TypeError):
+        MetadataStore()
+
+
+def test_timestamps_are_utc(store):
+    stored = add_files(store, "u1", 1)[0]
+    assert datetime.fromisoformat(stored["uploaded_at"]).utcoffset() == timedelta(0)
+    row = store.get_file("u1", stored["id"])
+    assert row["created_at"].endswith("+00:00") and row["uploaded_at"].endswith("+00:00")
+
+
+def test_failed_commit_rolls_back(store):
+    store.query("create table dangling (session_id text references upload_sessions (id) deferrable initially deferred)")
+    # The foreign key is only checked on commit, so it is the commit that fails
+    with pytest.raises(scfs_api.sqlite3.IntegrityError):
+        with store.transaction() as conn:
+            conn.execute("insert into dangling values ('no-such-session')")
+    assert store.query("select count(*) as count from dangling") == [{"count": 0}]
+    add_files(store, "u1", 1)
+    assert store.count_files("u1") == 1
+
+
+def test_configured_backend_must_be_available(monkeypatch):
+    monkeypatch.setattr(scfs_api, "supabase", None)
+    monkeypatch.setattr(scfs_api, "METADATA_BACKEND", "supabase")
+    with pytest.raises(RuntimeError):
+        scfs_api.create_metadata_store()
+    monkeypatch.setattr(scfs_api, "METADATA_BACKEND", "postgres")
+    with pytest.raises(ValueError):
+        scfs_api.create_metadata_store()
@@ -0,0 +1,66 @@
+import os
+from pathlib import Path
+
+import pytest
+
+import scfs_api
+import securecloud
+from conftest import AUTH
+
+
+@pytest.fixture
+def ranges(client, monkeypatch):
+    """Send every download as ranges of two segments, recording the requests"""
+    monkeypatch.setattr(securecloud, "PARALLEL_DOWNLOAD_THRESHOLD", 0)
+    monkeypatch.setattr(securecloud, "DOWNLOAD_RANGE_SEGMENTS", 2)
+    seen = []
+    adapter = client.transport.session.get_adapter(securecloud.API_BASE_URL)
+    adapter.fail = lambda request: seen.append((request.path_url, request.headers.get("Range")))
+    return seen
+
+
+def uploaded(client, tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(os.urandom(size))
+    client.upload(str(path))
+    [file_data] = [f for f in client.list_files(fields=securecloud.DOWNLOAD_FIELDS) if f["filename"] == name]
+    return path, file_data
+
+
+def test_stream_is_fetched_in_ranges(client, ranges, tmp_path):
+    # Below the chunking threshold: one SCFS stream of four segments
+    path, file_data = uploaded(client, tmp_path, "stream.bin", 4 * securecloud.STREAM_SEGMENT_SIZE - 100)
+    ranges.clear()
+
+    assert client.download(file_data, str(tmp_path / "out.bin"), workers=4)
+    assert (tmp_path / "out.bin").read_bytes() == path.read_bytes()
+    fetched = sorted(header for url, header in ranges if url.startswith("/api/files/download/"))
+    header = securecloud.STREAM_HEADER.size
+    sealed = securecloud.STREAM_SEGMENT_SIZE + securecloud.STREAM_TAG_SIZE
+    assert fetched == [f"bytes=0-{header - 1}", f"bytes={header}-{header + 2 * sealed - 1}",
+                       f"bytes={header + 2 * sealed}-{file_data['size'] - 1}"]
+
+
+def test_chunked_file_is_fetched_by_chunk(client, ranges, tmp_path):
+    path, file_data = uploaded(client, tmp_path, "chunked.bin", 2 * 1024 * 1024)
+    assert file_data.get("manifest")
+    ranges.clear()
+
+    assert client.download(file_data, str(tmp_path / "out.bin"), workers=4)
+    assert (tmp_path / "out.bin").read_bytes() == path.read_bytes()
+    chunk_ids = {entry["id"] for entry in file_data["manifest"]["chunks"]}
+    assert {url.rsplit("/", 1)[1] for url, _ in ranges if url.startswith("/api/chunks/")} == chunk_ids
+
+
+def test_tampered_range_fails_without_output(client, ranges, tmp_path):
+    _, file_data = uploaded(client, tmp_path, "stream.bin", 4 * securecloud.STREAM_SEGMENT_SIZE - 100)
+    row = scfs_api.metadata.get_file(AUTH["X-User-Email"], file_data["id"])
+    stored = Path(scfs_api.storage._path(row["oci_object_name"]))
+    data = bytearray(stored.read_bytes())
+    data[len(data) // 2] ^= 1
+    stored.write_bytes(bytes(data))
+
+    with pytest.raises(securecloud.DownloadError) as error:
+        client.download(file_data, str(tmp_path / "out.bin"), workers=4)
+    assert not error.value.retryable
+    assert not (tmp_path / "out.bin").exists()
@@ -0,0 +1,116 @@
+import pytest
+
+import securecloud
+
+
+@pytest.fixture
+def folder(tmp_path):
+    folder = tmp_path / "docs"
+    folder.mkdir()
+    return folder
+
+
+@pytest.fixture
+def sync(client, folder):
+    """UploadPool and RemoteSync for folder, two-way under the "docs/" prefix"""
+    state = securecloud.SyncState(str(folder), client.email, client.fingerprint_file)
+    pool = securecloud.UploadPool(client, workers=2, state=state, folder_path=str(folder),
+                                  replace_remote=True, remote_prefix="docs/")
+    remote = securecloud.RemoteSync(client, pool, state, str(folder), remote_prefix="docs/")
+    yield pool, remote
+    pool.shutdown()
+    state.close()
+
+
+def put_remote(client, tmp_path, name, data):
+    """Upload data as name, like another device would; returns the file id"""
+    other = tmp_path / "other"
+    other.mkdir(exist_ok=True)
+    path = other / name.replace("/", "_")
+    path.write_bytes(data)
+    return client.upload(str(path), filename=name)["file_id"]
+
+
+def replace_remote(client, tmp_path, name, old_id, data):
+    new_id = put_remote(client, tmp_path, name, data)
+    assert client.delete_file(old_id)
+    return new_id
+
+
+def remote_names(client):
+    return sorted(file_data["filename"] for file_data in client.list_files())
+
+
+def test_only_files_under_prefix_are_pulled(client, sync, folder, tmp_path):
+    _, remote = sync
+    put_remote(client, tmp_path, "docs/a.txt", b"alpha")
+    put_remote(client, tmp_path, "other.txt", b"elsewhere")
+    put_remote(client, tmp_path, "docsish/b.txt", b"neighbour")
+
+    assert remote.sync_once()
+    assert sorted(path.name for path in folder.iterdir()) == ["a.txt"]
+    assert (folder / "a.txt").read_bytes() == b"alpha"
+    assert remote.downloaded == 1
+
+
+def test_changes_follow_the_last_synced_version(client, sync, folder, tmp_path):
+    _, remote = sync
+    ids = {name: put_remote(client, tmp_path, f"docs/{name}", f"{name} v1".encode())
+           for name in ("a.txt", "b.txt", "c.txt", "d.txt")}
+    assert remote.sync_once()
+
+    # a: changed remotely; b: changed locally; c: deleted remotely;
+    # d: deleted remotely after a local edit
+    replace_remote(client, tmp_path, "docs/a.txt", ids["a.txt"], b"a.txt v2 remote")
+    (folder / "b.txt").write_bytes(b"b.txt v2 local")
+    assert client.delete_file(ids["c.txt"])
+    assert client.delete_file(ids["d.txt"])
+    (folder / "d.txt").write_bytes(b"d.txt v2 local")
+
+    assert remote.sync_once()
+    assert (folder / "a.txt").read_bytes() == b"a.txt v2 remote"
+    assert (folder / "b.txt").read_bytes() == b"b.txt v2 local"
+    assert not (folder / "c.txt").exists()
+    assert (folder / "d.txt").read_bytes() == b"d.txt v2 local"
+    assert (remote.removed, remote.conflicts, remote.failed) == (1, 0, 0)
+
+
+def test_conflict_keeps_both_versions(client, sync, folder, tmp_path):
+    _, remote = sync
+    old_id = put_remote(client, tmp_path, "docs/a.txt", b"v1")
+    assert remote.sync_once()
+
+    (folder / "a.txt").write_bytes(b"local edit")
+    new_id = replace_remote(client, tmp_path, "docs/a.txt", old_id, b"remote edit")
+    assert remote.sync_once()
+
+    assert (folder / "a.txt").read_bytes() == b"local edit"
+    copies = [path for path in folder.iterdir() if "conflicted copy" in path.name]
+    assert len(copies) == 1 and copies[0].read_bytes() == b"remote edit"
+    assert remote.conflicts == 1
+    # The remote version lives on as the copy, uploaded by the watcher
+    assert new_id not in {file_data["id"] for file_data in client.list_files()}
+
+
+def test_local_changes_and_deletes_stay_under_prefix(client, sync, folder, tmp_path):
+    pool, _ = sync
+    put_remote(client, tmp_path, "a.txt", b"outside the folder")
+    path = folder / "a.txt"
+    path.write_bytes(b"v1")
+    pool.submit(str(path))
+    pool.wait()
+    assert remote_names(client) == ["a.txt", "docs/a.txt"]
+
+    path.write_bytes(b"version 2")
+    pool.submit(str(path))
+    pool.wait()
+    # The previous version is replaced, the file outside the prefix untouched
+    assert remote_names(client) == ["a.txt", "docs/a.txt"]
+    client.download_file("docs/a.txt", str(tmp_path / "out.txt"))
+    assert (tmp_path / "out.txt").read_bytes() == b"version 2"
+
+    path.unlink()
+    pool.submit_delete(str(path))
+    pool.wait()
+    assert remote_names(client) == ["a.txt"]
+    assert pool.failed == 0
@@ -0,0 +1,58 @@
+import securecloud
+
+
+def upload(client, tmp_path, name, data, directory="source"):
+    source = tmp_path / directory
+    source.mkdir(exist_ok=True)
+    path = source / name
+    path.write_bytes(data)
+    client.upload(str(path))
+
+
+def downloads_of(client):
+    seen = []
+    adapter = client.transport.session.get_adapter(securecloud.API_BASE_URL)
+    adapter.fail = lambda request: seen.append(request.path_url) if "/download/" in request.path_url else None
+    return seen
+
+
+def test_restore_mirrors_the_store(client, tmp_path):
+    upload(client, tmp_path, "a.txt", b"alpha")
+    upload(client, tmp_path, "b.bin", bytes(range(256)) * 64)
+    upload(client, tmp_path, "a.txt", b"alpha, newer", directory="elsewhere")
+    target = tmp_path / "restored"
+
+    assert securecloud.restore_folder(client, str(target), workers=2)
+    assert sorted(path.name for path in target.iterdir()) == ["a.txt", "b.bin"]
+    assert (target / "a.txt").read_bytes() == b"alpha, newer"
+    assert (target / "b.bin").read_bytes() == bytes(range(256)) * 64
+
+
+def test_restore_skips_files_already_there(client, tmp_path):
+    upload(client, tmp_path, "a.txt", b"alpha")
+    upload(client, tmp_path, "b.txt", b"beta")
+    target = tmp_path / "restored"
+    target.mkdir()
+    (target / "a.txt").write_bytes(b"alpha")
+    (target / "b.txt").write_bytes(b"stale")
+
+    downloads = downloads_of(client)
+    assert securecloud.restore_folder(client, str(target))
+    assert len(downloads) == 1
+    assert (target / "b.txt").read_bytes() == b"beta"
+
+    downloads.clear()
+    assert securecloud.restore_folder(client, str(target))
+    assert downloads == []
+
+
+def test_restore_keeps_names_inside_the_folder(client, tmp_path):
+    upload(client, tmp_path, "a.txt", b"alpha")
+    path = tmp_path / "source" / "a.txt"
+    client.upload(str(path), filename="../escape.txt")
+    client.upload(str(path), filename="nested/dir/..")
+    target = tmp_path / "restored"
+
+    assert securecloud.restore_folder(client, str(target))
+    assert sorted(path.name for path in target.iterdir()) == ["a.txt", "escape.txt"]
+    assert not (tmp_path / "escape.txt").exists()
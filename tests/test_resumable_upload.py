@@ -0,0 +1,68 @@
+import os
+import re
+
+import pytest
+import requests
+
+import scfs_api
+import securecloud
+from conftest import AUTH
+
+
+def test_limits_endpoint(api):
+    limits = api.get("/api/limits").get_json()
+    assert limits["max_file_size"] == scfs_api.MAX_FILE_SIZE
+    assert limits["min_part_size"] == scfs_api.MIN_UPLOAD_PART_SIZE
+
+
+def test_threshold_follows_server_limit(client):
+    assert client.resumable_threshold() == securecloud.RESUMABLE_UPLOAD_THRESHOLD
+    client._load_limits()
+    assert client.max_file_size == scfs_api.MAX_FILE_SIZE
+    assert client.resumable_threshold() == scfs_api.MAX_FILE_SIZE // 2
+    assert client._upload_method(scfs_api.MAX_FILE_SIZE - 1024) == "resumable"
+
+
+def test_file_over_limit_is_refused_before_upload(client, tmp_path, monkeypatch):
+    monkeypatch.setattr(scfs_api, "MAX_FILE_SIZE", 1024 * 1024)
+    path = tmp_path / "big.bin"
+    path.write_bytes(os.urandom(1024 * 1024))
+    with pytest.raises(securecloud.UploadError, match="too large") as error:
+        client.upload(str(path))
+    assert not error.value.retryable
+
+
+def test_interrupted_upload_resumes(client, api, tmp_path, monkeypatch):
+    monkeypatch.setattr(securecloud, "RETRY_BACKOFF", 0)
+    path = tmp_path / "large.bin"
+    path.write_bytes(os.urandom(4 * 1024 * 1024))
+
+    dropping = True
+    sent = []
+
+    def fail(request):
+        match = re.search(r"/parts/(\d+)$", request.url)
+        if request.method == "PUT" and match:
+            if dropping and match.group(1) == "2":
+                return requests.ConnectionError("connection reset")
+            sent.append(int(match.group(1)))
+        return None
+
+    client.transport.session.get_adapter(securecloud.API_BASE_URL).fail = fail
+    with pytest.raises(securecloud.UploadError) as error:
+        client.upload(str(path))
+    assert error.value.retryable
+    assert sent == [1]
+    assert list((securecloud.STATE_DIR / "uploads").iterdir())
+
+    dropping = False
+    sent.clear()
+    result = client.upload(str(path))
+    assert result["success"]
+    assert sent == [2, 3, 4]
+    assert not list((securecloud.STATE_DIR / "uploads").iterdir())
+
+    listed = api.get("/api/files", headers=AUTH).get_json()["files"]
+    assert [file_data["filename"] for file_data in listed] == ["large.bin"]
+    client.download_file("large.bin", str(tmp_path / "out.bin"))
+    assert (tmp_path / "out.bin").read_bytes() == path.read_bytes()
@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_api(tmp_path, **env):
+    """Import scfs_api in a fresh interpreter with the given environment."""
+    environ = {key: value for key, value in os.environ.items()
+               if key not in ("SESSION_SECRET", "FLASK_DEBUG")}
+    environ.update(env, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    return subprocess.run([sys.executable, "-c", "import scfs_api"], cwd=tmp_path, env=environ,
+                          capture_output=True, text=True)
+
+
+def test_session_secret_is_required(tmp_path):
+    result = import_api(tmp_path)
+    assert result.returncode != 0
+    assert "SESSION_SECRET must be set" in result.stderr
+
+
+@pytest.mark.parametrize("env", [{"SESSION_SECRET": "configured"}, {"FLASK_DEBUG": "1"}])
+def test_session_secret_optional_when_set_or_debugging(tmp_path, env):
+    result = import_api(tmp_path, **env)
+    assert result.returncode == 0, result.stderr
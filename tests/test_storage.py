@@ -0,0 +1,143 @@
+import io
+import os
+
+import pytest
+
+import scfs_api
+from scfs_api import StorageBackend, StoredObject
+
+
+def read(storage, name, byte_range=None):
+    success, stored = storage.get(name, byte_range)
+    assert success, stored
+    assert isinstance(stored, StoredObject)
+    data = b"".join(stored.stream())
+    assert len(data) == stored.length
+    return data
+
+
+@pytest.fixture
+def storage(local_storage):
+    assert isinstance(local_storage, StorageBackend)
+    return local_storage
+
+
+def test_put_get_bytes_and_streams(storage):
+    assert storage.put("u1/a", b"hello")[0]
+    assert storage.put("u1/b", io.BytesIO(b"x" * 100000), 100000)[0]
+    assert read(storage, "u1/a") == b"hello"
+    assert read(storage, "u1/b") == b"x" * 100000
+
+
+def test_put_replaces(storage):
+    storage.put("u1/a", b"first")
+    storage.put("u1/a", b"second")
+    assert read(storage, "u1/a") == b"second"
+
+
+def test_put_refuses_short_stream(storage):
+    success, _ = storage.put("u1/short", io.BytesIO(b"abc"), 10)
+    assert not success
+    assert not storage.get("u1/short")[0]
+
+
+def test_short_stream_keeps_the_stored_object(storage):
+    storage.put("u1/a", b"first")
+    assert not storage.put("u1/a", io.BytesIO(b"abc"), 10)[0]
+    assert read(storage, "u1/a") == b"first"
+    assert not os.listdir(storage.temp_dir)
+
+
+def test_byte_ranges(storage):
+    storage.put("u1/r", bytes(range(256)))
+    assert read(storage, "u1/r", (0, 0)) == b"\x00"
+    assert read(storage, "u1/r", (10, 19)) == bytes(range(10, 20))
+    assert read(storage, "u1/r", (250, 255)) == bytes(range(250, 256))
+
+
+def test_missing_objects(storage):
+    assert not storage.get("u1/nope")[0]
+    # Deleting what is not there succeeds, so retries are safe
+    assert storage.delete("u1/nope")[0]
+    storage.put("u1/gone", b"x")
+    assert storage.delete("u1/gone")[0]
+    assert not storage.get("u1/gone")[0]
+
+
+def test_names_are_opaque(storage):
+    names = ["u1/../../etc/passwd", "u1/ünïcödé \"quoted\"", "u1/" + "n" * 400]
+    for name in names:
+        assert storage.put(name, name.encode())[0]
+        assert read(storage, name) == name.encode()
+    assert not os.path.exists(os.path.join(storage.root, "..", "etc"))
+
+
+def test_list_pages_in_byte_order(storage):
+    names = sorted({f"u{i % 3}/{chr(65 + i % 40)}{i:03d}" for i in range(90)})
+    for name in names:
+        storage.put(name, b"x")
+    listed, start = [], None
+    while True:
+        page, start = storage.list("u1/", start, 7)
+        assert len(page) <= 7
+        listed += [name for name, _ in page]
+        if not start:
+            break
+    assert listed == [name for name in names if name.startswith("u1/")]
+    assert all(created is not None for _, created in storage.list("", None, 5)[0])
+
+
+def test_list_walks_once_per_listing(storage, monkeypatch):
+    for i in range(20):
+        storage.put(f"u1/{i:02d}", b"x")
+    scans = []
+    scan = storage._scan
+    monkeypatch.setattr(storage, "_scan", lambda prefix: scans.append(prefix) or scan(prefix))
+    start, listed = None, []
+    while True:
+        page, start = storage.list("u1/", start, 3)
+        listed += [name for name, _ in page]
+        if not start:
+            break
+    assert listed == [f"u1/{i:02d}" for i in range(20)]
+    assert scans == ["u1/"]
+    # A new listing sees objects stored since the last one
+    storage.put("u1/20", b"x")
+    assert len(storage.list("u1/", None, 100)[0]) == 21
+
+
+def test_multipart_upload(storage):
+    success, upload_id = storage.create_multipart("u1/big")
+    assert success
+    first = storage.upload_part("u1/big", upload_id, 1, io.BytesIO(b"a" * 10), 10)
+    second = storage.upload_part("u1/big", upload_id, 2, io.BytesIO(b"b" * 5), 5)
+    assert first[0] and second[0]
+    assert storage.commit_multipart("u1/big", upload_id, [(1, first[1]), (2, second[1])])[0]
+    assert read(storage, "u1/big") == b"a" * 10 + b"b" * 5
+
+
+def test_multipart_abort(storage):
+    success, upload_id = storage.create_multipart("u1/aborted")
+    storage.upload_part("u1/aborted", upload_id, 1, io.BytesIO(b"a"), 1)
+    assert storage.abort_multipart("u1/aborted", upload_id)[0]
+    assert not storage.get("u1/aborted")[0]
+    assert not os.listdir(storage.uploads_dir)
+
+
+def test_configured_backend_must_be_available(monkeypatch):
+    monkeypatch.setattr(scfs_api, "object_storage_client", None)
+    monkeypatch.setattr(scfs_api, "STORAGE_BACKEND", "oci")
+    with pytest.raises(RuntimeError):
+        scfs_api.create_storage()
+    monkeypatch.setattr(scfs_api, "STORAGE_BACKEND", "s3")
+    with pytest.raises(ValueError):
+        scfs_api.create_storage()
+    monkeypatch.setattr(scfs_api, "STORAGE_BACKEND", "")
+    assert isinstance(scfs_api.create_storage(), scfs_api.LocalStorage)
+
+
+def test_interfaces_are_abstract():
+    with pytest.raises(TypeError):
+        StorageBackend()
+    with pytest.raises(TypeError):
+        StoredObject(0)
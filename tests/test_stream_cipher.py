@@ -0,0 +1,87 @@
+import io
+import os
+
+import pytest
+
+import securecloud
+from securecloud import SegmentCipher, StreamCorruptedError, STREAM_HEADER, STREAM_TAG_SIZE
+
+SEGMENT = 1024
+
+
+@pytest.fixture
+def cipher():
+    return SegmentCipher(os.urandom(32), SEGMENT)
+
+
+def encrypt(cipher, data):
+    return b"".join(cipher.encrypt_stream(io.BytesIO(data), len(data)))
+
+
+def decrypt(cipher, stream, step=777):
+    decryptor = cipher.decryptor()
+    output = [decryptor.update(stream[i:i + step]) for i in range(0, len(stream), step)]
+    output.append(decryptor.finalize())
+    return b"".join(output)
+
+
+@pytest.mark.parametrize("size", [0, 1, SEGMENT - 1, SEGMENT, SEGMENT + 1, 5 * SEGMENT + 17])
+def test_round_trip(cipher, size):
+    data = os.urandom(size)
+    stream = encrypt(cipher, data)
+    assert len(stream) == cipher.encrypted_size(size)
+    assert decrypt(cipher, stream) == data
+    assert securecloud.stream_layout(len(stream), SEGMENT) == (size, -(-size // SEGMENT))
+
+
+def test_encrypt_range_matches_stream(cipher):
+    data = os.urandom(3 * SEGMENT + 5)
+    prefix = os.urandom(7)
+    stream = b"".join(cipher.encrypt_stream(io.BytesIO(data), len(data), prefix))
+    for start, end in [(0, 10), (5, SEGMENT * 2), (SEGMENT + 100, len(stream)), (len(stream) - 3, len(stream))]:
+        assert cipher.encrypt_range(io.BytesIO(data), len(data), prefix, start, end) == stream[start:end]
+
+
+def test_size_mismatch_is_refused(cipher):
+    with pytest.raises(IOError):
+        b"".join(cipher.encrypt_stream(io.BytesIO(b"short"), 10))
+
+
+@pytest.mark.parametrize("cut", [1, STREAM_TAG_SIZE, SEGMENT + STREAM_TAG_SIZE])
+def test_truncation_is_detected(cipher, cut):
+    stream = encrypt(cipher, os.urandom(3 * SEGMENT))
+    with pytest.raises(StreamCorruptedError):
+        decrypt(cipher, stream[:-cut])
+
+
+def test_dropping_whole_segments_is_detected(cipher):
+    stream = encrypt(cipher, os.urandom(3 * SEGMENT))
+    sealed = SEGMENT + STREAM_TAG_SIZE
+    body = stream[STREAM_HEADER.size:]
+    # Keep a valid-looking tail by removing one sealed segment from the middle
+    shortened = stream[:STREAM_HEADER.size] + body[:sealed] + body[2 * sealed:]
+    with pytest.raises(StreamCorruptedError):
+        decrypt(cipher, shortened)
+
+
+def test_reordering_is_detected(cipher):
+    stream = encrypt(cipher, os.urandom(3 * SEGMENT))
+    sealed = SEGMENT + STREAM_TAG_SIZE
+    header, body = stream[:STREAM_HEADER.size], stream[STREAM_HEADER.size:]
+    swapped = header + body[sealed:2 * sealed] + body[:sealed] + body[2 * sealed:]
+    with pytest.raises(StreamCorruptedError):
+        decrypt(cipher, swapped)
+
+
+def test_tampering_and_wrong_key_are_detected(cipher):
+    stream = bytearray(encrypt(cipher, os.urandom(2 * SEGMENT)))
+    stream[STREAM_HEADER.size + 10] ^= 1
+    with pytest.raises(StreamCorruptedError):
+        decrypt(cipher, bytes(stream))
+    with pytest.raises(StreamCorruptedError):
+        decrypt(SegmentCipher(os.urandom(32), SEGMENT), encrypt(cipher, b"data"))
+
+
+def test_not_a_stream(cipher):
+    with pytest.raises(StreamCorruptedError):
+        decrypt(cipher, b"gAAAAA" + os.urandom(100))
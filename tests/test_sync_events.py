@@ -0,0 +1,120 @@
+import time
+from concurrent.futures import Future
+
+import pytest
+
+import securecloud
+
+QUIET = 0.05
+
+
+class RecordingPool:
+    """Stands in for UploadPool, recording what the queue submits"""
+
+    def __init__(self):
+        self.calls = []
+        self.hold = False
+        self.futures = []
+
+    def _future(self):
+        future = Future()
+        if self.hold:
+            self.futures.append(future)
+        else:
+            future.set_result(True)
+        return future
+
+    def submit(self, path):
+        self.calls.append(("upload", path))
+        return self._future()
+
+    def submit_deletes(self, paths):
+        self.calls.append(("delete", sorted(paths)))
+        return self._future()
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+@pytest.fixture
+def queue():
+    pool = RecordingPool()
+    queue = securecloud.SyncEventQueue(pool, quiet_period=QUIET)
+    queue.start()
+    yield queue, pool
+    queue.stop()
+
+
+def test_events_on_a_path_are_coalesced(queue, tmp_path):
+    events, pool = queue
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"data")
+    for _ in range(20):
+        events.put(str(path), "upload")
+
+    assert wait_for(lambda: pool.calls)
+    time.sleep(QUIET * 4)
+    assert pool.calls == [("upload", str(path))]
+
+
+def test_file_still_being_written_waits(queue, tmp_path):
+    events, pool = queue
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"")
+    events.put(str(path), "upload")
+    writing_until = time.monotonic() + QUIET * 8
+    while time.monotonic() < writing_until:
+        with open(path, "ab") as f:
+            f.write(b"more")
+        time.sleep(QUIET / 3)
+        assert pool.calls == []
+
+    assert wait_for(lambda: pool.calls)
+    assert pool.calls == [("upload", str(path))]
+
+
+def test_deletes_are_batched_before_uploads(queue, tmp_path):
+    events, pool = queue
+    path = tmp_path / "new.txt"
+    path.write_bytes(b"data")
+    gone = [str(tmp_path / f"old-{index}.txt") for index in range(3)]
+    for old in gone:
+        events.put(old, "delete")
+    events.put(str(path), "upload")
+
+    assert wait_for(lambda: len(pool.calls) == 2)
+    assert pool.calls == [("delete", gone), ("upload", str(path))]
+
+
+def test_latest_action_wins(queue, tmp_path):
+    events, pool = queue
+    path = tmp_path / "a.txt"
+    events.put(str(path), "upload")
+    events.put(str(path), "delete")
+
+    assert wait_for(lambda: pool.calls)
+    assert pool.calls == [("delete", [str(path)])]
+
+
+def test_path_is_not_dispatched_while_in_flight(queue, tmp_path):
+    events, pool = queue
+    pool.hold = True
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"one")
+    events.put(str(path), "upload")
+    assert wait_for(lambda: pool.calls)
+
+    path.write_bytes(b"two, longer")
+    events.put(str(path), "upload")
+    time.sleep(QUIET * 6)
+    assert len(pool.calls) == 1
+
+    pool.hold = False
+    pool.futures[0].set_result(True)
+    assert wait_for(lambda: len(pool.calls) == 2)
@@ -0,0 +1,96 @@
+import os
+import sqlite3
+
+import pytest
+
+import securecloud
+
+
+@pytest.fixture
+def folder(tmp_path, monkeypatch):
+    monkeypatch.setattr(securecloud, "STATE_DIR", tmp_path / "state")
+    folder = tmp_path / "folder"
+    folder.mkdir()
+    return folder
+
+
+class CountingFingerprint:
+    """fingerprint_file stand-in recording which files were read"""
+
+    def __init__(self):
+        self.read = []
+
+    def __call__(self, file_path):
+        self.read.append(os.path.basename(file_path))
+        with open(file_path, "rb") as f:
+            return "fp-" + f.read().hex()
+
+
+def test_unchanged_stat_skips_reading(folder):
+    fingerprint = CountingFingerprint()
+    state = securecloud.SyncState(str(folder), "user@example.com", fingerprint)
+    path = folder / "a.txt"
+    path.write_bytes(b"one")
+
+    changed, stat, value = state.check("a.txt", str(path))
+    assert changed and value == "fp-" + b"one".hex()
+    state.record("a.txt", stat, value, "remote-1")
+
+    assert state.check("a.txt", str(path)) == (False, stat, value)
+    assert fingerprint.read == ["a.txt"]
+
+
+def test_touched_file_refreshes_stat(folder):
+    fingerprint = CountingFingerprint()
+    state = securecloud.SyncState(str(folder), "user@example.com", fingerprint)
+    path = folder / "a.txt"
+    path.write_bytes(b"one")
+    _, stat, value = state.check("a.txt", str(path))
+    state.record("a.txt", stat, value, "remote-1")
+
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    changed, _, _ = state.check("a.txt", str(path))
+    assert not changed
+    assert state.get("a.txt")["remote_id"] == "remote-1"
+    state.check("a.txt", str(path))
+    assert fingerprint.read == ["a.txt", "a.txt"]
+
+    path.write_bytes(b"two")
+    changed, _, value = state.check("a.txt", str(path))
+    assert changed and value == "fp-" + b"two".hex()
+
+
+def test_index_from_older_client_is_migrated(folder):
+    state = securecloud.SyncState(str(folder), "user@example.com", CountingFingerprint())
+    state.close()
+    db = sqlite3.connect(str(state.path))
+    db.execute("DROP TABLE files")
+    db.execute("CREATE TABLE files (path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,"
+               " inode INTEGER NOT NULL, sha256 TEXT NOT NULL, remote_id TEXT, synced_at REAL NOT NULL)")
+    db.execute("INSERT INTO files VALUES ('a.txt', 1, 1, 1, 'plain-hash', 'remote-1', 0)")
+    db.commit()
+    db.close()
+
+    state = securecloud.SyncState(str(folder), "user@example.com", CountingFingerprint())
+    assert state.get("a.txt") == {"size": 1, "mtime_ns": 1, "inode": 1, "fingerprint": "", "remote_id": "remote-1"}
+
+
+def test_pool_upload_reads_the_fingerprint_once(client, folder, monkeypatch):
+    reads = []
+    fingerprint_file = client.fingerprint_file
+
+    def counting(file_path):
+        reads.append(file_path)
+        return fingerprint_file(file_path)
+
+    monkeypatch.setattr(client, "fingerprint_file", counting)
+    state = securecloud.SyncState(str(folder), client.email, client.fingerprint_file)
+    path = folder / "a.txt"
+    path.write_bytes(b"hello")
+    pool = securecloud.UploadPool(client, workers=1, state=state, folder_path=str(folder))
+    pool.submit(str(path))
+    pool.wait()
+
+    assert (pool.uploaded, pool.failed) == (1, 0)
+    assert reads == [str(path)]
+    assert state.get("a.txt")["fingerprint"] == fingerprint_file(str(path))
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+import requests
+
+import securecloud
+
+
+@pytest.fixture
+def failures(client, monkeypatch):
+    """Drop the connection for the next failures["upload"] file uploads"""
+    monkeypatch.setattr(securecloud, "RETRY_BACKOFF", 0)
+    failures = {"upload": 0, "attempts": 0}
+
+    def fail(request):
+        if request.path_url == "/api/files/upload":
+            failures["attempts"] += 1
+            if failures["upload"]:
+                failures["upload"] -= 1
+                return requests.ConnectionError("connection reset")
+        return None
+
+    client.transport.session.get_adapter(securecloud.API_BASE_URL).fail = fail
+    return failures
+
+
+@pytest.fixture
+def pool(client):
+    pool = securecloud.UploadPool(client, workers=2)
+    yield pool
+    pool.shutdown()
+
+
+def test_pool_uploads_single_files_and_batches(client, pool, tmp_path):
+    small = []
+    for index in range(5):
+        path = tmp_path / f"small-{index}.txt"
+        path.write_bytes(f"file {index}".encode())
+        small.append(str(path))
+    large = tmp_path / "large.bin"
+    large.write_bytes(b"x" * 4096)
+
+    pool.submit_batch(small)
+    pool.submit(str(large))
+    pool.wait()
+
+    assert (pool.uploaded, pool.failed) == (6, 0)
+    assert pool.bytes == sum(len(f"file {index}") for index in range(5)) + 4096
+    assert sorted(f["filename"] for f in client.list_files()) == ["large.bin"] + [f"small-{i}.txt" for i in range(5)]
+    assert pool.summary().startswith("Uploaded 6 files")
+
+
+def test_transient_failures_are_retried(pool, failures, tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"hello")
+    failures["upload"] = 2
+
+    pool.submit(str(path))
+    pool.wait()
+    assert (pool.uploaded, pool.failed) == (1, 0)
+    assert failures["attempts"] == 3
+
+
+def test_failures_are_counted_once_retries_run_out(client, failures, tmp_path):
+    pool = securecloud.UploadPool(client, workers=1, retries=1)
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"hello")
+    failures["upload"] = 5
+
+    pool.submit(str(path))
+    pool.submit(str(tmp_path / "missing.txt"))
+    pool.wait()
+    pool.shutdown()
+    assert (pool.uploaded, pool.failed) == (0, 2)
+    assert failures["attempts"] == 2
+
+
+def test_submit_blocks_when_the_queue_is_full(pool):
+    release = threading.Event()
+    for index in range(4):
+        pool.submit_call(f"busy-{index}", lambda path: release.wait())
+
+    queued = threading.Event()
+    submitter = threading.Thread(target=lambda: (pool.submit_call("next", lambda path: True), queued.set()))
+    submitter.start()
+    assert not queued.wait(0.2)
+
+    release.set()
+    assert queued.wait(5)
+    submitter.join()
+    pool.wait()
+
+
+def test_tasks_on_one_path_never_overlap(pool):
+    running, overlaps = [], []
+
+    def task(path):
+        running.append(path)
+        if running.count(path) > 1:
+            overlaps.append(path)
+        time.sleep(0.01)
+        running.remove(path)
+        return True
+
+    futures = [pool.submit_call("same", task) for _ in range(4)]
+    assert all(future.result() for future in futures)
+    assert overlaps == []
@@ -1,18 +1,56 @@
+import { useState } from 'react';
 import type { FileMetadata } from '../types';
 import { FileService } from '../services/fileService';
 
 interface FileListProps {
   files: FileMetadata[];
-  onFileDelete: (fileId: string) => void;
+  onFilesDelete: (fileIds: string[]) => Promise<void>;
   onFileDownload: (file: FileMetadata) => void;
 }
 
-export default function FileList({ files, onFileDelete, onFileDownload }: FileListProps) {
+export default function FileList({ files, onFilesDelete, onFileDownload }: FileListProps) {
+  const [selected, setSelected] = useState<Set<string>>(new Set());
+
+  // Files deleted or reloaded elsewhere drop out of the selection
+  const selectedIds = files.filter(file => selected.has(file.id)).map(file => file.id);
+
+  const toggle = (fileId: string) => {
+    const next = new Set(selected);
+    if (!next.delete(fileId)) {
+      next.add(fileId);
+    }
+    setSelected(next);
+  };
+
+  const toggleAll = () => {
+    setSelected(selectedIds.length === files.length ? new Set() : new Set(files.map(file => file.id)));
+  };
+
+  const deleteSelected = async () => {
+    await onFilesDelete(selectedIds);
+    setSelected(new Set());
+  };
+
   return (
     <div className="file-list-container">
       {/* Header */}
       <div className="file-list-header">
         <h2 className="file-list-title">My Files ({files.length})</h2>
+        {files.length > 0 && (
+          <div className="file-actions">
+            <button onClick={toggleAll} className="btn btn-secondary btn-sm">
+              {selectedIds.length === files.length ? 'Clear selection' : 'Select all'}
+            </button>
+            <button
+              onClick={deleteSelected}
+              disabled={selectedIds.length === 0}
+              className="btn btn-danger btn-sm"
+              title="Delete selected files"
+            >
+              Delete selected ({selectedIds.length})
+            </button>
+          </div>
+        )}
       </div>
 
       {/* File List */}
@@ -24,6 +62,12 @@ export default function FileList({ files, onFileDelete, onFileDownload }: FileLi
         <div className="file-list">
           {files.map((file) => (
             <div key={file.id} className="file-item">
+              <input
+                type="checkbox"
+                checked={selected.has(file.id)}
+                onChange={() => toggle(file.id)}
+                aria-label={`Select ${file.filename}`}
+              />
               <div className="file-info">
                 <div className="file-name">{file.filename}</div>
                 <div className="file-meta">
@@ -39,7 +83,7 @@ export default function FileList({ files, onFileDelete, onFileDownload }: FileLi
                   Download
                 </button>
                 <button
-                  onClick={() => onFileDelete(file.id)}
+                  onClick={() => onFilesDelete([file.id])}
                   className="btn btn-danger btn-sm"
                   title="Delete file"
                 >
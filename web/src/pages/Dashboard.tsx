@@ -34,7 +34,15 @@ export default function DashboardPage() {
           const { email, password } = JSON.parse(storedCredentials);
           const { SecureCloudAPI } = await import('../services/apiService');
           SecureCloudAPI.setCredentials(email, password);
-          console.log('[API] Credentials configured');
+
+          // Exchange the credentials for a token session; without one the
+          // API is still reachable with the credential headers
+          const session = await SecureCloudAPI.login(email, password);
+          if (session.success) {
+            console.log('[API] Session started');
+          } else {
+            console.warn('[API] Could not start a session, sending credentials instead:', session.error);
+          }
         }
 
         await loadFiles(authUser.id);
@@ -72,20 +80,23 @@ export default function DashboardPage() {
     }
   };
 
-  const handleFileDelete = async (fileId: string) => {
+  const handleFilesDelete = async (fileIds: string[]) => {
     try {
       const { SecureCloudAPI } = await import('../services/apiService');
+      let removed = fileIds;
 
+      // One request for the whole selection
       if (SecureCloudAPI.isAPIAvailable()) {
-        await SecureCloudAPI.deleteFile(fileId);
+        removed = await SecureCloudAPI.deleteFiles(fileIds);
       } else {
-        await FileService.deleteFile(fileId);
+        await FileService.deleteFiles(fileIds);
       }
 
-      setFiles(files.filter(file => file.id !== fileId));
+      const removedIds = new Set(removed);
+      setFiles(current => current.filter(file => !removedIds.has(file.id)));
     } catch (err) {
-      console.error('Error deleting file:', err);
-      alert('Error al eliminar archivo');
+      console.error('Error deleting files:', err);
+      alert('Error al eliminar archivos');
     }
   };
 
@@ -202,7 +213,7 @@ export default function DashboardPage() {
       {/* File List */}
       <FileList
         files={files}
-        onFileDelete={handleFileDelete}
+        onFilesDelete={handleFilesDelete}
         onFileDownload={handleFileDownload}
       />
     </div>
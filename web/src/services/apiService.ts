@@ -5,6 +5,9 @@ const API_BASE_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:8080
 export class SecureCloudAPI {
   private static email: string | null = null;
   private static password: string | null = null;
+  private static accessToken: string | null = null;
+  private static refreshToken: string | null = null;
+  private static refreshing: Promise<void> | null = null;
 
   static setCredentials(email: string, password: string) {
     this.email = email;
@@ -17,7 +20,9 @@ export class SecureCloudAPI {
       'Content-Type': 'application/json',
     };
 
-    if (this.email && this.password) {
+    if (this.accessToken) {
+      headers['Authorization'] = `Bearer ${this.accessToken}`;
+    } else if (this.email && this.password) {
       headers['X-User-Email'] = this.email;
       headers['X-User-Password'] = this.password;
       console.log('[AUTH] Sending credentials for:', this.email);
@@ -28,12 +33,63 @@ export class SecureCloudAPI {
     return headers;
   }
 
-  static async testConnection(): Promise<boolean> {
+  // Without a new token pair, requests fall back to the credential headers
+  private static async refreshSession(): Promise<void> {
+    const refreshToken = this.refreshToken;
+    this.accessToken = null;
+    this.refreshToken = null;
+    if (!refreshToken) {
+      return;
+    }
+
     try {
-      const response = await fetch(`${API_BASE_URL}/files`, {
-        headers: this.getHeaders(),
+      const response = await fetch(`${API_BASE_URL}/auth/refresh`, {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({ refresh_token: refreshToken }),
       });
 
+      const data = await response.json();
+      if (!data.success) {
+        console.warn('[AUTH] Session refresh failed:', data.error);
+        return;
+      }
+
+      this.accessToken = data.access_token;
+      this.refreshToken = data.refresh_token;
+    } catch (error) {
+      console.warn('[AUTH] Session refresh failed:', error);
+    }
+  }
+
+  // Access tokens expire after 15 minutes: on a 401, refresh the session
+  // once (or fall back to the credential headers) and retry
+  private static async request(path: string, init: RequestInit = {}): Promise<Response> {
+    const send = () => fetch(`${API_BASE_URL}${path}`, { ...init, headers: this.getHeaders() });
+
+    const token = this.accessToken;
+    const response = await send();
+    if (response.status !== 401 || !token) {
+      return response;
+    }
+
+    // Concurrent requests share one refresh; if another request already
+    // replaced the token, just send again with the new one
+    if (this.accessToken === token) {
+      this.refreshing ??= this.refreshSession().finally(() => {
+        this.refreshing = null;
+      });
+    }
+    await this.refreshing;
+    return send();
+  }
+
+  static async testConnection(): Promise<boolean> {
+    try {
+      const response = await this.request('/files');
+
       console.log('[NETWORK] API connection test:', response.status);
       return response.ok;
     } catch (error) {
@@ -56,6 +112,8 @@ export class SecureCloudAPI {
 
       if (data.success) {
         this.setCredentials(email, password);
+        this.accessToken = data.access_token ?? null;
+        this.refreshToken = data.refresh_token ?? null;
         return { success: true, user: data.user };
       } else {
         return { success: false, error: data.error };
@@ -68,20 +126,32 @@ export class SecureCloudAPI {
   static async getFiles(): Promise<FileMetadata[]> {
     try {
       console.log('[FILES] Getting files from API...');
-      const response = await fetch(`${API_BASE_URL}/files`, {
-        headers: this.getHeaders(),
-      });
+      const files: FileMetadata[] = [];
+      let cursor: string | null = null;
 
-      console.log('[FILES] API response status:', response.status);
-      const data = await response.json();
+      // The listing is paginated; follow next_cursor until the last page
+      do {
+        const params = new URLSearchParams({ limit: '500' });
+        if (cursor) {
+          params.set('cursor', cursor);
+        }
 
-      if (data.success) {
-        console.log('[SUCCESS] Files obtained:', data.files.length);
-        return data.files;
-      } else {
-        console.error('[ERROR] API error:', data.error);
-        throw new Error(data.error);
-      }
+        const response = await this.request(`/files?${params}`);
+
+        console.log('[FILES] API response status:', response.status);
+        const data = await response.json();
+
+        if (!data.success) {
+          console.error('[ERROR] API error:', data.error);
+          throw new Error(data.error);
+        }
+
+        files.push(...data.files);
+        cursor = data.next_cursor ?? null;
+      } while (cursor);
+
+      console.log('[SUCCESS] Files obtained:', files.length);
+      return files;
     } catch (error) {
       console.error('[ERROR] Error fetching files:', error);
       throw error;
@@ -90,9 +160,8 @@ export class SecureCloudAPI {
 
   static async deleteFile(fileId: string): Promise<boolean> {
     try {
-      const response = await fetch(`${API_BASE_URL}/files/${fileId}`, {
+      const response = await this.request(`/files/${fileId}`, {
         method: 'DELETE',
-        headers: this.getHeaders(),
       });
 
       const data = await response.json();
@@ -103,11 +172,36 @@ export class SecureCloudAPI {
     }
   }
 
+  static async deleteFiles(fileIds: string[]): Promise<string[]> {
+    try {
+      const removed: string[] = [];
+
+      // The API takes at most 1000 ids per request
+      for (let start = 0; start < fileIds.length; start += 1000) {
+        const response = await this.request('/files/delete', {
+          method: 'POST',
+          body: JSON.stringify({ ids: fileIds.slice(start, start + 1000) }),
+        });
+
+        const data = await response.json();
+        if (!data.success) {
+          throw new Error(data.error);
+        }
+
+        // Ids that were not found are gone as well
+        removed.push(...data.deleted, ...data.not_found);
+      }
+
+      return removed;
+    } catch (error) {
+      console.error('Error deleting files:', error);
+      throw error;
+    }
+  }
+
   static async downloadFile(fileId: string, filename: string): Promise<void> {
     try {
-      const response = await fetch(`${API_BASE_URL}/files/download/${fileId}`, {
-        headers: this.getHeaders(),
-      });
+      const response = await this.request(`/files/download/${fileId}`);
 
       if (!response.ok) {
         throw new Error('Error downloading file');
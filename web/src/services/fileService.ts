@@ -32,6 +32,20 @@ export class FileService {
     return true;
   }
 
+  static async deleteFiles(fileIds: string[]): Promise<boolean> {
+    const { error } = await supabase
+      .from('file_metadata')
+      .delete()
+      .in('id', fileIds);
+
+    if (error) {
+      console.error('Error deleting files:', error);
+      throw new Error('Error deleting files');
+    }
+
+    return true;
+  }
+
   static async searchFiles(userId: string, query: string): Promise<FileMetadata[]> {
     const { data, error } = await supabase
       .from('file_metadata')